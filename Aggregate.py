@@ -0,0 +1,314 @@
+#!/usr/bin/python
+
+# Title: Aggregation Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Precomputed histogram and bar counts, smoothed lines and column
+# statistics, so redraws and summaries do not rescan the data.
+
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from Stats import DatasetStats, column_stats
+
+# Same default as pandas' Series.hist.
+HIST_BINS = 10
+# Smoothed lines average y over this many equal-width bins of x, then blend
+# each bin with SMOOTH_WINDOW neighbours on either side.
+SMOOTH_BINS = 100
+SMOOTH_WINDOW = 3
+# Statistics of this many recent (column, filters) pairs are kept. Each holds
+# a quantile sketch or a table of value counts, unlike the other aggregates
+# whose size is set by their bins.
+FILTERED_STATS = 16
+
+
+class AggregateCache(object):
+    """Computes and caches bin edges and counts for a dataset.
+
+    Results are keyed by (kind, column, grouping, bins, filters), so after
+    the first draw a histogram or bar chart costs O(bins) to draw again,
+    whatever the number of rows. Shared by every Graphic bound to the same
+    dataset. Filters are tuples, as taken by RowIndex, and only mask the
+    rows counted; the dataset is never copied.
+    """
+
+    def __init__(self, dataset, schema, index=None, stats=None):
+        """Binds the cache to a dataset.
+
+        Args:
+            dataset: Pandas DataFrame.
+            schema: DatasetSchema of dataset.
+            index: RowIndex of dataset, to apply filters with.
+            stats: DatasetStats of dataset, such as those gathered while
+                loading it. Columns it lacks are added when first asked for.
+        """
+        self.dataset = dataset
+        self.schema = schema
+        self.index = index
+        self.base_stats = stats if stats is not None else DatasetStats()
+        self.cache = {}
+        self.codes_cache = {}
+        self.stats_cache = OrderedDict()
+
+    def codes(self, col):
+        """Returns (codes, labels) of a column, with -1 coding nulls.
+
+        Categorical columns reuse the schema's codes. Numeric columns are
+        factorized on first use.
+        """
+        col_schema = self.schema[col]
+        if col_schema.codes is not None:
+            return col_schema.codes, col_schema.categories
+        if col not in self.codes_cache:
+            codes, labels = pd.factorize(self.dataset[col], sort=True)
+            self.codes_cache[col] = (codes, np.asarray(labels))
+        return self.codes_cache[col]
+
+    def _mask(self, where):
+        # Boolean mask of the rows that pass the filters, or None.
+        if not where:
+            return None
+        return self.index.mask(where)
+
+    def _range(self, col, mask=None):
+        # Smallest and largest value of a numeric column, over the rows of
+        # mask if given, widened if empty or a single value.
+        col_schema = self.schema[col]
+        lo, hi = col_schema.min, col_schema.max
+        if mask is not None and lo is not None:
+            values = self.dataset[col].values[mask]
+            if col_schema.nulls:
+                values = values[~np.isnan(values)]
+            if len(values):
+                lo, hi = values.min(), values.max()
+            else:
+                lo = hi = None
+        if lo is None:
+            lo, hi = 0.0, 1.0
+        elif hi == lo:
+            lo, hi = lo - 0.5, hi + 0.5
+        return lo, hi
+
+    def histogram(self, col, grouping=None, bins=HIST_BINS, where=()):
+        """Counts values of a numeric column in equal-width bins.
+
+        Args:
+            col: Numeric column name.
+            grouping: Optional column to split counts by.
+            bins: Number of bins.
+            where: Tuple of filters on the rows counted. The bins span the
+                values of the rows that pass.
+
+        Returns:
+            edges: Array of bins + 1 bin edges, shared by all groups.
+            counts: Array of bins counts, or with a grouping, an array of
+                shape (groups, bins).
+            labels: Group labels, or None without a grouping.
+        """
+        key = ('hist', col, grouping, bins, where)
+        if key not in self.cache:
+            col_schema = self.schema[col]
+            mask = self._mask(where)
+            lo, hi = self._range(col, mask)
+            values = self.dataset[col].values
+            keep = ~np.isnan(values) if col_schema.nulls else None
+            if mask is not None:
+                keep = mask if keep is None else keep & mask
+            idx = bin_index(values, lo, hi, bins)
+            labels = None
+            if grouping is None:
+                if keep is not None:
+                    idx = idx[keep]
+                counts = np.bincount(idx, minlength=bins)
+            else:
+                codes, labels = self.codes(grouping)
+                k = len(labels)
+                pair = codes.astype(np.intp) * bins + idx
+                keep = codes >= 0 if keep is None else keep & (codes >= 0)
+                counts = np.bincount(pair[keep], minlength=k * bins)
+                counts = counts.reshape(k, bins)
+            edges = np.linspace(lo, hi, bins + 1)
+            self.cache[key] = (edges, counts, labels)
+        return self.cache[key]
+
+    def value_counts(self, col, where=()):
+        """Counts each distinct value of a column.
+
+        Args:
+            col: Column name.
+            where: Tuple of filters on the rows counted. Values that no
+                remaining row holds are left out.
+
+        Returns:
+            labels: Distinct values, most frequent first.
+            counts: Matching counts.
+        """
+        key = ('counts', col, where)
+        if key not in self.cache:
+            codes, labels = self.codes(col)
+            keep = codes >= 0
+            mask = self._mask(where)
+            if mask is not None:
+                keep &= mask
+            counts = np.bincount(codes[keep], minlength=len(labels))
+            order = np.argsort(-counts, kind='mergesort')
+            if mask is not None:
+                order = order[counts[order] > 0]
+            self.cache[key] = (labels[order], counts[order])
+        return self.cache[key]
+
+    def crosstab(self, col, grouping, where=()):
+        """Counts each pair of values of two columns, in the rows that pass
+        the filters of where.
+
+        Returns:
+            row_labels: Distinct values of col.
+            col_labels: Distinct values of grouping.
+            table: Array of counts, of shape (rows, columns).
+        """
+        key = ('crosstab', col, grouping, where)
+        if key not in self.cache:
+            row_codes, row_labels = self.codes(col)
+            col_codes, col_labels = self.codes(grouping)
+            n_rows, n_cols = len(row_labels), len(col_labels)
+            keep = (row_codes >= 0) & (col_codes >= 0)
+            mask = self._mask(where)
+            if mask is not None:
+                keep &= mask
+            pair = (row_codes[keep].astype(np.intp) * n_cols +
+                    col_codes[keep])
+            table = np.bincount(pair, minlength=n_rows * n_cols)
+            self.cache[key] = (row_labels, col_labels,
+                               table.reshape(n_rows, n_cols))
+        return self.cache[key]
+
+    def stats(self, col, where=()):
+        """Returns the statistics of a column, over the rows that pass the
+        filters of where.
+
+        Without filters, they are those gathered while loading, so they cost
+        nothing on any size of data. Filtered statistics cannot be derived
+        from those, as quantiles and value counts do not split by rows: each
+        set of filters takes one pass over the rows that pass. The last
+        FILTERED_STATS of them are kept.
+
+        Returns:
+            stats: ColumnStats of the column.
+        """
+        if not where:
+            if col not in self.base_stats:
+                self.base_stats.add(column_stats(col, self.dataset[col]))
+            return self.base_stats[col]
+        key = (col, where)
+        if key in self.stats_cache:
+            self.stats_cache[key] = self.stats_cache.pop(key)
+            return self.stats_cache[key]
+        series = self.dataset[col]
+        stats = column_stats(col, series[self._mask(where)])
+        self.stats_cache[key] = stats
+        if len(self.stats_cache) > FILTERED_STATS:
+            self.stats_cache.popitem(last=False)
+        return stats
+
+    def smooth(self, x, y, grouping=None, bins=SMOOTH_BINS,
+               window=SMOOTH_WINDOW, where=()):
+        """Smooths y against x by binned means, in one pass over the rows.
+
+        Sums and counts of y are taken in equal-width bins of x, then spread
+        over neighbouring bins with a triangular kernel before dividing, so
+        sparse bins borrow from their neighbours, and empty stretches are
+        interpolated. Costs O(rows + bins), unlike lowess.
+
+        Args:
+            x: Numeric column name.
+            y: Numeric column name.
+            grouping: Optional column to smooth each group of separately.
+            bins: Number of bins of x.
+            window: Neighbouring bins blended into each bin, on either side.
+            where: Tuple of filters on the rows smoothed.
+
+        Returns:
+            centers: Array of bins x positions.
+            means: Array of bins smoothed y values, NaN where there is no
+                data nearby, or with a grouping, an array of shape
+                (groups, bins).
+            labels: Group labels, or None without a grouping.
+        """
+        key = ('smooth', x, y, grouping, bins, window, where)
+        if key not in self.cache:
+            mask = self._mask(where)
+            lo, hi = self._range(x, mask)
+            x_values = self.dataset[x].values
+            y_values = self.dataset[y].values
+            keep = np.isfinite(x_values) & np.isfinite(y_values)
+            if mask is not None:
+                keep &= mask
+            idx = bin_index(x_values, lo, hi, bins)
+            labels = None
+            k = 1
+            if grouping is not None:
+                codes, labels = self.codes(grouping)
+                k = len(labels)
+                keep &= codes >= 0
+                idx = codes.astype(np.intp) * bins + idx
+            idx = idx[keep]
+            counts = np.bincount(idx, minlength=k * bins)
+            sums = np.bincount(idx, weights=y_values[keep],
+                               minlength=k * bins)
+            kernel = 1 - np.abs(np.arange(-window, window + 1)) / (window + 1.)
+            counts = _convolve_rows(counts.reshape(k, bins), kernel)
+            sums = _convolve_rows(sums.reshape(k, bins), kernel)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means = np.where(counts > 0, sums / counts, np.nan)
+            if grouping is None:
+                means = means[0]
+            centers = lo + (np.arange(bins) + 0.5) * ((hi - lo) / float(bins))
+            self.cache[key] = (centers, means, labels)
+        return self.cache[key]
+
+
+def fold_groups(counts, labels, keep, other='other'):
+    """Keeps the largest groups of a grouped count table, and folds the rest.
+
+    Args:
+        counts: Array of shape (groups, bins).
+        labels: Group labels.
+        keep: Number of groups to return, counting the folded one.
+        other: Label of the folded group.
+
+    Returns:
+        counts: The keep - 1 groups with the most rows, in their original
+            order, then the sum of all the others. Unchanged if there are at
+            most keep groups.
+        labels: Their labels.
+    """
+    if len(labels) <= keep:
+        return counts, labels
+    order = np.argsort(-counts.sum(axis=1), kind='mergesort')
+    top = np.sort(order[:keep - 1])
+    rest = order[keep - 1:]
+    folded = np.vstack([counts[top], counts[rest].sum(axis=0)])
+    labels = np.append(np.asarray(labels, dtype=object)[top], other)
+    return folded, labels
+
+
+def _convolve_rows(table, kernel):
+    # Convolves each row of a 2-D array, keeping its length.
+    out = np.empty(table.shape)
+    for i, row in enumerate(table):
+        out[i] = np.convolve(row, kernel, mode='same')
+    return out
+
+
+def bin_index(values, lo, hi, bins):
+    """Returns the equal-width bin of each value in [lo, hi].
+
+    The last bin is closed on the right, as with np.histogram. Values outside
+    the range, and NaN, are clipped into the end bins; callers mask them.
+    """
+    scaled = (values - lo) * (bins / float(hi - lo))
+    idx = np.nan_to_num(scaled).astype(np.intp)
+    np.clip(idx, 0, bins - 1, out=idx)
+    return idx
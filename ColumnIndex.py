@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+# Title: Column Name Index
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Fuzzy lookup of spoken terms against dataset column names.
+
+try:
+    from jellyfish import metaphone
+except ImportError:
+    metaphone = None
+
+
+class ColumnIndex(object):
+    """Finds column names within one edit, or sounding alike, of a term.
+
+    Uses a symmetric delete table: every name is stored under itself and
+    under each string made by deleting one of its characters. Two strings
+    within edit distance one always share a key, so a lookup only touches
+    the handful of names filed under the term's own keys, no matter how
+    many columns the dataset has.
+    """
+
+    def __init__(self, names, excluded=('vs',), phonetic=True,
+                 min_fuzzy_len=3):
+        """Builds the index.
+
+        Args:
+            names: Column names of the dataset.
+            excluded: Names that are never returned.
+            phonetic: If True and jellyfish is installed, also match names
+                with the same metaphone key.
+            min_fuzzy_len: Terms shorter than this only match exactly, so
+                that e.g. "x" does not also return "y" and "z".
+        """
+        self.names = [n for n in names if n not in excluded]
+        self.exact = set(self.names)
+        self.min_fuzzy_len = min_fuzzy_len
+        self.order = dict((n, i) for i, n in enumerate(self.names))
+        self.deletes = {}
+        for name in self.names:
+            for key in _deletes(name):
+                self.deletes.setdefault(key, set()).add(name)
+        self.sounds = None
+        if phonetic and metaphone is not None:
+            self.sounds = {}
+            for name in self.names:
+                if len(name) >= min_fuzzy_len:
+                    self.sounds.setdefault(_sound(name), set()).add(name)
+
+    def lookup(self, term):
+        """Returns names matching term, in dataset column order."""
+        if len(term) < self.min_fuzzy_len:
+            return [term] if term in self.exact else []
+        found = set()
+        for key in _deletes(term):
+            for name in self.deletes.get(key, ()):
+                if _within_one_edit(term, name):
+                    found.add(name)
+        if self.sounds is not None:
+            found.update(self.sounds.get(_sound(term), ()))
+        return sorted(found, key=self.order.get)
+
+    def matches(self, terms):
+        """Returns names matching any of terms, in term order."""
+        matches = []
+        for t in terms:
+            matches.extend(self.lookup(t))
+        return matches
+
+
+def _deletes(s):
+    # The string itself plus every single-character deletion of it.
+    keys = set([s])
+    for i in range(len(s)):
+        keys.add(s[:i] + s[i+1:])
+    return keys
+
+
+def _sound(s):
+    if not isinstance(s, unicode):
+        s = s.decode('ascii', 'ignore')
+    return metaphone(s)
+
+
+def _within_one_edit(a, b):
+    # Levenshtein distance <= 1, in linear time.
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i+1:] == b[i+1:]
+    return a[i:] == b[i+1:]
@@ -0,0 +1,374 @@
+#!/usr/bin/python
+
+# Title: Command Parser
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Turns recognized speech into a structured intent in a single pass.
+
+import unicodedata
+
+
+# Keyword table. Each word maps to (slot, value, priority). When several words
+# of the same slot appear in one command, the lowest priority wins, which
+# preserves the order the old if/elif chains checked keywords in.
+KEYWORDS = {
+    # Actions: quit beats save beats reset, undo, redo and switch, which beat
+    # summary and profile.
+    'quit': ('action', 'quit', 0),
+    'stop': ('action', 'quit', 0),
+    'done': ('action', 'quit', 0),
+    'finish': ('action', 'quit', 0),
+    'finished': ('action', 'quit', 0),
+    'end': ('action', 'quit', 0),
+    'enough': ('action', 'quit', 0),
+    'exit': ('action', 'quit', 0),
+    'goodbye': ('action', 'quit', 0),
+    'close': ('action', 'quit', 0),
+    'save': ('action', 'save', 1),
+    'reset': ('action', 'reset', 2),
+    'clear': ('action', 'reset', 2),
+    'new': ('action', 'reset', 2),
+    'undo': ('action', 'undo', 2),
+    'back': ('action', 'undo', 2),
+    'redo': ('action', 'redo', 2),
+    'switch': ('action', 'switch', 2),
+    'open': ('action', 'switch', 2),
+    'summary': ('action', 'summary', 3),
+    'summarize': ('action', 'summary', 3),
+    'describe': ('action', 'summary', 3),
+    'description': ('action', 'summary', 3),
+    'profile': ('action', 'profile', 3),
+    'timings': ('action', 'profile', 3),
+    # Grids of graphs beat any single geometry: "scatter matrix of carat
+    # price depth", "all pairs", "histogram of everything".
+    'matrix': ('geom', 'matrix', -1),
+    'pairs': ('geom', 'matrix', -1),
+    'everything': ('geom', 'each', -1),
+    # Geometries: histogram beats density beats line beats bar beats point.
+    'histogram': ('geom', 'hist', 0),
+    'density': ('geom', 'density', 1),
+    'line': ('geom', 'line', 2),
+    'bar': ('geom', 'bar', 3),
+    'barplot': ('geom', 'bar', 3),
+    'point': ('geom', 'point', 4),
+    'scatter': ('geom', 'point', 4),
+    # Stat functions.
+    'smooth': ('smooth', True, 0),
+}
+
+# Words that pick how large scatter plots are drawn. "density" also names a
+# geometry, so these are looked up separately from the keyword table.
+RENDER_WORDS = {
+    'full': 'full',
+    'sample': 'sample',
+    'sampled': 'sample',
+    'density': 'density',
+    'heatmap': 'density',
+    'hexbin': 'density',
+    'auto': 'auto',
+    'automatic': 'auto',
+}
+
+# Words that pick how a grouped histogram is laid out.
+LAYOUT_WORDS = {
+    'overlay': 'overlay',
+    'overlaid': 'overlay',
+    'overlap': 'overlay',
+    'ridgeline': 'ridgeline',
+    'ridge': 'ridgeline',
+    'ridges': 'ridgeline',
+    'grid': 'grid',
+    'panels': 'grid',
+    'facet': 'grid',
+    'facets': 'grid',
+}
+
+# Bigrams like "group by" and "color x" request a grouping.
+GROUP_WORDS = frozenset(['group', 'color', 'colour'])
+GROUP_LINKS = frozenset(['by', 'x'])
+
+# Filters. A comparison word between a variable and a number, as in "price
+# above 5000"; "is" between a variable and a value, as in "where cut is
+# ideal"; or a rank word before a count and a variable, as in "top ten
+# clarity". "clear filters" removes them all.
+COMPARE_WORDS = {
+    'above': '>',
+    'over': '>',
+    'greater': '>',
+    'more': '>',
+    'higher': '>',
+    'exceeds': '>',
+    'below': '<',
+    'under': '<',
+    'less': '<',
+    'fewer': '<',
+    'lower': '<',
+    'between': 'between',
+}
+EQUAL_WORDS = frozenset(['is', 'equals'])
+NOT_WORDS = frozenset(['not'])
+RANK_WORDS = {
+    'top': 'top',
+    'highest': 'top',
+    'largest': 'top',
+    'bottom': 'bottom',
+    'lowest': 'bottom',
+    'smallest': 'bottom',
+}
+FILTER_WORDS = frozenset(['filter', 'filters'])
+CLEAR_WORDS = frozenset(['clear', 'remove', 'drop', 'no', 'without'])
+# Words skipped between a comparison and its number, as in "more than".
+COMPARE_LINKS = frozenset(['than', 'to'])
+# Words that end the value of "is", as in "cut is ideal and color is e".
+VALUE_ENDS = frozenset(['and', 'where', 'with', 'or', 'by'])
+FILTER_CUES = (frozenset(COMPARE_WORDS) | EQUAL_WORDS | frozenset(RANK_WORDS) |
+               FILTER_WORDS)
+
+# Spoken numbers, as recognizers may spell them out.
+NUMBER_WORDS = dict(zip(
+    'zero one two three four five six seven eight nine ten eleven twelve '
+    'thirteen fourteen fifteen sixteen seventeen eighteen nineteen'.split(),
+    range(20)))
+NUMBER_WORDS.update(zip(
+    'twenty thirty forty fifty sixty seventy eighty ninety'.split(),
+    range(20, 100, 10)))
+SCALE_WORDS = {'hundred': 100, 'thousand': 1000, 'million': 10 ** 6}
+
+
+class Intent(object):
+    """Structured reading of one voice command.
+
+    Attributes:
+        action: One of 'quit', 'save', 'reset', 'undo', 'redo', 'switch',
+            'unfilter', 'summary', 'profile' or 'edit'.
+        terms: Tokens left after removing stopwords.
+        geom: Geometry keyword found in the command, or None.
+        smooth: True if a smoothing function was requested.
+        group_by: True if the command asks to group or color by a variable.
+        render_mode: How to draw large scatter plots, or None.
+        layout: How to lay out a grouped histogram, or None.
+        filters: List of (term, op, value) filters, with the variable as
+            spoken. op is '>', '<', 'between', '==', '!=', 'top' or
+            'bottom'; value is a number, a (low, high) pair, or for '==' and
+            '!=' the spoken value, or a number if it is one.
+    """
+    __slots__ = ('action', 'terms', 'geom', 'smooth', 'group_by',
+                 'render_mode', 'layout', 'filters')
+
+    def __init__(self, terms):
+        self.action = 'edit'
+        self.terms = terms
+        self.geom = None
+        self.smooth = False
+        self.group_by = False
+        self.render_mode = None
+        self.layout = None
+        self.filters = []
+
+    def __repr__(self):
+        return 'Intent({})'.format(', '.join(
+            '{}={!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+
+class CommandParser(object):
+    """Classifies voice commands.
+
+    Built once at startup, it holds a frozen stopword set and the keyword
+    table, so each utterance costs one scan over its tokens.
+    """
+
+    def __init__(self, stopwords=None):
+        """Loads the stopword set.
+
+        Args:
+            stopwords: Iterable of words to drop. Defaults to the NLTK english
+                stopword list.
+        """
+        if stopwords is None:
+            from nltk.corpus import stopwords as sw
+            stopwords = sw.words('english')
+        self.stopwords = frozenset(stopwords)
+        self.keywords = KEYWORDS
+
+    def vocabulary(self):
+        """Returns every word the parser gives a meaning to."""
+        return sorted(set(self.keywords) | set(RENDER_WORDS) |
+                      set(LAYOUT_WORDS) | GROUP_WORDS | GROUP_LINKS |
+                      FILTER_CUES | NOT_WORDS | CLEAR_WORDS | COMPARE_LINKS |
+                      set(NUMBER_WORDS) | set(SCALE_WORDS))
+
+    def split(self, text):
+        """Normalizes text to lowercase ascii and splits it on spaces."""
+        if isinstance(text, unicode):
+            text = unicodedata.normalize('NFKD', text).encode('ascii',
+                                                              'ignore')
+        return text.lower().split(' ')
+
+    def tokenize(self, text):
+        """Returns the tokens of text that are not stopwords."""
+        stopwords = self.stopwords
+        return [t for t in self.split(text) if t not in stopwords]
+
+    def parse(self, text):
+        """Classifies text in one pass over its tokens.
+
+        Args:
+            text: Recognized speech.
+
+        Returns:
+            intent: Intent object.
+        """
+        stopwords = self.stopwords
+        keywords = self.keywords
+        terms = []
+        intent = Intent(terms)
+        best = {}
+        prev = None
+        tokens = self.split(text)
+        used = ()
+        if not FILTER_CUES.isdisjoint(tokens):
+            intent.filters, used = self.parse_filters(tokens)
+        for i, t in enumerate(tokens):
+            # Check bigrams before stopwords are dropped, since "by" is one.
+            if prev in GROUP_WORDS and t in GROUP_LINKS:
+                intent.group_by = True
+            prev = t
+            if t in RENDER_WORDS:
+                intent.render_mode = RENDER_WORDS[t]
+            if t in LAYOUT_WORDS:
+                intent.layout = LAYOUT_WORDS[t]
+            if t in stopwords or i in used:
+                continue
+            terms.append(t)
+            hit = keywords.get(t)
+            if hit is not None:
+                slot, value, priority = hit
+                if priority < best.get(slot, (None, priority + 1))[1]:
+                    best[slot] = (value, priority)
+
+        if 'action' in best:
+            intent.action = best['action'][0]
+        if 'geom' in best:
+            intent.geom = best['geom'][0]
+        if 'smooth' in best:
+            intent.smooth = True
+        if (not FILTER_WORDS.isdisjoint(tokens) and
+                not CLEAR_WORDS.isdisjoint(tokens)):
+            intent.action = 'unfilter'
+        return intent
+
+    def parse_filters(self, tokens):
+        """Finds the filters in the tokens of a command.
+
+        Args:
+            tokens: Tokens from split().
+
+        Returns:
+            filters: List of (term, op, value) filters, as in Intent.
+            used: Set of positions of the tokens that the filters took,
+                which are not terms of the command.
+        """
+        filters = []
+        used = set()
+        n = len(tokens)
+        for i, t in enumerate(tokens):
+            if i in used:
+                continue
+            if t in RANK_WORDS:
+                # "top ten clarity": a count, then the variable.
+                count, j = _number(tokens, i + 1)
+                j = self._content(tokens, j, 1, used)
+                if count is not None and j is not None:
+                    filters.append((tokens[j], RANK_WORDS[t], int(count)))
+                    used.update(range(i, j + 1))
+            elif t in COMPARE_WORDS:
+                # "price above 5000", "carat between 1 and 2".
+                j = i + 1
+                while j < n and tokens[j] in COMPARE_LINKS:
+                    j += 1
+                low, k = _number(tokens, j)
+                value = low
+                if COMPARE_WORDS[t] == 'between' and low is not None:
+                    if k < n and tokens[k] == 'and':
+                        high, k = _number(tokens, k + 1)
+                    else:
+                        high = None
+                    value = (min(low, high), max(low, high))
+                    if high is None:
+                        value = None
+                col = self._content(tokens, i - 1, -1, used)
+                if value is not None and col is not None:
+                    filters.append((tokens[col], COMPARE_WORDS[t], value))
+                    used.update([col] + range(i, k))
+            elif t in EQUAL_WORDS:
+                # "where cut is ideal", "color is not e".
+                j = i + 1
+                op = '=='
+                if j < n and tokens[j] in NOT_WORDS:
+                    op = '!='
+                    j += 1
+                if j < n and (tokens[j] in COMPARE_WORDS or
+                              tokens[j] in COMPARE_LINKS):
+                    # "is above 5000" is a comparison.
+                    continue
+                k = j
+                while k < n and tokens[k] not in VALUE_ENDS:
+                    k += 1
+                col = self._content(tokens, i - 1, -1, used)
+                value, end = _number(tokens, j)
+                if end != k:
+                    value = ' '.join(tokens[j:k])
+                if k > j and col is not None:
+                    filters.append((tokens[col], op, value))
+                    used.update([col] + range(i, k))
+        return filters, used
+
+    def _content(self, tokens, i, step, used):
+        # Position of the first token from i on, in the direction of step,
+        # that is not a stopword, a number or taken; None if there is none.
+        while 0 <= i < len(tokens):
+            t = tokens[i]
+            if i in used or _number(tokens, i)[0] is not None:
+                return None
+            if t not in self.stopwords:
+                return i
+            i += step
+        return None
+
+
+def _number(tokens, i):
+    """Reads a number at tokens[i], as digits or as words.
+
+    Returns:
+        value: The number as a float, or None if there is none.
+        end: Position after the number.
+    """
+    if i >= len(tokens):
+        return None, i
+    t = tokens[i].strip('$%').replace(',', '')
+    try:
+        return float(t), i + 1
+    except ValueError:
+        pass
+    total = current = 0
+    j = i
+    while j < len(tokens):
+        t = tokens[j]
+        if t in NUMBER_WORDS:
+            current += NUMBER_WORDS[t]
+        elif t == 'hundred':
+            current = max(current, 1) * 100
+        elif t in SCALE_WORDS:
+            total += max(current, 1) * SCALE_WORDS[t]
+            current = 0
+        elif t == 'a' and j == i and j + 1 < len(tokens) and (
+                tokens[j + 1] in SCALE_WORDS):
+            # "a thousand".
+            pass
+        else:
+            break
+        j += 1
+    if j == i:
+        return None, i
+    return float(total + current), j
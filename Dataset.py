@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+# Title: Dataset
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# A dataset and the structures derived from it, shared by graph objects.
+
+import itertools
+import os
+from Aggregate import AggregateCache
+from ColumnIndex import ColumnIndex
+from DatasetCache import DatasetCache, fingerprint
+from Loader import DatasetLoader, normalize
+from RowIndex import RowIndex
+from Schema import DatasetSchema
+from Stats import DatasetStats
+
+# Numbers Datasets that did not come from a file.
+_unsaved = itertools.count()
+
+
+class Dataset(object):
+    """A DataFrame plus its schema, aggregation cache, row filter index and
+    column name index.
+
+    Every Graphic that plots the same data points at one Dataset, so copies
+    of a graph share the derived structures instead of rebuilding them. The
+    frame may still be loading; it is waited for on first use.
+    """
+
+    def __init__(self, frame=None, path=None, loader=None):
+        """Wraps a DataFrame, or a DatasetLoader that is producing one.
+
+        Columns of frame are converted to compact types on first use, in a
+        shallow copy, so the caller's frame is left as it was.
+
+        Args:
+            frame: Pandas DataFrame, if already loaded.
+            path: File the data was read from.
+            loader: DatasetLoader, if frame is not given.
+        """
+        self.path = path
+        self.loader = loader
+        if frame is not None:
+            frame = frame.copy(deep=False)
+        self._frame = frame
+        self._schema = None
+        self._aggregates = None
+        self._row_index = None
+        self._stats = None
+        self._fingerprint = None
+        # Bytes of the loaded columns with default and with compact types.
+        self.memory = (0, 0)
+        self._normalized = False
+        self.lazy_columns = loader is not None and loader.lazy_columns
+        if frame is not None:
+            self.columns = list(frame.columns)
+        else:
+            self.columns = list(loader.columns)
+        self.column_index = ColumnIndex(self.columns)
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self.load()
+            self._frame = self.loader.frame()
+        if not self._normalized:
+            self._normalized = True
+            self._normalize()
+        return self._frame
+
+    def _normalize(self, columns=None):
+        # Compact any column the loader could not type, such as those of an
+        # in-memory frame, and report the saving. Cached datasets are stored
+        # compact already.
+        if self.loader is not None and self.loader.from_cache:
+            if columns is None:
+                self.memory = (0, int(self._frame.memory_usage(
+                    index=False, deep=True).sum()))
+            return
+        naive, compact = normalize(self.frame, columns)
+        self.memory = (self.memory[0] + naive, self.memory[1] + compact)
+        if naive:
+            print('Dataset uses {:.1f} MB, {:.1f} MB less than with default '
+                  'types.'.format(self.memory[1] / 1e6,
+                                  (self.memory[0] - self.memory[1]) / 1e6))
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            self._schema = DatasetSchema(self.frame)
+        return self._schema
+
+    @property
+    def row_index(self):
+        if self._row_index is None:
+            self._row_index = RowIndex(self.frame, self.schema)
+        return self._row_index
+
+    @property
+    def aggregates(self):
+        if self._aggregates is None:
+            self._aggregates = AggregateCache(self.frame, self.schema,
+                                              self.row_index, self.stats)
+        return self._aggregates
+
+    @property
+    def stats(self):
+        """DatasetStats gathered while loading, or from the cache. Columns
+        missing from it are scanned when first described."""
+        if self._stats is None:
+            self.frame
+            stats = self.loader.stats if self.loader is not None else None
+            self._stats = stats if stats is not None else DatasetStats()
+        return self._stats
+
+    @property
+    def fingerprint(self):
+        """Key that changes whenever the data changes, for caching renders.
+
+        Based on the file's path, size and mtime. Data that did not come from
+        a file gets a key of its own.
+        """
+        if self._fingerprint is None:
+            if self.path is not None and os.path.isfile(self.path):
+                self._fingerprint = fingerprint(self.path)
+            else:
+                self._fingerprint = 'unsaved-{}'.format(next(_unsaved))
+        return self._fingerprint
+
+    @property
+    def ready(self):
+        """True if the frame is available without waiting."""
+        return self._frame is not None or (self.loader is not None and
+                                           self.loader.done)
+
+    @property
+    def loaded(self):
+        """True while the data is in memory, or being read into it."""
+        return self._frame is not None or self.loader is not None
+
+    def load(self):
+        """Starts reading the data from its file again, after unload()."""
+        if not self.loaded:
+            self.loader = DatasetLoader(self.path,
+                                        lazy_columns=self.lazy_columns)
+        return self
+
+    def unload(self):
+        """Frees the frame and the structures derived from it.
+
+        A complete frame is written to the dataset cache first, unless it is
+        there already, so that the next use maps it back instead of parsing
+        the file again. Data that did not come from a file, or is still
+        loading, stays.
+
+        Returns:
+            unloaded: True if the data was unloaded.
+        """
+        if self.path is None or not self.ready:
+            return False
+        lazy = self.loader is not None and self.loader.lazy_columns
+        if self._frame is not None and not lazy:
+            cache = DatasetCache(self.path)
+            if not cache.exists():
+                try:
+                    cache.save(self._frame, self.stats)
+                except (IOError, OSError, ValueError), e:
+                    print 'Could not write dataset cache: {}'.format(e)
+        self.loader = None
+        self._frame = self._schema = self._aggregates = None
+        self._row_index = self._stats = None
+        self._fingerprint = None
+        self.memory = (0, 0)
+        self._normalized = False
+        return True
+
+    def require(self, cols):
+        """Makes sure the named columns are loaded, if loading is lazy."""
+        if self.loader is not None and self.loader.lazy_columns:
+            # Take the frame first, so the columns it already has are
+            # normalized now, and the added ones once, below.
+            frame = self.frame
+            added = self.loader.ensure_columns(cols)
+            if added:
+                self._normalize(added)
+            for col in added:
+                self.schema.add(col, frame[col])
+
+    def preview(self, n=5):
+        """Returns the first n rows, without waiting for the full load."""
+        if not self.ready or (self.loader is not None and
+                              self.loader.lazy_columns):
+            return self.load().loader.sample.head(n)
+        return self.frame.head(n)
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+# Title: Dataset Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# On-disk columnar cache of parsed datasets, reopened through memory maps.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype
+from Stats import DatasetStats
+
+# Cache directory, created next to each source file.
+CACHE_DIR = '.ggspeak_cache'
+# Bump when the on-disk layout changes, so old entries are ignored.
+CACHE_VERSION = 1
+
+
+def fingerprint(path):
+    """Returns a key that changes whenever the file at path changes."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    raw = '{}|{}|{}|{}'.format(CACHE_VERSION, path, st.st_size, st.st_mtime)
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+class DatasetCache(object):
+    """Stores a parsed, header-normalized dataset as one .npy file per column.
+
+    Numeric columns are saved as they are. Every other column is saved as
+    integer category codes, with its labels in schema.json, and column
+    statistics, if given, in stats.json. Names and labels come back as the
+    byte strings a fresh parse of the file gives. Entries are keyed
+    by the source path, size and mtime, so an edited file misses the cache
+    and its old entry is removed on the next save.
+    """
+
+    def __init__(self, path, root=None):
+        """Locates the cache entry of a source file.
+
+        Args:
+            path: Source CSV file path.
+            root: Cache directory. Defaults to CACHE_DIR next to the file.
+        """
+        self.path = os.path.abspath(path)
+        if root is None:
+            root = os.path.join(os.path.dirname(self.path), CACHE_DIR)
+        self.root = root
+        self.key = fingerprint(self.path)
+        self.prefix = os.path.basename(self.path) + '-'
+        self.entry = os.path.join(root, self.prefix + self.key)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.entry, 'schema.json'))
+
+    def load(self):
+        """Opens the cached dataset, or returns None on a miss.
+
+        Numeric columns are memory-mapped read-only, so opening costs about
+        the same for any file size, and pages are only read when used.
+        """
+        if not self.exists():
+            return None
+        with open(os.path.join(self.entry, 'schema.json')) as f:
+            schema = json.load(f)
+        names = []
+        arrays = []
+        for col in schema['columns']:
+            values = np.load(os.path.join(self.entry, col['file']),
+                             mmap_mode='r')
+            texts = _from_json_text([col['name']] +
+                                    col.get('categories', []),
+                                    col.get('encoding', 'utf-8'))
+            if col['kind'] == 'category':
+                values = pd.Categorical.from_codes(values, texts[1:])
+            names.append(texts[0])
+            arrays.append(values)
+        return _frame(names, arrays, schema['n_rows'])
+
+    def load_stats(self):
+        """Returns the DatasetStats saved with the entry, or None."""
+        path = os.path.join(self.entry, 'stats.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            d = json.load(f)
+        for col in d['columns']:
+            counts = col.get('counts', [])
+            texts = _from_json_text([col['name']] + [kv[0] for kv in counts],
+                                    col.get('encoding', 'utf-8'))
+            col['name'] = texts[0]
+            if 'counts' in col:
+                col['counts'] = [(label, kv[1])
+                                 for label, kv in zip(texts[1:], counts)]
+        return DatasetStats.from_dict(d)
+
+    def save(self, frame, stats=None):
+        """Writes frame to the cache, replacing old entries of the source.
+
+        Args:
+            frame: Pandas DataFrame.
+            stats: DatasetStats of frame, to save with it.
+        """
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        # Write to a temporary directory first, so readers never see a
+        # half-written entry.
+        tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            columns = []
+            for i, name in enumerate(frame.columns):
+                series = frame[name]
+                col = {'file': '{}.npy'.format(i)}
+                labels = []
+                if series.dtype.kind in 'biuf':
+                    col['kind'] = 'array'
+                    values = series.values
+                else:
+                    col['kind'] = 'category'
+                    if is_categorical_dtype(series.dtype):
+                        values = series.cat.codes.values
+                        labels = series.cat.categories
+                    else:
+                        values, labels = pd.factorize(series, sort=True)
+                    labels = np.asarray(labels).tolist()
+                texts, col['encoding'] = _to_json_text([name] + labels)
+                col['name'] = texts[0]
+                if col['kind'] == 'category':
+                    col['categories'] = texts[1:]
+                np.save(os.path.join(tmp, col['file']), values)
+                columns.append(col)
+            schema = {'source': self.path, 'n_rows': len(frame),
+                      'columns': columns}
+            with open(os.path.join(tmp, 'schema.json'), 'w') as f:
+                json.dump(schema, f)
+            if stats is not None:
+                d = stats.to_dict()
+                for col in d['columns']:
+                    counts = col.get('counts', [])
+                    texts, col['encoding'] = _to_json_text(
+                        [col['name']] + [label for label, _ in counts])
+                    col['name'] = texts[0]
+                    if 'counts' in col:
+                        col['counts'] = [(text, n) for text, (_, n)
+                                         in zip(texts[1:], counts)]
+                with open(os.path.join(tmp, 'stats.json'), 'w') as f:
+                    json.dump(d, f)
+            self.clear()
+            os.rename(tmp, self.entry)
+        except:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def clear(self):
+        """Removes every cache entry of the source file."""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.startswith(self.prefix):
+                shutil.rmtree(os.path.join(self.root, name),
+                              ignore_errors=True)
+
+
+def _to_json_text(values):
+    # Values made safe for JSON, and the encoding that turns their text back
+    # into the byte strings they were. Byte strings are decoded as utf-8, or
+    # if they are not utf-8, as latin-1, which maps each byte to one
+    # character. Unicode text, numbers and booleans are kept.
+    encoding = 'utf-8'
+    for value in values:
+        if isinstance(value, str):
+            try:
+                value.decode(encoding)
+            except UnicodeDecodeError:
+                encoding = 'latin-1'
+                break
+    return ([v.decode(encoding) if isinstance(v, str) else v
+             for v in values], encoding)
+
+
+def _from_json_text(values, encoding='utf-8'):
+    # Byte strings of the text read back from JSON; other values as they
+    # are.
+    return [_encode(v, encoding) if isinstance(v, unicode) else v
+            for v in values]
+
+
+def _encode(text, encoding):
+    try:
+        return text.encode(encoding)
+    except UnicodeEncodeError:
+        # Text that was unicode to begin with, next to latin-1 bytes.
+        return text.encode('utf-8')
+
+
+def _frame(names, arrays, n_rows):
+    # Builds a DataFrame with one block per column, so the memory-mapped
+    # arrays are used as they are. The DataFrame constructors would copy
+    # them into consolidated blocks.
+    try:
+        from pandas.core.internals import BlockManager, make_block
+        blocks = []
+        for i, values in enumerate(arrays):
+            if not isinstance(values, pd.Categorical):
+                values = np.asarray(values).reshape(1, -1)
+            blocks.append(make_block(values, placement=[i]))
+        axes = [pd.Index(names), pd.RangeIndex(n_rows)]
+        return pd.DataFrame(BlockManager(blocks, axes))
+    except (ImportError, TypeError, ValueError):
+        return pd.DataFrame(dict(zip(names, arrays)), columns=names)
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+
+# Title: Dataset Pool
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# The datasets of a session, by name, kept in memory within a budget.
+
+import os
+from collections import OrderedDict
+from ColumnIndex import ColumnIndex
+from Dataset import Dataset
+from Loader import DatasetLoader, sniff_header
+
+# Memory for loaded datasets that no graph is using. Past it, the least
+# recently used are unloaded, and mapped back from the cache when needed.
+POOL_BUDGET_BYTES = 2 * 1024 ** 3
+
+
+class DatasetPool(object):
+    """Registry of the session's datasets, shared by every Graphic.
+
+    Datasets are registered by file and named after it, and only loaded
+    when first acquired. Graphics point at the pooled Dataset itself, so
+    any number of them share one frame. Acquiring counts a reference and
+    releasing drops it. When loaded datasets take more than the budget,
+    unreferenced ones are unloaded, least recently used first; unloading
+    saves a dataset to the on-disk cache, so switching back to it maps the
+    saved columns instead of parsing the file again.
+    """
+
+    def __init__(self, budget=POOL_BUDGET_BYTES, lazy_columns=False):
+        """Starts an empty pool.
+
+        Args:
+            budget: Bytes that loaded datasets may take.
+            lazy_columns: Passed on to each dataset's loader.
+        """
+        self.budget = budget
+        self.lazy_columns = lazy_columns
+        self.paths = {}
+        # Datasets opened so far, least recently used first.
+        self.datasets = OrderedDict()
+        self.refs = {}
+
+    def add(self, path, name=None):
+        """Registers a file, without loading it.
+
+        Args:
+            path: CSV file path. Raises IOError if it does not exist.
+            name: Name to switch to it by. Defaults to the file name, in
+                lower case and without extension.
+
+        Returns:
+            name: The name it was registered under.
+        """
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise IOError('No such file: {}'.format(path))
+        for known, known_path in self.paths.items():
+            if known_path == path:
+                return known
+        base = name or os.path.splitext(os.path.basename(path))[0].lower()
+        name = base
+        i = 2
+        while name in self.paths:
+            name = '{}{}'.format(base, i)
+            i += 1
+        self.paths[name] = path
+        self.refs[name] = 0
+        return name
+
+    def names(self):
+        return sorted(self.paths)
+
+    def vocabulary(self):
+        """Returns the dataset names and the column names of every file, for
+        the speech recognizer."""
+        words = set(self.paths)
+        for path in self.paths.values():
+            words.update(sniff_header(path))
+        return sorted(words)
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def acquire(self, name):
+        """Returns the named Dataset, loading it if needed, and counts a
+        reference to it. Raises KeyError for unknown names."""
+        path = self.paths[name]
+        dataset = self.datasets.pop(name, None)
+        if dataset is None:
+            # Reads the header and a sample now, and the rest in the
+            # background.
+            loader = DatasetLoader(path, lazy_columns=self.lazy_columns)
+            dataset = Dataset(path=path, loader=loader)
+            dataset.name = name
+        self.datasets[name] = dataset.load()
+        self.refs[name] += 1
+        self.evict()
+        return dataset
+
+    def release(self, name):
+        """Drops a reference taken by acquire()."""
+        if self.refs.get(name, 0) > 0:
+            self.refs[name] -= 1
+        self.evict()
+
+    def nbytes(self):
+        """Bytes taken by the loaded datasets, as far as they are known."""
+        return sum(d.memory[1] for d in self.datasets.values() if d.loaded)
+
+    def evict(self):
+        """Unloads unreferenced datasets until the pool fits its budget.
+
+        Returns:
+            evicted: Names of the unloaded datasets.
+        """
+        evicted = []
+        total = self.nbytes()
+        for name, dataset in self.datasets.items():
+            if total <= self.budget:
+                break
+            if self.refs[name] or not dataset.loaded:
+                continue
+            size = dataset.memory[1]
+            if dataset.unload():
+                total -= size
+                evicted.append(name)
+                print('Unloaded {} ({:.1f} MB).'.format(name, size / 1e6))
+        return evicted
+
+    def report(self):
+        """Prints each registered dataset, with its memory and references."""
+        for name in self.names():
+            dataset = self.datasets.get(name)
+            if dataset is not None and dataset.loaded:
+                state = '{:.1f} MB'.format(dataset.memory[1] / 1e6)
+            else:
+                state = 'on disk'
+            print('  {:20} {:>12} {:3d} graphs'.format(name, state,
+                                                      self.refs[name]))
+        print('  {:20} {:>9.1f} MB of {:.0f} MB'.format(
+            'total', self.nbytes() / 1e6, self.budget / 1e6))
+
+    def match(self, terms):
+        """Returns the dataset name that terms mention, or None.
+
+        Names are matched like column names, within one edit or by sound.
+        """
+        matches = ColumnIndex(self.names()).matches(terms)
+        return matches[0] if matches else None
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+# Title: Graph Specification
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Immutable description of a graph, and the undo history of descriptions.
+
+import hashlib
+import json
+
+# Oldest specs are forgotten past this many steps of history.
+HISTORY_LIMIT = 100
+
+_DEFAULTS = {
+    'dataset': None,
+    'geom': None,
+    'data_cols': (),
+    'grouping': None,
+    'add_smooth': False,
+    'render_mode': 'auto',
+    'layout': 'auto',
+    'filters': (),
+    'color': 'steelblue',
+    'xscale': (None, None),
+    'yscale': (None, None),
+    'xlab': None,
+    'ylab': None,
+    'title': None,
+}
+
+
+class GraphSpec(object):
+    """What a graph shows, and which of the session's datasets it is from.
+
+    Specs cannot be changed; replace() returns a new spec, which shares the
+    unchanged fields with the old one. Lists are stored as tuples. Specs with
+    the same fields are equal and hash alike, so they can key caches. The
+    dataset is a name in the session's DatasetPool, or None for the one
+    the graph was given. Filters are a tuple of RowIndex filter tuples.
+    """
+    __slots__ = ('dataset', 'geom', 'data_cols', 'grouping', 'add_smooth',
+                 'render_mode', 'layout', 'filters', 'color', 'xscale',
+                 'yscale', 'xlab', 'ylab', 'title')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            value = fields.pop(name, _DEFAULTS[name])
+            if isinstance(value, list):
+                value = tuple(value)
+            object.__setattr__(self, name, value)
+        if fields:
+            raise TypeError('Unknown spec fields: {}'.format(
+                ', '.join(sorted(fields))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('GraphSpec cannot be changed; use replace().')
+
+    def replace(self, **changes):
+        """Returns a copy of the spec with some fields changed."""
+        fields = self._fields()
+        fields.update(changes)
+        return GraphSpec(**fields)
+
+    def _fields(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __reduce__(self):
+        # Pickle by fields, as __setattr__ refuses the default way, so specs
+        # can be sent to other processes.
+        return (_unpickle_spec, (self._fields(),))
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, GraphSpec) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def digest(self):
+        """Returns a hex hash of the fields, the same in every process.
+
+        Byte and unicode strings with the same text hash alike, as they
+        compare equal.
+        """
+        return hashlib.sha1(json.dumps(self._key())).hexdigest()
+
+    def __repr__(self):
+        return 'GraphSpec({})'.format(', '.join(
+            '{}={!r}'.format(name, getattr(self, name))
+            for name in self.__slots__
+            if getattr(self, name) != _DEFAULTS[name]))
+
+
+def _unpickle_spec(fields):
+    return GraphSpec(**fields)
+
+
+class SpecHistory(object):
+    """Undo and redo history of graph specs.
+
+    Specs are immutable, so the history holds them as they are, without
+    copying. Recording a new spec after an undo discards the redo steps.
+    """
+
+    def __init__(self, spec=None, limit=HISTORY_LIMIT):
+        """Starts the history.
+
+        Args:
+            spec: First spec. Defaults to an empty one.
+            limit: Number of specs kept.
+        """
+        self.specs = [spec if spec is not None else GraphSpec()]
+        self.position = 0
+        self.limit = limit
+
+    @property
+    def current(self):
+        return self.specs[self.position]
+
+    def record(self, spec):
+        """Makes spec the current spec, unless it already is."""
+        if spec == self.current:
+            return
+        del self.specs[self.position + 1:]
+        self.specs.append(spec)
+        if len(self.specs) > self.limit:
+            del self.specs[:len(self.specs) - self.limit]
+        self.position = len(self.specs) - 1
+
+    def latest(self, predicate):
+        """Returns the newest spec up to the current one that predicate
+        accepts, or None."""
+        for spec in reversed(self.specs[:self.position + 1]):
+            if predicate(spec):
+                return spec
+        return None
+
+    def undo(self):
+        """Steps back. Returns the spec there, or None at the start."""
+        if self.position == 0:
+            return None
+        self.position -= 1
+        return self.current
+
+    def redo(self):
+        """Steps forward. Returns the spec there, or None at the end."""
+        if self.position == len(self.specs) - 1:
+            return None
+        self.position += 1
+        return self.current
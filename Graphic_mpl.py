@@ -9,21 +9,101 @@
 # Note: Changed ggplot source code. See link: http://bit.ly/1UkFZCO
 
 import numpy as np
-import pandas as pd
-from collections import Counter
-from matplotlib import pyplot as plt
-import matplotlib.colors as mplcolors
-import matplotlib.cm as cmx
-plt.style.use('ggplot')
-plt.ion()
+from Aggregate import fold_groups
+from GraphSpec import GraphSpec
+from Multiplot import MULTI_GEOMS
+from RenderCache import RenderCache, render_key
+from RowIndex import describe
+from Tracer import span
+
+# Pyplot is imported, styled and switched to interactive mode by
+# init_backend(), when the first plot is drawn.
+plt = None
+
+# Legends with more entries than this are truncated.
+MAX_LEGEND_ENTRIES = 30
+
+# Scatter plots with more rows than SAMPLE_ROWS are drawn from a sample of
+# about MAX_SCATTER_POINTS rows; with more than DENSITY_ROWS, as a 2-D
+# histogram of DENSITY_BINS x DENSITY_BINS cells.
+SAMPLE_ROWS = 200000
+DENSITY_ROWS = 2000000
+MAX_SCATTER_POINTS = 100000
+MIN_GROUP_SAMPLE = 500
+DENSITY_BINS = 200
+RENDER_MODES = ['auto', 'full', 'sample', 'density']
+
+# Grouped histograms are laid out as a grid of panels, overlaid step lines
+# or a ridgeline, each showing at most this many groups; the smallest groups
+# beyond that are folded into one "other" group. 'auto' uses a grid while
+# the groups fit one, and a ridgeline after that.
+LAYOUTS = ['auto', 'grid', 'overlay', 'ridgeline']
+MAX_HIST_PANELS = 9
+MAX_OVERLAY_GROUPS = 8
+MAX_RIDGES = 24
+# How far each ridge reaches into the row above it.
+RIDGE_OVERLAP = 0.8
+
+# Renders of earlier views, shared by every Graphic.
+render_cache = RenderCache()
+
+
+def init_backend(interactive=True):
+    """Imports pyplot and sets the plot style, once.
+
+    Args:
+        interactive: If True, turn on interactive mode. Headless callers
+            choose the Agg backend first and pass False.
+    """
+    global plt
+    if plt is None:
+        from matplotlib import pyplot
+        pyplot.style.use('ggplot')
+        if interactive:
+            pyplot.ion()
+        plt = pyplot
+    return plt
+
+
+def flush_events():
+    # Let the plot window handle its events, if there is one.
+    if plt is not None and plt.get_fignums():
+        plt.gcf().canvas.flush_events()
+
+
+def _spec_field(name):
+    # Graphic attribute that reads a field of the spec, and sets it by
+    # replacing the spec. Tuples are handed out as lists, as before.
+    def get(self):
+        value = getattr(self.spec, name)
+        return list(value) if isinstance(value, tuple) else value
+
+    def set(self, value):
+        self.spec = self.spec.replace(**{name: value})
+    return property(get, set)
 
 
 class Graphic(object):
     """A general graph template.
 
     Declares all the attributes that a graphing library would need, to build
-    the string used to plot the graph.
+    the string used to plot the graph. The characteristics of the graph live
+    in an immutable GraphSpec; setting one, as in g.geom = 'point', replaces
+    the spec.
     """
+    geom = _spec_field('geom')
+    data_cols = _spec_field('data_cols')
+    grouping = _spec_field('grouping')
+    add_smooth = _spec_field('add_smooth')
+    render_mode = _spec_field('render_mode')
+    layout = _spec_field('layout')
+    filters = _spec_field('filters')
+    color = _spec_field('color')
+    xscale = _spec_field('xscale')
+    yscale = _spec_field('yscale')
+    xlab = _spec_field('xlab')
+    ylab = _spec_field('ylab')
+    title = _spec_field('title')
 
     def __init__(self):
         """Defines characteristics of graph.
@@ -31,174 +111,717 @@ class Graphic(object):
         Sets values for graph characteristics. Some are None, others are
         strings or numbers.
         """
-        self.dataset = None
-        self.filename = None
-        self.data_cols = []
-        self.grouping = None
-        self.geom = None
-        self.color = 'steelblue'
-        self.xscale = [None, None]
-        self.yscale = [None, None]
-        self.xlab = None
-        self.ylab = None
-        self.title = None
+        self.source = None
+        self.spec = GraphSpec()
         self.base = False
-        self.add_smooth = False
         self.valid_graph = False
+        # Rendering state: the figure and axes drawn on, handles to the
+        # artists that deltas update, and what the last draw showed.
+        self.figure = None
+        self.ax = None
+        self.artists = {}
+        self.drawn = None
+        # Finished renders of earlier views, and the spec now on screen.
+        self.renders = render_cache
+        self.shown = None
+
+    def set_dataset(self, dataset, filename=None):
+        """Binds a dataset to the graph.
+
+        Args:
+            dataset: Pandas DataFrame.
+            filename: Path the dataset was read from.
+        """
+        from Dataset import Dataset
+        return self.set_source(Dataset(frame=dataset, path=filename))
+
+    def set_source(self, source):
+        """Binds a Dataset, which may still be loading, to the graph."""
+        if source is not self.source:
+            # Points on screen from other data cannot be updated in place.
+            self.drawn = None
+        self.source = source
+        return self
+
+    # The dataset and its derived structures live on the shared source, so
+    # copies of this graph reuse them.
+    @property
+    def dataset(self):
+        return self.source.frame if self.source is not None else None
+
+    @property
+    def schema(self):
+        return self.source.schema if self.source is not None else None
+
+    @property
+    def aggregates(self):
+        return self.source.aggregates if self.source is not None else None
+
+    @property
+    def filename(self):
+        return self.source.path if self.source is not None else None
+
+    @property
+    def column_index(self):
+        return self.source.column_index if self.source is not None else None
+
+    def is_numeric(self, col):
+        """True if column col holds numbers, according to the schema."""
+        self.source.require([col])
+        return self.schema.is_numeric(col)
+
+    def draw(self):
+        """Draws the graph, reusing what is already on screen if it can.
+
+        When only the grouping or title of a scatter plot changed since the
+        last draw, the existing points are recolored in place instead of the
+        figure being rebuilt. A smoothed line added to an unchanged plot is
+        blitted over it. Returning to a spec that was drawn before shows its
+        saved render, without drawing anything.
+        """
+        with span('save_render'):
+            self._save_render()
+        with span('restore_render'):
+            restored = self._restore_render()
+        if not restored:
+            with span('update_drawn'):
+                updated = self._update_drawn()
+            if not updated:
+                with span('make_gg_plot', geom=self.geom):
+                    self.make_gg_plot()
+        self.shown = self.spec
+        return None
+
+    def _render_key(self, spec):
+        return render_key(spec, self.source.fingerprint,
+                          self.figure.canvas.get_width_height())
+
+    def _save_render(self):
+        # Keep the pixels of the spec on screen, if they are fully rendered.
+        # The figure is stale until the canvas has drawn its latest change,
+        # so this never forces a render of its own.
+        if (self.shown is None or self.figure is None or
+                self.figure.stale):
+            return
+        key = self._render_key(self.shown)
+        if key not in self.renders:
+            pixels = _canvas_pixels(self.figure.canvas)
+            if pixels is not None:
+                self.renders.put(key, pixels)
+
+    def _restore_render(self):
+        """Shows the saved render of the spec, if there is one.
+
+        The render replaces the figure's contents as a single image, so the
+        next change to the graph is drawn in full.
+
+        Returns:
+            restored: True if a saved render was shown.
+        """
+        if self.spec == self.shown:
+            return False
+        if self.figure is None:
+            self.figure = init_backend().gcf()
+        pixels = self.renders.get(self._render_key(self.spec))
+        if pixels is None:
+            return False
+        print 'Showing saved render.'
+        self.figure.clf()
+        self.figure.figimage(pixels, origin='upper')
+        self.ax = None
+        self.artists = {}
+        self.drawn = None
+        self.figure.canvas.draw_idle()
+        return True
+
+    def clear(self):
+        """Clears the figure, and forgets what was drawn on it."""
+        if self.figure is not None:
+            self.figure.clf()
+            self.figure.canvas.draw_idle()
+        self.ax = None
+        self.artists = {}
+        self.drawn = None
+        self.shown = None
+
+    def _plot_key(self):
+        # What decides which points are on screen; changing it needs a full
+        # redraw.
+        return (self.geom, tuple(self.data_cols), self.render_mode,
+                self.spec.filters)
+
+    def _update_drawn(self):
+        """Applies changes since the last draw as deltas on its artists.
+
+        Returns:
+            updated: True if the figure is up to date, False if it needs a
+                full redraw.
+        """
+        drawn = self.drawn
+        if (drawn is None or self.geom != 'point' or
+                drawn['key'] != self._plot_key() or
+                not plt.fignum_exists(self.figure.number)):
+            return False
+        regroup = drawn['grouping'] != self.grouping
+        if regroup and (drawn['strategy'] == 'density' or
+                        (self.grouping is not None and
+                         self.grouping not in self.schema)):
+            return False
+        print self.summarize()
+
+        if regroup:
+            group_schema = self._group_schema()
+            points = self.artists['points']
+            rows = self._filter_rows()
+            if drawn['strategy'] == 'sample':
+                # The stratified sample depends on the grouping.
+                x = self.dataset[str(self.data_cols[0])].values
+                rows = self._sample_rows(group_schema, rows)
+                y = self.dataset[str(self.data_cols[1])].values
+                points.set_offsets(np.column_stack([x[rows], y[rows]]))
+            self._remove_artists('legend', 'colorbar')
+            self._color_points(points, group_schema, rows)
+        retitle = self.ax.get_title() != self._title()
+        self.ax.set_title(self._title())
+        lines = []
+        if regroup or drawn['smooth'] != self.add_smooth:
+            lines = self._draw_smooth()
+        self._mark_drawn(drawn['strategy'])
+        if regroup or retitle:
+            self.figure.canvas.draw_idle()
+        elif lines:
+            self._blit(lines)
+        return True
+
+    def _mark_drawn(self, strategy=None):
+        # Remember what is on screen, to compute the next delta.
+        self.drawn = {'key': self._plot_key(), 'grouping': self.grouping,
+                      'strategy': strategy, 'smooth': self.add_smooth}
+
+    def _blit(self, artists):
+        """Draws artists over the last rendered frame of the axes.
+
+        Only the new artists are rendered, not the points under them. Falls
+        back to a full redraw if nothing was rendered yet.
+        """
+        canvas = self.figure.canvas
+        try:
+            if not canvas.supports_blit:
+                raise AttributeError('Canvas cannot blit.')
+            for artist in artists:
+                self.ax.draw_artist(artist)
+        except AttributeError:
+            canvas.draw_idle()
+            return
+        canvas.blit(self.ax.bbox)
+
+    def _draw_smooth(self):
+        """Overlays a smoothed line of y against x, if add_smooth is set.
+
+        Draws one line per group for a categorical grouping, in the group's
+        color, and a single line otherwise. The lines come from the
+        aggregate cache, so redrawing them does not rescan the data.
+
+        Returns:
+            lines: The Line2D artists drawn.
+        """
+        self._remove_artists('smooth')
+        if not self.add_smooth:
+            return []
+        x_name, y_name = str(self.data_cols[0]), str(self.data_cols[1])
+        group_schema = self._group_schema()
+        if group_schema is None or group_schema.is_numeric:
+            centers, means, _ = self.aggregates.smooth(
+                x_name, y_name, where=self.spec.filters)
+            lines = self.ax.plot(centers, means, color='black', linewidth=2)
+        else:
+            centers, means, labels = self.aggregates.smooth(
+                x_name, y_name, group_schema.name, where=self.spec.filters)
+            lut = _category_colors(len(labels))
+            lines = []
+            for i in range(len(labels)):
+                lines.extend(self.ax.plot(centers, means[i], color=lut[i],
+                                          linewidth=2.5))
+        self.artists['smooth'] = lines
+        return lines
+
+    def _new_axes(self):
+        # Clear the figure and start a single set of axes. Artist handles of
+        # the previous plot are dropped with it.
+        if self.figure is None:
+            self.figure = init_backend().gcf()
+        self.figure.clf()
+        self.ax = self.figure.add_subplot(111)
+        self.artists = {}
+        self.drawn = None
+        return self.ax
+
+    def _remove_artists(self, *names):
+        for name in names:
+            artist = self.artists.pop(name, None)
+            if artist is None:
+                continue
+            for a in artist if isinstance(artist, list) else [artist]:
+                a.remove()
+            if name == 'colorbar':
+                # Removing a colorbar does not give its space back.
+                self.ax.set_position(self.artists.pop('ax_position'))
+
+    def _title(self):
+        if self.title:
+            return self.title
+        if self.geom == 'point':
+            title = '{} vs {}'.format(self.data_cols[0], self.data_cols[1])
+        elif self.geom == 'matrix':
+            title = 'Scatter matrix of {}'.format(', '.join(self.data_cols))
+        elif self.geom == 'each':
+            title = 'Distribution of each variable'
+        else:
+            title = 'Distribution of {}'.format(self.data_cols[0])
+        if self.spec.filters:
+            title += '\n({})'.format(describe(self.spec.filters))
+        return title
+
+    def _filter_rows(self):
+        # Positions of the rows that pass the filters, or None for all rows.
+        if not self.spec.filters:
+            return None
+        return np.flatnonzero(self.source.row_index.mask(self.spec.filters))
+
+    def _group_schema(self):
+        if self.grouping is None:
+            return None
+        return self.schema[self.grouping]
 
     def make_gg_plot(self):
         """Builds graph with matplotlib.
 
         Assembles characteristics in the syntax of the graphic library.
         """
+        init_backend()
         print self.summarize()
+        ax = self._new_axes()
 
         # Make a scatter plot.
         if self.geom in ['point']:
             # Make some data shortcuts.
             d1_name = str(self.data_cols[0])
             d2_name = str(self.data_cols[1])
-            d1 = self.dataset[d1_name]
-            d2 = self.dataset[d2_name]
+            x = self.dataset[d1_name].values
+            y = self.dataset[d2_name].values
             # Prepare figure.
-            plt.xlabel(d1_name)
-            plt.ylabel(d2_name)
-            plt.title('{} vs {}'.format(d1_name, d2_name))
-
-            # Make regular scatterplot, if no grouping is defined.
-            if self.grouping is None:
-                plt.scatter(d1, d2, edgecolors='none', alpha=0.5)
+            ax.set_xlabel(d1_name)
+            ax.set_ylabel(d2_name)
+            ax.set_title(self._title())
 
-            # Make grouped scatterplot, if grouping is defined.
-            else:
-                d = self.dataset
-                grouping_name = self.grouping
-                print 'Grouping name: {}'.format(grouping_name)
-                try:
-                    group_example = d[grouping_name][0]
-                except:
-                    print 'Group example caused problems. Try again.'
-                    print d[grouping_name].head(3)
-                    print grouping_name
+            # Look up grouping, if grouping is defined.
+            if self.grouping is not None:
+                print 'Grouping name: {}'.format(self.grouping)
+                if self.grouping not in self.schema:
+                    print 'Grouping variable not found. Try again.'
+                    print self.grouping
                     return None
+            group_schema = self._group_schema()
 
-                # Categorical grouping.
-                if not isinstance(group_example, (int, long, float)):
-                    cat_vals = np.unique(d[grouping_name])
-                    # Prepare color coding.
-                    cmap = plt.get_cmap('Paired')
-                    colors = mplcolors.Normalize(vmin=0, vmax=len(cat_vals))
-                    colors = cmx.ScalarMappable(norm=colors, cmap=cmap)
-                    for i in range(len(cat_vals)):
-                        category_indices = (d[grouping_name] == cat_vals[i])
-                        plt.scatter(d[d1_name][category_indices],
-                                    d[d2_name][category_indices],
-                                    c=colors.to_rgba(i), label=cat_vals[i],
-                                    marker='o', edgecolors='none')
-                    plt.legend()
-
-                # Numerical grouping.
-                else:
-                    # Color using colorbar.
-                    cmap = plt.get_cmap('YlGnBu')
-                    p = plt.scatter(d[d1_name], d[d2_name], c=d[grouping_name],
-                                    cmap=cmap, marker='o', edgecolors='none',
-                                    vmin=min(d[grouping_name]),
-                                    vmax=max(d[grouping_name]))
-                    cb = plt.colorbar(p)
-                    cb.set_label(grouping_name)
+            # Pick how to draw the points, based on how many there are.
+            rows = self._filter_rows()
+            n_rows = len(x) if rows is None else len(rows)
+            strategy = self.scatter_strategy(n_rows)
+            print 'Drawing {} rows as {}.'.format(n_rows, strategy)
+            if strategy == 'density':
+                self._density_scatter(x, y, group_schema, rows)
+            else:
+                if strategy == 'sample':
+                    rows = self._sample_rows(group_schema, rows)
+                if rows is not None:
+                    x, y = x[rows], y[rows]
+                points = ax.scatter(x, y, marker='o', edgecolors='none')
+                self.artists['points'] = points
+                self._color_points(points, group_schema, rows)
+            self._draw_smooth()
+            self._mark_drawn(strategy)
 
         # Make a histogram or bar chart.
         elif self.geom in ['hist', 'bar']:
 
-            d = self.dataset
             d_name = str(self.data_cols[0])
-            d_var_example = d[d_name][0]
-            plt.xlabel(d_name)
-            plt.ylabel('Count')
-            plt.title('Distribution of {}'.format(d_name))
+            ax.set_xlabel(d_name)
+            ax.set_ylabel('Count')
+            ax.set_title(self._title())
+
+            grouping_name = self.grouping
+            if grouping_name is not None and grouping_name not in self.schema:
+                print 'Grouping variable not found. Try again.'
+                return None
 
             # Make a histogram, if geom is hist and data is numeric.
-            if (self.geom == 'hist' and isinstance(d_var_example, (int, long,
-                                                                   float))):
+            if self.geom == 'hist' and self.is_numeric(d_name):
 
                 # Make regular histogram, if no grouping.
-                if self.grouping is None:
-                    pl = d[d_name].hist(alpha=0.5)
-                    pl.set_xlabel(d_name)
-                    pl.set_ylabel('Count')
-                    pl.set_title('Distribution of {}'.format(d_name))
+                if grouping_name is None:
+                    edges, counts, _ = self.aggregates.histogram(
+                        d_name, where=self.spec.filters)
+                    ax.bar(edges[:-1], counts, width=np.diff(edges),
+                           align='edge', alpha=0.5)
                 # Make grouped histogram, if has grouping.
                 else:
-                    pl_list = d[d_name].hist(by=d[self.grouping], alpha=0.5)
-                    pl_list = pl_list.ravel()
-                    for hist in range(len(pl_list)):
-                        pl_list[hist].set_xlabel(d_name)
-                        pl_list[hist].set_ylabel('Count')
+                    self._grouped_histogram(d_name, grouping_name)
 
             # Make a bar chart, if geom is bar or data is categorical.
             else:
 
                 # Make regular bar chart, if no grouping.
-                if self.grouping is None:
-                    freqs = Counter(d[d_name])
-                    f = sorted(freqs.items(), key=lambda (k, v): -v)
-                    names = [i for (i, j) in f]
-                    counts = [j for (i, j) in f]
-                    positions = np.arange(len(f))
-                    plt.bar(positions, counts, align='center', alpha=0.5)
-                    plt.xticks(positions, names)
+                if grouping_name is None:
+                    names, counts = self.aggregates.value_counts(
+                        d_name, where=self.spec.filters)
+                    positions = np.arange(len(names))
+                    ax.bar(positions, counts, align='center', alpha=0.5)
+                    ax.set_xticks(positions)
+                    ax.set_xticklabels(names)
 
                 # Make grouped bar chart, if has grouping.
                 else:
-                    grouping_name = self.grouping
-                    try:
-                        group_example = d[grouping_name][0]
-                    except:
-                        print 'Group example caused problems. Try again.'
-                        return None
-
                     # Categorical grouping.
-                    if not isinstance(group_example, (int, long, float)):
-                        ct = pd.crosstab(index=d[d_name],
-                                         columns=d[self.grouping])
-                        pl = ct.plot.bar()
-                        pl.set_xlabel(d_name)
-                        pl.set_ylabel('Count')
+                    if not self.is_numeric(grouping_name):
+                        self._grouped_bars(d_name, grouping_name)
                     else:
                         print 'Not sure how to group by numeric vars.'
+            self._mark_drawn()
+
+        # Make a grid of graphs, drawn in parallel.
+        elif self.geom in MULTI_GEOMS:
+            self._panel_grid()
+            self._mark_drawn()
 
         else:
             print('Not yet sure how to build this plot.')
 
         return None
 
+    def _panel_grid(self):
+        # Show the panels of a grid as one image, filling the figure.
+        from Multiplot import render_grid
+        ax = self.ax
+        size = self.figure.canvas.get_width_height()
+        image = render_grid(self.spec, self.source, size, self.figure.dpi)
+        ax.imshow(image, interpolation='bilinear')
+        ax.set_axis_off()
+        ax.set_title(self._title())
+        ax.set_position([0.01, 0.01, 0.98, 0.93])
+        # A grid takes seconds to draw, so its render is kept at once, not
+        # only if the canvas has drawn it before the graph next changes.
+        self.figure.canvas.draw()
+        pixels = _canvas_pixels(self.figure.canvas)
+        if pixels is not None:
+            self.renders.put(self._render_key(self.spec), pixels)
+
+    def scatter_strategy(self, n_rows):
+        """Chooses how to draw a scatter plot of n_rows points.
+
+        Returns the render mode if one was asked for. Otherwise small data is
+        drawn in 'full', larger data is drawn from a 'sample', and very large
+        data is aggregated into a 'density' image.
+        """
+        if self.render_mode != 'auto':
+            return self.render_mode
+        if n_rows > DENSITY_ROWS:
+            return 'density'
+        elif n_rows > SAMPLE_ROWS:
+            return 'sample'
+        return 'full'
+
+    def _sample_rows(self, group_schema=None, rows=None):
+        """Picks about MAX_SCATTER_POINTS rows at random.
+
+        With a categorical grouping the sample is stratified, so each group
+        keeps at least MIN_GROUP_SAMPLE rows, or all of its rows if it is
+        smaller. Uses a fixed seed, so redraws show the same points.
+
+        Args:
+            group_schema: ColumnSchema of the grouping column, or None.
+            rows: Sorted row positions to sample from. Defaults to all.
+
+        Returns:
+            rows: Sorted array of row positions.
+        """
+        n_rows = len(self.dataset) if rows is None else len(rows)
+        frac = MAX_SCATTER_POINTS / float(max(n_rows, 1))
+        keys = np.random.RandomState(0).random_sample(n_rows)
+        if group_schema is not None and not group_schema.is_numeric:
+            # Shift codes by one, so null rows (-1) form their own group.
+            codes = group_schema.codes
+            if rows is not None:
+                codes = codes[rows]
+            codes = codes.astype(np.intp) + 1
+            sizes = np.maximum(np.bincount(codes), 1)
+            group_frac = np.clip(MIN_GROUP_SAMPLE / sizes.astype(float),
+                                 frac, 1.0)
+            keep = keys < group_frac[codes]
+        else:
+            keep = keys < frac
+        if rows is None:
+            return np.flatnonzero(keep)
+        return rows[keep]
+
+    def _color_points(self, points, group_schema, rows=None):
+        """Colors an existing scatter collection by a grouping.
+
+        Categorical groupings map the precomputed category codes straight to
+        colors, so all points stay in one collection, and the legend is built
+        from proxy handles. Numeric groupings use a colormap and colorbar.
+
+        Args:
+            points: PathCollection of the scatter plot.
+            group_schema: ColumnSchema of the grouping column, or None.
+            rows: Row positions of the points, if they are a sample.
+        """
+        # Make regular scatterplot, if no grouping is defined.
+        if group_schema is None:
+            points.set_array(None)
+            # First color of the style, as scatter() would pick.
+            points.set_facecolors(
+                plt.rcParams['axes.prop_cycle'].by_key()['color'][0])
+            points.set_alpha(0.5)
+
+        # Categorical grouping.
+        elif not group_schema.is_numeric:
+            codes = group_schema.codes
+            if rows is not None:
+                codes = codes[rows]
+            lut = _category_colors(group_schema.cardinality)
+            colors = lut[codes]
+            # Rows with a null grouping value are hidden, as before.
+            colors[codes < 0, 3] = 0
+            points.set_array(None)
+            points.set_alpha(None)
+            points.set_facecolors(colors)
+            self.artists['legend'] = _category_legend(
+                self.ax, lut, group_schema.categories)
+
+        # Numerical grouping.
+        else:
+            values = self.dataset[group_schema.name].values
+            if rows is not None:
+                values = values[rows]
+            # Color using colorbar.
+            points.set_alpha(None)
+            points.set_array(values)
+            points.set_cmap(plt.get_cmap('YlGnBu'))
+            points.set_clim(group_schema.min, group_schema.max)
+            self.artists['ax_position'] = self.ax.get_position()
+            cb = self.figure.colorbar(points, ax=self.ax)
+            cb.set_label(group_schema.name)
+            self.artists['colorbar'] = cb
+
+    def _density_scatter(self, x, y, group_schema, rows=None):
+        """Draws a scatter plot as a 2-D histogram image.
+
+        Opacity follows the log count of points in each cell. With a
+        categorical grouping each cell takes the color of its most common
+        group; with a numeric grouping, the color of the group's mean. If
+        rows is given, only the rows at those positions are drawn.
+        """
+        codes = values = None
+        if group_schema is not None and not group_schema.is_numeric:
+            codes = group_schema.codes
+        elif group_schema is not None:
+            values = self.dataset[group_schema.name].values
+        if rows is not None:
+            x, y = x[rows], y[rows]
+            codes = codes[rows] if codes is not None else None
+            values = values[rows] if values is not None else None
+        keep = np.isfinite(x) & np.isfinite(y)
+        if codes is not None:
+            keep &= codes >= 0
+        elif values is not None:
+            keep &= np.isfinite(values)
+        if not keep.all():
+            x, y = x[keep], y[keep]
+            codes = codes[keep] if codes is not None else None
+            values = values[keep] if values is not None else None
+        if not len(x):
+            print 'No rows to draw.'
+            return None
+
+        n_cells = DENSITY_BINS * DENSITY_BINS
+        xi, x_lo, x_hi = _bin_index(x, DENSITY_BINS)
+        yi, y_lo, y_hi = _bin_index(y, DENSITY_BINS)
+        cells = yi * DENSITY_BINS + xi
+        counts = np.bincount(cells, minlength=n_cells)
+        shade = 0.25 + 0.75 * np.log1p(counts) / np.log1p(counts.max())
+
+        if group_schema is None:
+            rgba = plt.get_cmap('Blues')(shade)
+        elif codes is not None:
+            k = group_schema.cardinality
+            joint = np.bincount(cells * k + codes, minlength=n_cells * k)
+            dominant = joint.reshape(n_cells, k).argmax(axis=1)
+            lut = _category_colors(k)
+            rgba = lut[dominant]
+            rgba[:, 3] = shade
+            self.artists['legend'] = _category_legend(
+                self.ax, lut, group_schema.categories)
+        else:
+            from matplotlib.cm import ScalarMappable
+            from matplotlib.colors import Normalize
+            sums = np.bincount(cells, weights=values, minlength=n_cells)
+            means = sums / np.maximum(counts, 1)
+            cmap = plt.get_cmap('YlGnBu')
+            norm = Normalize(vmin=group_schema.min, vmax=group_schema.max)
+            rgba = cmap(norm(means))
+            rgba[:, 3] = shade
+            mappable = ScalarMappable(norm=norm, cmap=cmap)
+            mappable.set_array(np.array([]))
+            cb = self.figure.colorbar(mappable, ax=self.ax)
+            cb.set_label(group_schema.name)
+        rgba[counts == 0, 3] = 0
+
+        self.ax.imshow(rgba.reshape(DENSITY_BINS, DENSITY_BINS, 4),
+                       origin='lower', aspect='auto', interpolation='nearest',
+                       extent=(x_lo, x_hi, y_lo, y_hi))
+
+    def _grouped_histogram(self, d_name, grouping_name):
+        """Draws the histogram of each group of a column.
+
+        The counts of every group come from one pass over the rows, on bin
+        edges shared by all groups, so the cost of drawing depends on the
+        number of groups shown, not on the rows. Groups beyond what the
+        layout can show are folded into "other".
+        """
+        edges, counts, labels = self.aggregates.histogram(
+            d_name, grouping_name, where=self.spec.filters)
+        # Groups that the filters leave empty are not drawn.
+        nonempty = counts.sum(axis=1) > 0
+        counts, labels = counts[nonempty], labels[nonempty]
+        if not len(labels):
+            print 'No rows to draw.'
+            return None
+        layout = self.layout
+        if layout == 'auto':
+            layout = 'grid' if len(labels) <= MAX_HIST_PANELS else 'ridgeline'
+        keep = {'grid': MAX_HIST_PANELS, 'overlay': MAX_OVERLAY_GROUPS,
+                'ridgeline': MAX_RIDGES}[layout]
+        counts, labels = fold_groups(counts, labels, keep)
+        print 'Drawing {} groups as {}.'.format(len(labels), layout)
+        if layout == 'grid':
+            self._histogram_grid(d_name, edges, counts, labels)
+        elif layout == 'overlay':
+            self._histogram_overlay(edges, counts, labels, grouping_name)
+        else:
+            self._histogram_ridgeline(edges, counts, labels, grouping_name)
+
+    def _histogram_grid(self, d_name, edges, counts, labels):
+        """Draws one histogram panel per group, from precomputed counts."""
+        fig = self.figure
+        fig.clf()
+        n_cols = int(np.ceil(np.sqrt(len(labels))))
+        n_rows = int(np.ceil(len(labels) / float(n_cols)))
+        widths = np.diff(edges)
+        first = None
+        for i, label in enumerate(labels):
+            # Shared axes, so panels compare at a glance.
+            ax = fig.add_subplot(n_rows, n_cols, i + 1, sharex=first,
+                                 sharey=first)
+            first = first or ax
+            ax.bar(edges[:-1], counts[i], width=widths, align='edge',
+                   alpha=0.5)
+            ax.set_title(str(label))
+            # Label only the outer panels.
+            if i >= len(labels) - n_cols:
+                ax.set_xlabel(d_name)
+            if i % n_cols == 0:
+                ax.set_ylabel('Count')
+        fig.suptitle(self._title())
+        self.ax = ax
+
+    def _histogram_overlay(self, edges, counts, labels, grouping_name):
+        """Draws the histogram of each group as a step line, on one axes."""
+        lut = _category_colors(len(labels))
+        for i, label in enumerate(labels):
+            # Repeat the last count, so the step covers the last bin.
+            self.ax.plot(edges, np.append(counts[i], counts[i][-1]),
+                         drawstyle='steps-post', color=lut[i],
+                         label=str(label))
+        self.ax.legend(title=grouping_name)
+
+    def _histogram_ridgeline(self, edges, counts, labels, grouping_name):
+        """Draws the histogram of each group as a filled ridge, one per row.
+
+        Each ridge is scaled to its own peak, so small groups keep their
+        shape, and reaches into the row above by RIDGE_OVERLAP.
+        """
+        ax = self.ax
+        n = len(labels)
+        lut = _category_colors(n)
+        peaks = np.maximum(counts.max(axis=1), 1).astype(float)
+        heights = counts / peaks[:, None] * (1 + RIDGE_OVERLAP)
+        heights = np.column_stack([heights, heights[:, -1]])
+        for i in range(n):
+            # The first group is on top; lower ridges are drawn over it.
+            base = n - 1 - i
+            ax.fill_between(edges, base, base + heights[i], step='post',
+                            facecolor=lut[i], edgecolor='white', zorder=i + 1)
+        ax.set_yticks(np.arange(n))
+        ax.set_yticklabels([str(label) for label in labels[::-1]])
+        ax.set_ylim(-0.1, n + RIDGE_OVERLAP)
+        ax.set_ylabel(grouping_name)
+
+    def _grouped_bars(self, d_name, grouping_name):
+        """Draws side-by-side bars for each pair of values, like crosstab."""
+        names, groups, table = self.aggregates.crosstab(
+            d_name, grouping_name, where=self.spec.filters)
+        # Values that the filters leave without rows are not drawn.
+        rows = table.sum(axis=1) > 0
+        cols = table.sum(axis=0) > 0
+        names, groups, table = names[rows], groups[cols], table[rows][:, cols]
+        positions = np.arange(len(names))
+        width = 0.8 / max(len(groups), 1)
+        lut = _category_colors(len(groups))
+        for j, group in enumerate(groups):
+            self.ax.bar(positions - 0.4 + j * width, table[:, j], width=width,
+                        align='edge', color=lut[j], label=str(group))
+        self.ax.set_xticks(positions)
+        self.ax.set_xticklabels(names, rotation=90)
+        self.ax.legend(title=grouping_name)
+
     def is_valid_graph(self):
-        if self.geom is None:
-            self.valid_graph = False
-        elif self.geom in ['point', 'line']:
-            try:
-                if all([len(self.data_cols) == 2,
-                        self.dataset[self.data_cols[0]].dtype in ['float64',
-                                                                  'int64'],
-                        self.dataset[self.data_cols[1]].dtype in ['float64',
-                                                                  'int64']]):
-                    self.valid_graph = True
-                else:
-                    print 'Cannot plot if a variable is not numeric.'
-            except:
+        self.valid_graph = False
+        self.source.require(list(self.data_cols) + [self.grouping] +
+                            [f[0] for f in self.spec.filters])
+        if self.geom in ['point', 'line']:
+            if not all(c in self.schema for c in self.data_cols):
                 print 'Cannot identify data_cols.'
+            elif all([len(self.data_cols) == 2,
+                      self.is_numeric(self.data_cols[0]),
+                      self.is_numeric(self.data_cols[1])]):
+                self.valid_graph = True
+            else:
+                print 'Cannot plot if a variable is not numeric.'
         elif self.geom in ['hist', 'bar']:
-            if len(self.data_cols) == 1:
+            if (len(self.data_cols) == 1 and
+                    str(self.data_cols[0]) in self.schema):
                 d_name = str(self.data_cols[0])
-                d = self.dataset[d_name]
-                d_type = d.dtype
-                if not (self.geom == 'hist' and d_type not in ['float64',
-                                                               'int64']):
+                if not (self.geom == 'hist' and not self.is_numeric(d_name)):
                     self.valid_graph = True
                 else:
                     print 'Cannot make histogram from categorical variable.'
-        else:
+        elif self.geom == 'matrix':
+            if not all(c in self.schema for c in self.data_cols):
+                print 'Cannot identify data_cols.'
+            elif (len(self.data_cols) >= 2 and
+                  all(self.is_numeric(c) for c in self.data_cols)):
+                self.valid_graph = True
+            else:
+                print 'Scatter matrix needs two or more numeric variables.'
+        elif self.geom == 'each':
+            if self.data_cols and all(c in self.schema
+                                      for c in self.data_cols):
+                self.valid_graph = True
+            else:
+                print 'Cannot identify data_cols.'
+        if self.valid_graph and not all(f[0] in self.schema
+                                        for f in self.spec.filters):
+            print 'Cannot find the filtered variables.'
             self.valid_graph = False
 
         return self.valid_graph
@@ -212,6 +835,10 @@ class Graphic(object):
             if len(self.data_cols) == 1:
                 self.base = True
                 return True
+        elif self.geom in MULTI_GEOMS:
+            if self.data_cols:
+                self.base = True
+                return True
         else:
             self.base = False
             return False
@@ -222,10 +849,46 @@ class Graphic(object):
         print 'Geom: {}'.format(str(self.geom))
         print 'Datacols: {}'.format(str(self.data_cols))
         print 'Grouping: {}'.format(str(self.grouping))
-        if len(self.data_cols) == 1:
-            print('Type data 0: '+str(self.dataset[self.data_cols[0]].dtype))
-        if len(self.data_cols) == 2:
-            print('Type data 0: '+str(self.dataset[self.data_cols[0]].dtype))
-            print('Type data 1: '+str(self.dataset[self.data_cols[1]].dtype))
-        print 'Valid status: {}'.format(str(self.is_valid_graph()))
+        if self.spec.filters:
+            print 'Filters: {}'.format(describe(self.spec.filters))
+        for i, col in enumerate(self.data_cols[:2]):
+            if col in self.schema:
+                print('Type data {}: {}'.format(i, self.schema[col]))
+        # Report the status from the last validity check, without redoing it.
+        print 'Valid status: {}'.format(str(self.valid_graph))
         return self
+
+
+def _category_colors(n):
+    # Color lookup table, one RGBA row per category.
+    cmap = plt.get_cmap('Paired')
+    return cmap(np.arange(n) / float(max(n, 1)))
+
+
+def _category_legend(ax, lut, categories):
+    # Legend built from proxy handles, rather than one artist per group.
+    from matplotlib.lines import Line2D
+    handles = [Line2D([], [], linestyle='none', marker='o',
+                      markeredgecolor='none', markerfacecolor=lut[i],
+                      label=categories[i])
+               for i in range(min(len(categories), MAX_LEGEND_ENTRIES))]
+    return ax.legend(handles=handles, numpoints=1)
+
+
+def _canvas_pixels(canvas):
+    # Copy of the last frame an Agg-based canvas rendered, as an RGBA array,
+    # or None for other canvases.
+    renderer = getattr(canvas, 'renderer', None)
+    if renderer is None or not hasattr(renderer, 'buffer_rgba'):
+        return None
+    pixels = np.frombuffer(renderer.buffer_rgba(), np.uint8)
+    return pixels.reshape(int(renderer.height), int(renderer.width), 4).copy()
+
+
+def _bin_index(v, bins):
+    # Equal-width bin of each value, plus the range the bins cover.
+    lo, hi = v.min(), v.max()
+    from Aggregate import bin_index
+    if hi == lo:
+        hi = lo + 1
+    return bin_index(v, lo, hi, bins), lo, hi
@@ -0,0 +1,310 @@
+#!/usr/bin/python
+
+# Title: Dataset Loader
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Reads CSV files in typed chunks, in the background, optionally one column
+# at a time as columns are first needed. Column statistics are gathered from
+# the chunks as they are parsed.
+
+import csv
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, union_categoricals
+from DatasetCache import DatasetCache
+from Stats import DatasetStats
+
+# Rows parsed per chunk.
+CHUNK_ROWS = 500000
+# Rows read up front, to infer types and show a preview.
+SAMPLE_ROWS = 10000
+# String columns are read as categories if the sample has at most this many
+# distinct values, and they make up at most this fraction of sample rows.
+MAX_CATEGORIES = 1000
+MAX_CATEGORY_RATIO = 0.5
+
+
+def normalize_header(name):
+    # TODO: normalize headers by removing spaces and punct.
+    return name.lower()
+
+
+def sniff_header(path):
+    """Returns the normalized column names of a CSV file.
+
+    Only reads the first line, so it is fast for any file size. Raises
+    IOError if the file cannot be opened.
+    """
+    with open(path, 'rb') as f:
+        header = next(csv.reader(f), [])
+    return [normalize_header(h) for h in header]
+
+
+def infer_dtypes(sample):
+    """Picks a compact dtype for each column of a sample DataFrame.
+
+    Low-cardinality strings become 'category'. Numeric columns are left to
+    the parser, since a sample cannot prove that later values fit a smaller
+    type; read_chunks downcasts them chunk by chunk instead.
+    """
+    dtypes = {}
+    for col in sample.columns:
+        series = sample[col]
+        if series.dtype == object and _few_distinct(series):
+            dtypes[col] = 'category'
+    return dtypes
+
+
+def _few_distinct(series):
+    # True if a string column is worth storing as categories.
+    n_distinct = series.nunique()
+    return (n_distinct <= MAX_CATEGORIES and
+            n_distinct <= MAX_CATEGORY_RATIO * max(len(series), 1))
+
+
+def _downcast_values(values):
+    # Smaller copy of a numeric array, or None if some value would change.
+    # Integers become int32 if they fit. Floats become float32 only if every
+    # value survives the round trip exactly, NaN included, as whole numbers
+    # and halves do; decimals such as 0.1, timestamps and coordinates stay
+    # float64.
+    if values.dtype == np.int64 and len(values):
+        if (values.min() >= np.iinfo(np.int32).min and
+                values.max() <= np.iinfo(np.int32).max):
+            return values.astype(np.int32)
+    elif values.dtype == np.float64:
+        small = values.astype(np.float32)
+        restored = small.astype(np.float64)
+        same = (restored == values) | (np.isnan(restored) & np.isnan(values))
+        if same.all():
+            return small
+    return None
+
+
+def downcast(frame):
+    """Shrinks numeric columns of frame in place, where no value changes."""
+    for col in frame.columns:
+        small = _downcast_values(frame[col].values)
+        if small is not None:
+            frame[col] = small
+    return frame
+
+
+def normalize(frame, columns=None):
+    """Converts columns of frame to their compact types, in place.
+
+    Low-cardinality string columns become categories, judged on the whole
+    column, and numeric columns are downcast where no value changes.
+    Columns the loader already typed are left as they are. Also measures
+    how much memory the compact types save over the types pandas reads by
+    default: 64-bit numbers, and one Python string per row.
+
+    Args:
+        frame: Pandas DataFrame.
+        columns: Names of the columns to convert. Defaults to all.
+
+    Returns:
+        naive: Bytes the columns would take with default types.
+        compact: Bytes they take now.
+    """
+    naive = compact = 0
+    for col in frame.columns if columns is None else columns:
+        series = frame[col]
+        if series.dtype == object and _few_distinct(series):
+            frame[col] = series.astype('category')
+        elif series.dtype.kind in 'if':
+            small = _downcast_values(series.values)
+            if small is not None:
+                frame[col] = small
+        series = frame[col]
+        compact += series.memory_usage(index=False, deep=True)
+        naive += _naive_bytes(series)
+    return naive, compact
+
+
+def _naive_bytes(series):
+    # Bytes of a column as pandas reads it without dtypes, as counted by
+    # memory_usage(deep=True). Categories count one string object per row.
+    if series.dtype.kind in 'biuf':
+        return len(series) * 8
+    if not is_categorical_dtype(series.dtype):
+        return series.memory_usage(index=False, deep=True)
+    codes = series.cat.codes.values
+    counts = np.bincount(codes[codes >= 0].astype(np.intp),
+                         minlength=len(series.cat.categories))
+    sizes = np.array([sys.getsizeof(c) for c in series.cat.categories])
+    n_null = len(codes) - counts.sum()
+    return (len(codes) * 8 + int(np.dot(counts, sizes)) +
+            n_null * sys.getsizeof(np.nan))
+
+
+def read_chunks(path, names, dtypes=None, usecols=None, chunk_rows=CHUNK_ROWS,
+                on_chunk=None):
+    """Reads a CSV file chunk by chunk into one compact DataFrame.
+
+    Args:
+        path: CSV file path.
+        names: Normalized names of all columns in the file.
+        dtypes: Dict of column name to dtype, from infer_dtypes.
+        usecols: Names of the columns to read, or None for all.
+        chunk_rows: Rows parsed per chunk.
+        on_chunk: Optional function called with each parsed chunk.
+
+    Returns:
+        frame: Pandas DataFrame.
+    """
+    dtypes = dtypes or {}
+    if usecols is not None:
+        dtypes = dict((c, t) for c, t in dtypes.items() if c in usecols)
+    reader = pd.read_csv(path, header=0, names=names, usecols=usecols,
+                         dtype=dtypes, chunksize=chunk_rows)
+    chunks = []
+    for chunk in reader:
+        downcast(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=usecols or names)
+    if len(chunks) == 1:
+        return chunks[0]
+    return _concat(chunks)
+
+
+def _concat(chunks):
+    # Concatenate chunks, merging the categories each chunk found.
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [c[col] for c in chunks]
+        if all(hasattr(p, 'cat') for p in parts):
+            merged = union_categoricals([p.values for p in parts],
+                                        sort_categories=True)
+            columns[col] = pd.Series(merged)
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns, columns=chunks[0].columns)
+
+
+class DatasetLoader(object):
+    """Loads a CSV file on a background thread.
+
+    The header and a small sample are read at once, so the column names and
+    a preview are available before the rest of the file has been parsed.
+    With lazy_columns, nothing else is read until ensure_columns asks for
+    specific columns. If the file is in the dataset cache, it is opened from
+    there instead, and a full load writes the cache for next time.
+
+    Each chunk parsed also updates the statistics of its columns, in stats,
+    so they cost no pass of their own. They are saved with the cache, and
+    are None if the cache entry has none.
+    """
+
+    def __init__(self, path, lazy_columns=False, chunk_rows=CHUNK_ROWS,
+                 use_cache=True):
+        """Reads the header and sample, and starts loading.
+
+        Args:
+            path: CSV file path.
+            lazy_columns: If True, only read columns once they are needed.
+            chunk_rows: Rows parsed per chunk.
+            use_cache: If True, read and write the on-disk dataset cache.
+        """
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows_read = 0
+        # Rows of the file the current read has passed.
+        self._position = 0
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.cache = DatasetCache(path) if use_cache else None
+        self._frame = self.cache.load() if use_cache else None
+        self.from_cache = self._frame is not None
+        if self.from_cache:
+            self.columns = list(self._frame.columns)
+            self.sample = self._frame.head(SAMPLE_ROWS)
+            self.dtypes = {}
+            self.lazy_columns = False
+            self.rows_read = len(self._frame)
+            self.stats = self.cache.load_stats()
+            return
+
+        self.columns = sniff_header(path)
+        self.sample = pd.read_csv(path, header=0, names=self.columns,
+                                  nrows=SAMPLE_ROWS)
+        self.dtypes = infer_dtypes(self.sample)
+        self.lazy_columns = lazy_columns
+        self._frame = None
+        self.stats = DatasetStats()
+        if not lazy_columns:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _count(self, chunk):
+        # Rows are counted once, however many times lazy columns, or a
+        # retry, read the file again.
+        self._position += len(chunk)
+        self.rows_read = max(self.rows_read, self._position)
+        self.stats.update(chunk)
+
+    def _read(self, usecols=None, dtypes=None):
+        self._position = 0
+        try:
+            return read_chunks(self.path, self.columns, dtypes, usecols,
+                               self.chunk_rows, self._count)
+        except (ValueError, OverflowError):
+            # The sample guessed a type that the full file breaks; read the
+            # columns again with the parser's own types.
+            self.stats.discard(usecols or self.columns)
+            self._position = 0
+            return read_chunks(self.path, self.columns, None, usecols,
+                               self.chunk_rows, self._count)
+
+    def _run(self):
+        try:
+            self._frame = self._read(dtypes=self.dtypes)
+        except Exception, e:
+            self.error = e
+            return
+        if self.cache is not None:
+            try:
+                self.cache.save(self._frame, self.stats)
+            except (IOError, OSError, ValueError), e:
+                print 'Could not write dataset cache: {}'.format(e)
+
+    @property
+    def done(self):
+        """True once the frame can be returned without waiting."""
+        return self._thread is None or not self._thread.is_alive()
+
+    def frame(self):
+        """Returns the DataFrame, waiting for the load to finish."""
+        if self._thread is not None:
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+        if self._frame is None:
+            # Lazy loading; columns are added by ensure_columns.
+            self._frame = pd.DataFrame()
+        return self._frame
+
+    def ensure_columns(self, cols):
+        """Reads any of cols that are not loaded yet into the frame.
+
+        Returns:
+            added: Names of the columns that were read.
+        """
+        frame = self.frame()
+        with self._lock:
+            missing = [c for c in cols
+                       if c in self.columns and c not in frame.columns]
+            if not missing:
+                return []
+            part = self._read(usecols=missing, dtypes=self.dtypes)
+            for c in missing:
+                frame[c] = part[c].values
+        return missing
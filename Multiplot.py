@@ -0,0 +1,320 @@
+#!/usr/bin/python
+
+# Title: Multiplot
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Sets of graphs drawn as one grid: a scatter matrix of some variables, or
+# one graph of each variable.
+#
+# The panels of a grid are drawn by a pool of processes, each on its own Agg
+# canvas, and their pixels are pasted into one image. The pool is forked
+# once, while no other thread runs, since a child forked mid-way through
+# another thread's work can inherit its locks held; the demo starts it
+# before its speech threads. Workers open each dataset from the on-disk
+# dataset cache, so they map the same column files as this process rather
+# than receiving the frame pickled, and keep it for later grids. Only specs
+# go to the workers, and only pixels come back. Data that is not in the
+# cache is drawn in this process.
+
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from contextlib import contextmanager
+import numpy as np
+from Tracer import span
+
+# Geometries that draw a grid of graphs. A 'matrix' of k variables has a
+# scatter plot for each pair and the distribution of each on its diagonal;
+# 'each' has the distribution of every variable.
+MULTI_GEOMS = ['matrix', 'each']
+MAX_MATRIX_COLS = 6
+MAX_PANELS = 36
+# Categorical variables with more values than this have no panel of their own.
+MAX_BAR_CATEGORIES = 50
+
+# Panels are sized so the grid fills the figure, but not below this.
+MIN_PANEL_PIXELS = 160
+# Worker processes drawing panels. None uses one per CPU.
+PANEL_JOBS = None
+# Smaller text and markers, for graphs a few inches wide.
+PANEL_RC = {
+    'font.size': 6,
+    'axes.titlesize': 7,
+    'axes.labelsize': 6,
+    'xtick.labelsize': 5,
+    'ytick.labelsize': 5,
+    'legend.fontsize': 5,
+    'lines.markersize': 2,
+    'figure.subplot.left': 0.2,
+    'figure.subplot.right': 0.92,
+    'figure.subplot.bottom': 0.2,
+    'figure.subplot.top': 0.85,
+}
+
+# Per process: the Dataset drawn from and its cache key, and the panel
+# Graphic once there is one.
+_shared = {}
+# The pool of workers drawing panels, once started.
+_pool = {'pool': None}
+
+
+def panel_specs(spec, schema):
+    """Returns the graph of each panel of a grid, in rows.
+
+    Panels keep the filters, and where it applies the grouping, smoothing
+    and render mode, of the grid.
+
+    Args:
+        spec: GraphSpec with a geometry of MULTI_GEOMS.
+        schema: DatasetSchema of its dataset.
+
+    Returns:
+        specs: List of GraphSpec, row by row.
+        n_cols: Number of panels in a row.
+    """
+    cols = list(spec.data_cols)
+    base = spec.replace(geom=None, data_cols=(), title=None, xlab=None,
+                        ylab=None)
+    grouping = spec.grouping
+    if grouping is not None and schema.is_numeric(grouping):
+        # Numeric groupings color points, but do not split distributions.
+        grouping = None
+    specs = []
+    if spec.geom == 'matrix':
+        n_cols = len(cols)
+        for y in cols:
+            for x in cols:
+                if x == y:
+                    specs.append(base.replace(
+                        geom='hist', data_cols=(x,), add_smooth=False,
+                        grouping=grouping if grouping != x else None,
+                        layout='overlay'))
+                else:
+                    specs.append(base.replace(geom='point',
+                                              data_cols=(x, y)))
+    else:
+        n_cols = int(math.ceil(math.sqrt(len(cols))))
+        for col in cols:
+            specs.append(base.replace(
+                geom='hist' if schema.is_numeric(col) else 'bar',
+                data_cols=(col,), add_smooth=False,
+                grouping=grouping if grouping != col else None,
+                layout='overlay'))
+    return specs, max(n_cols, 1)
+
+
+def render_grid(spec, source, size, dpi, jobs=PANEL_JOBS):
+    """Draws the panels of a grid and pastes them into one image.
+
+    Args:
+        spec: GraphSpec with a geometry of MULTI_GEOMS.
+        source: Dataset to draw from.
+        size: (width, height) in pixels that the grid should fill.
+        dpi: Resolution of the panels.
+        jobs: Number of processes drawing panels. None uses one per CPU.
+
+    Returns:
+        image: RGBA array of the grid.
+    """
+    specs, n_cols = panel_specs(spec, source.schema)
+    n_rows = int(math.ceil(len(specs) / float(n_cols)))
+    side = max(MIN_PANEL_PIXELS,
+               min(size[0] // n_cols, size[1] // max(n_rows, 1)))
+    with span('render_panels', panels=len(specs)):
+        panels = render_panels(source, specs, side / float(dpi), dpi, jobs)
+    return composite(panels, n_cols)
+
+
+def render_panels(source, specs, inches, dpi, jobs=PANEL_JOBS):
+    """Draws each spec on a square Agg canvas.
+
+    Args:
+        source: Dataset to draw from.
+        specs: List of GraphSpec.
+        inches: Width and height of each panel.
+        dpi: Resolution of the panels.
+        jobs: Number of processes, if the pool is started here. None uses
+            one per CPU, and 1 draws in this process.
+
+    Returns:
+        panels: RGBA array of each spec, or None for those that failed.
+    """
+    # Wait for the load, which writes the cache entry that workers open.
+    source.frame
+    cached = _cache_key(source)
+    pool = None
+    if cached is not None and len(specs) > 1 and jobs != 1:
+        pool = start_pool(jobs)
+    if pool is None:
+        _shared.update(source=source, key=None)
+        results = [_render_panel((None, spec, inches, dpi))
+                   for spec in specs]
+    else:
+        tasks = [(cached, spec, inches, dpi) for spec in specs]
+        try:
+            results = pool.map(_render_panel, tasks, chunksize=1)
+        except Exception:
+            close_pool()
+            raise
+    panels = []
+    for spec, (pixels, error) in zip(specs, results):
+        if error is not None:
+            print 'Could not draw {} of {}: {}'.format(
+                spec.geom, ', '.join(spec.data_cols), error)
+        panels.append(pixels)
+    return panels
+
+
+def start_pool(jobs=PANEL_JOBS):
+    """Starts the workers that draw panels, unless they are running.
+
+    Call it before starting other threads: the pool is only forked while
+    this is the only thread, so it is not started otherwise.
+
+    Args:
+        jobs: Number of processes. None uses one per CPU.
+
+    Returns:
+        pool: The multiprocessing Pool, or None if there is none.
+    """
+    if _pool['pool'] is not None:
+        return _pool['pool']
+    jobs = jobs or multiprocessing.cpu_count()
+    if (jobs < 2 or not hasattr(os, 'fork') or
+            multiprocessing.current_process().daemon or
+            threading.active_count() > 1):
+        # Pool workers, as in the graph server, cannot have their own.
+        return None
+    _pool['pool'] = multiprocessing.Pool(jobs, _init_worker)
+    return _pool['pool']
+
+
+def _init_worker():
+    # Workers draw off screen, whichever backend the caller shows graphs
+    # with. One forked after pyplot was imported keeps the caller's.
+    import matplotlib
+    if 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')
+    import Graphic_mpl
+    Graphic_mpl.init_backend(interactive=False)
+
+
+def close_pool():
+    """Stops the workers drawing panels, if there are any."""
+    pool = _pool['pool']
+    _pool['pool'] = None
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def _cache_key(source):
+    # (path, key) of the dataset cache entry holding source, or None if
+    # workers cannot open it from there.
+    from DatasetCache import DatasetCache
+    if source.path is None or not os.path.isfile(source.path):
+        return None
+    cache = DatasetCache(source.path)
+    if not cache.exists():
+        return None
+    return source.path, cache.key
+
+
+def _worker_source(cached):
+    # The Dataset of a cache entry, opened once per worker and kept until
+    # the next grid of other data.
+    from Dataset import Dataset
+    from DatasetCache import DatasetCache
+    from Loader import DatasetLoader
+    if _shared.get('key') != cached:
+        path = cached[0]
+        cache = DatasetCache(path)
+        if cache.key != cached[1] or not cache.exists():
+            raise IOError('{} is no longer in the cache.'.format(path))
+        _shared.update(source=Dataset(path=path, loader=DatasetLoader(path)),
+                       key=cached)
+    return _shared['source']
+
+
+def _panel_graphic(inches, dpi):
+    # This process's Graphic for panels, on an Agg canvas of its own.
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from Graphic_mpl import Graphic
+    g = _shared.get('graphic')
+    if g is None:
+        with matplotlib.rc_context(PANEL_RC):
+            figure = Figure(figsize=(inches, inches), dpi=dpi)
+        FigureCanvasAgg(figure)
+        g = _shared['graphic'] = Graphic()
+        g.figure = figure
+    g.figure.set_dpi(dpi)
+    g.figure.set_size_inches(inches, inches)
+    return g
+
+
+def _render_panel(task):
+    """Draws one panel. Runs in a worker, or in the caller without a pool.
+
+    Args:
+        task: Tuple (cached, spec, inches, dpi). cached is the (path, key)
+            of the dataset's cache entry, for a worker to open, or None to
+            draw from the Dataset the caller set in _shared.
+
+    Returns:
+        pixels: RGBA array, or None if drawing failed.
+        error: Message of the failure, or None.
+    """
+    import matplotlib
+    from Graphic_mpl import _canvas_pixels
+    cached, spec, inches, dpi = task
+    try:
+        with matplotlib.rc_context(PANEL_RC), _quiet():
+            if cached is not None:
+                source = _worker_source(cached)
+            else:
+                source = _shared['source']
+            g = _panel_graphic(inches, dpi).set_source(source)
+            g.spec = spec
+            g.make_gg_plot()
+            g.figure.canvas.draw()
+        return _canvas_pixels(g.figure.canvas), None
+    except Exception, e:
+        return None, str(e)
+
+
+@contextmanager
+def _quiet():
+    # Panels do not print their summaries.
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def composite(panels, n_cols):
+    """Pastes equally sized RGBA panels into a grid, row by row.
+
+    Missing panels are left white.
+    """
+    drawn = [p for p in panels if p is not None]
+    if not drawn:
+        return np.full((MIN_PANEL_PIXELS, MIN_PANEL_PIXELS, 4), 255,
+                       dtype=np.uint8)
+    h, w = drawn[0].shape[:2]
+    n_rows = int(math.ceil(len(panels) / float(n_cols)))
+    grid = np.full((n_rows * h, n_cols * w, 4), 255, dtype=np.uint8)
+    for i, pixels in enumerate(panels):
+        if pixels is None:
+            continue
+        row, col = divmod(i, n_cols)
+        ph, pw = min(h, pixels.shape[0]), min(w, pixels.shape[1])
+        grid[row * h:row * h + ph, col * w:col * w + pw] = pixels[:ph, :pw]
+    return grid
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+# Title: Speech Pipeline
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Captures and recognizes speech on background threads, so the microphone
+# keeps listening while a plot is drawn.
+
+import itertools
+import threading
+import time
+import Queue
+from Tracer import span
+
+# Bounded queue sizes. When a queue is full the oldest item is dropped.
+AUDIO_QUEUE_SIZE = 4
+TEXT_QUEUE_SIZE = 4
+# Audio captured longer ago than this is dropped instead of recognized.
+MAX_AUDIO_AGE = 10.0
+RECOGNIZER_WORKERS = 2
+
+
+class Utterance(object):
+    """One captured phrase, with timestamps for each pipeline stage.
+
+    Attributes:
+        seq: Capture order, starting at 0.
+        audio: Audio data from the microphone.
+        captured: time.time() when the phrase ended.
+        recognized: time.time() when recognition finished.
+        text: Recognized text, or None if nothing was understood.
+    """
+    __slots__ = ('seq', 'audio', 'captured', 'recognized', 'text')
+
+    def __init__(self, seq, audio):
+        self.seq = seq
+        self.audio = audio
+        self.captured = time.time()
+        self.recognized = None
+        self.text = None
+
+
+def put_latest(q, item):
+    """Puts item on a bounded queue, dropping the oldest item if full.
+
+    Returns:
+        dropped: The dropped item, or None.
+    """
+    dropped = None
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except Queue.Full:
+            try:
+                dropped = q.get_nowait()
+            except Queue.Empty:
+                pass
+
+
+class SpeechPipeline(object):
+    """Listens, recognizes and hands out utterances on background threads.
+
+    A capture thread keeps listening and puts audio on a bounded queue. A
+    pool of recognizer threads turns audio into text. The main thread calls
+    next_utterance() to get the newest recognized command; anything older
+    than a command it has already received is dropped as stale.
+
+    With drop_stale=False, as for replayed scripts, nothing is dropped: the
+    queues block when full and a single recognizer keeps commands in order.
+    """
+
+    def __init__(self, r, mic, recognize=None, workers=RECOGNIZER_WORKERS,
+                 drop_stale=True):
+        """Sets up the pipeline.
+
+        Args:
+            r: Recognizer object.
+            mic: Microphone object.
+            recognize: Function from audio to text. Defaults to r.recognize.
+                Should raise LookupError if nothing was understood.
+            workers: Number of recognizer threads.
+            drop_stale: If False, keep every command, in order.
+        """
+        self.r = r
+        self.mic = mic
+        self.recognize = recognize or r.recognize
+        self.drop_stale = drop_stale
+        self.workers = workers if drop_stale else 1
+        self.audio_queue = Queue.Queue(AUDIO_QUEUE_SIZE)
+        self.text_queue = Queue.Queue(TEXT_QUEUE_SIZE)
+        self.stopping = threading.Event()
+        self.counter = itertools.count()
+        self.last_seq = -1
+        self.dropped = 0
+        self.threads = []
+
+    def start(self):
+        self.threads.append(threading.Thread(target=self._capture))
+        for i in range(self.workers):
+            self.threads.append(threading.Thread(target=self._recognize))
+        for t in self.threads:
+            t.daemon = True
+            t.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        # The capture thread may be blocked listening; the others notice the
+        # stop within their queue timeout.
+        for t in self.threads[1:]:
+            t.join(1.0)
+
+    def _put(self, q, utterance):
+        if not self.drop_stale:
+            q.put(utterance)
+        elif put_latest(q, utterance) is not None:
+            self.dropped += 1
+
+    def _capture(self):
+        with self.mic as source:
+            while not self.stopping.is_set():
+                with span('listen'):
+                    audio = self.r.listen(source)
+                self._put(self.audio_queue,
+                          Utterance(next(self.counter), audio))
+
+    def _recognize(self):
+        while not self.stopping.is_set():
+            try:
+                utterance = self.audio_queue.get(timeout=0.5)
+            except Queue.Empty:
+                continue
+            if (self.drop_stale and
+                    time.time() - utterance.captured > MAX_AUDIO_AGE):
+                self.dropped += 1
+                continue
+            try:
+                with span('recognize', seq=utterance.seq):
+                    utterance.text = self.recognize(utterance.audio)
+            except LookupError:
+                utterance.text = None
+            utterance.recognized = time.time()
+            # Audio is not needed past this point.
+            utterance.audio = None
+            self._put(self.text_queue, utterance)
+
+    def next_utterance(self, timeout=0.1):
+        """Returns the next fresh utterance, or None if none arrived in time.
+
+        Utterances captured before one already returned are dropped, since
+        recognizer threads can finish out of order.
+        """
+        try:
+            utterance = self.text_queue.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+        if utterance.seq < self.last_seq:
+            self.dropped += 1
+            return None
+        self.last_seq = utterance.seq
+        return utterance
+
+
+def report_latency(utterance, done):
+    """Prints how long an utterance took from end of speech to plot.
+
+    Args:
+        utterance: Utterance that was handled.
+        done: time.time() when handling finished.
+    """
+    print('Latency: {:.2f}s (recognize {:.2f}s, queue and plot {:.2f}s)'
+          ''.format(done - utterance.captured,
+                    utterance.recognized - utterance.captured,
+                    done - utterance.recognized))
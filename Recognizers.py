@@ -0,0 +1,168 @@
+#!/usr/bin/python
+
+# Title: Recognizer Backends
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Interchangeable speech-to-text backends, each timing its own calls.
+
+import threading
+import time
+from collections import deque
+
+# Recognition latencies kept per backend.
+TIMING_HISTORY = 1000
+# Keyword sensitivity for the grammar-constrained Sphinx decoder, in [0, 1].
+KEYWORD_SENSITIVITY = 0.8
+
+
+class RecognizerBackend(object):
+    """Turns captured audio into text.
+
+    Subclasses implement _recognize. recognize() wraps it to record how long
+    each call took, so backends can be compared on the same speech. Every
+    backend raises LookupError when nothing was understood.
+    """
+    name = None
+
+    def __init__(self):
+        self.timings = deque(maxlen=TIMING_HISTORY)
+
+    def recognize(self, audio):
+        start = time.time()
+        try:
+            return self._recognize(audio)
+        finally:
+            self.timings.append(time.time() - start)
+
+    def _recognize(self, audio):
+        raise NotImplementedError
+
+    def report(self):
+        """Prints the number of calls and their mean and worst latency."""
+        if not self.timings:
+            print('Recognizer {}: no calls.'.format(self.name))
+            return
+        t = sorted(self.timings)
+        print('Recognizer {}: {} calls, mean {:.3f}s, median {:.3f}s, '
+              'max {:.3f}s'.format(self.name, len(t), sum(t) / len(t),
+                                   t[len(t) // 2], t[-1]))
+
+
+class RemoteBackend(RecognizerBackend):
+    """The web speech API, through speech_recognition. Needs a network."""
+    name = 'remote'
+
+    def __init__(self, r):
+        super(RemoteBackend, self).__init__()
+        import speech_recognition as sr
+        self.r = r
+        # Newer versions of speech_recognition renamed recognize and raise
+        # UnknownValueError instead of LookupError.
+        self.call = getattr(r, 'recognize_google', None) or r.recognize
+        self.unknown = getattr(sr, 'UnknownValueError', LookupError)
+
+    def _recognize(self, audio):
+        try:
+            return self.call(audio)
+        except self.unknown:
+            raise LookupError('Speech not understood.')
+
+
+class SphinxBackend(RecognizerBackend):
+    """Offline decoding with CMU PocketSphinx, through speech_recognition.
+
+    Given a vocabulary, such as the command words and the dataset's column
+    names, the decoder only spots those words, which is faster and more
+    accurate for this grammar than open dictation.
+    """
+    name = 'sphinx'
+
+    def __init__(self, r, vocabulary=None):
+        super(SphinxBackend, self).__init__()
+        import speech_recognition as sr
+        if not hasattr(r, 'recognize_sphinx'):
+            raise ImportError('This speech_recognition has no Sphinx support.')
+        self.r = r
+        self.unknown = getattr(sr, 'UnknownValueError', LookupError)
+        self.keywords = None
+        if vocabulary:
+            self.keywords = [(w, KEYWORD_SENSITIVITY)
+                             for w in sorted(set(vocabulary)) if w.isalpha()]
+
+    def _recognize(self, audio):
+        try:
+            if self.keywords:
+                return self.r.recognize_sphinx(
+                    audio, keyword_entries=self.keywords).strip()
+            return self.r.recognize_sphinx(audio)
+        except self.unknown:
+            raise LookupError('Speech not understood.')
+
+
+class TextFileBackend(RecognizerBackend):
+    """Replays commands from a text file, one per line, for testing.
+
+    Stands in for the microphone and recognizer together: listen() returns
+    the next line as the "audio", and recognize() returns it unchanged. A
+    blank line acts like speech that was not understood. After the last
+    line it says "quit" once, then goes silent.
+    """
+    name = 'text'
+
+    def __init__(self, path, delay=0.0):
+        """Opens the script.
+
+        Args:
+            path: Text file with one command per line.
+            delay: Seconds to wait before each line, to imitate speaking.
+        """
+        super(TextFileBackend, self).__init__()
+        with open(path) as f:
+            self.lines = deque(line.strip() for line in f)
+        self.delay = delay
+        self.finished = False
+
+    # Used as the microphone: "with mic as source".
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def listen(self, source):
+        time.sleep(self.delay)
+        if not self.lines:
+            if self.finished:
+                # Nothing left to say; block like a silent microphone.
+                threading.Event().wait()
+            self.finished = True
+            return 'quit'
+        return self.lines.popleft()
+
+    def _recognize(self, audio):
+        if not audio:
+            raise LookupError('Empty line.')
+        # Lines are utf-8, as the other backends' text is unicode.
+        return audio.decode('utf-8', 'replace')
+
+
+BACKENDS = ['remote', 'sphinx', 'text']
+
+
+def make_backend(name, r=None, vocabulary=None, script=None):
+    """Builds a recognizer backend by name.
+
+    Args:
+        name: One of BACKENDS.
+        r: speech_recognition Recognizer, for the remote and sphinx backends.
+        vocabulary: Words the sphinx backend listens for.
+        script: Command file, for the text backend.
+    """
+    if name == 'remote':
+        return RemoteBackend(r)
+    elif name == 'sphinx':
+        return SphinxBackend(r, vocabulary)
+    elif name == 'text':
+        return TextFileBackend(script)
+    raise ValueError('Unknown recognizer: {}'.format(name))
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+# Title: Render Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Least recently used cache of rendered plots, bounded by their size.
+
+from collections import OrderedDict
+
+# Total size of cached renders. A 640x480 RGBA render is about 1.2 MB.
+RENDER_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class RenderCache(object):
+    """Rendered plots as RGBA pixel arrays, keyed by what they show.
+
+    Keys are built by render_key(), from the graph spec, the dataset's
+    fingerprint and the canvas size, so renders of one view are shared by
+    every graph drawn from the same data, and a changed file misses. When
+    the renders add up to more than max_bytes, the least recently used are
+    dropped.
+
+    Attributes:
+        hits: Number of get() calls that found a render.
+        misses: Number of get() calls that did not.
+        evictions: Number of renders dropped to make room.
+        nbytes: Total size of the cached renders.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the render under key, or None, and counts the lookup."""
+        pixels = self.entries.pop(key, None)
+        if pixels is None:
+            self.misses += 1
+            return None
+        # Reinsert, to mark it as the most recently used.
+        self.entries[key] = pixels
+        self.hits += 1
+        return pixels
+
+    def put(self, key, pixels):
+        """Stores a render, dropping the least recently used to make room.
+
+        Renders larger than the whole cache are not stored.
+        """
+        if pixels.nbytes > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self.entries[key] = pixels
+        self.nbytes += pixels.nbytes
+        while self.nbytes > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.nbytes -= dropped.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def report(self):
+        """Prints the hit rate and how full the cache is."""
+        lookups = self.hits + self.misses
+        rate = self.hits / float(lookups) if lookups else 0.0
+        print('Render cache: {} hits, {} misses ({:.0%}), {} renders in '
+              '{:.1f} MB, {} evicted'.format(
+                  self.hits, self.misses, rate, len(self.entries),
+                  self.nbytes / 1e6, self.evictions))
+
+
+def render_key(spec, dataset_fingerprint, size):
+    """Returns the cache key of a render.
+
+    Args:
+        spec: GraphSpec of the graph.
+        dataset_fingerprint: Fingerprint of the data it was drawn from.
+        size: (width, height) of the canvas, in pixels.
+    """
+    return (spec.digest(), dataset_fingerprint, tuple(size))
@@ -0,0 +1,224 @@
+#!/usr/bin/python
+
+# Title: Row Index
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Per-column indexes that turn spoken filters into boolean row masks.
+#
+# A filter is a tuple (column, op, value):
+#
+#   ('price', '>', 5000.0)            price above 5000
+#   ('price', '<', 1000.0)            price below 1000
+#   ('carat', 'between', (1.0, 2.0))  carat between 1 and 2
+#   ('cut', '==', ('Ideal',))         where cut is ideal
+#   ('cut', '!=', ('Fair',))          where cut is not fair
+#   ('clarity', 'top', 10)            top ten clarity
+#   ('price', 'bottom', 100)          bottom hundred price
+
+from collections import OrderedDict
+import numpy as np
+
+OPS = ['>', '<', 'between', '==', '!=', 'top', 'bottom']
+# Combined masks of this many recent filter sets are kept.
+MASK_CACHE = 16
+
+
+class RowIndex(object):
+    """Lazily built column indexes for filtering the rows of a dataset.
+
+    Numeric columns are indexed by their sort order, so a range is two
+    binary searches, and the top or bottom n rows are a slice. Categorical
+    columns keep a packed bitmap of rows per category code, so matching any
+    set of categories is a bitwise or over n / 8 bytes. Each index is built
+    the first time a filter uses its column, and shared by every Graphic of
+    the dataset. Filters never copy the frame; they combine into one boolean
+    mask over its rows.
+    """
+
+    def __init__(self, dataset, schema):
+        """Binds the index to a dataset.
+
+        Args:
+            dataset: Pandas DataFrame.
+            schema: DatasetSchema of dataset.
+        """
+        self.dataset = dataset
+        self.schema = schema
+        self.sorted_cache = {}
+        self.bitmap_cache = {}
+        self.mask_cache = OrderedDict()
+
+    @property
+    def n_rows(self):
+        # Read each time, as lazily loaded columns fill an empty frame.
+        return len(self.dataset)
+
+    def mask(self, filters):
+        """Returns the boolean mask of rows that pass every filter.
+
+        Args:
+            filters: Sequence of filter tuples.
+
+        Returns:
+            mask: Boolean array over the rows, or None if filters is empty.
+                It is cached, and must not be modified.
+        """
+        filters = tuple(filters)
+        if not filters:
+            return None
+        if filters in self.mask_cache:
+            self.mask_cache[filters] = self.mask_cache.pop(filters)
+            return self.mask_cache[filters]
+        combined = None
+        for col, op, value in filters:
+            m = self.select(col, op, value)
+            if combined is None:
+                combined = m
+            else:
+                np.logical_and(combined, m, out=combined)
+        self.mask_cache[filters] = combined
+        if len(self.mask_cache) > MASK_CACHE:
+            self.mask_cache.popitem(last=False)
+        return combined
+
+    def select(self, col, op, value):
+        """Returns a new boolean mask of the rows one filter keeps.
+
+        Raises ValueError for a filter the column's type cannot take.
+        """
+        col_schema = self.schema[col]
+        if col_schema.is_numeric:
+            if op == '>':
+                return self.between(col, value, None, low_closed=False)
+            elif op == '<':
+                return self.between(col, None, value, high_closed=False)
+            elif op == 'between':
+                return self.between(col, *value)
+            elif op in ('==', '!='):
+                m = np.zeros(self.n_rows, dtype=bool)
+                for v in value:
+                    m |= self.between(col, v, v)
+                return ~m if op == '!=' else m
+            elif op in ('top', 'bottom'):
+                return self.extremes(col, value, largest=op == 'top')
+        else:
+            if op in ('==', '!='):
+                m = self.isin(col, value)
+                return np.logical_not(m, out=m) if op == '!=' else m
+            elif op in ('top', 'bottom'):
+                return self.most_common(col, value, most=op == 'top')
+        raise ValueError('Cannot filter {} column {} by {}.'.format(
+            col_schema.kind, col, op))
+
+    def _sorted(self, col):
+        # Row order that sorts the column, the sorted values, and how many
+        # are not NaN; NaNs sort last.
+        if col not in self.sorted_cache:
+            values = self.dataset[col].values
+            order = np.argsort(values)
+            ordered = values[order]
+            n_valid = len(values)
+            if ordered.dtype.kind == 'f':
+                n_valid -= int(np.isnan(ordered).sum())
+            self.sorted_cache[col] = (order, ordered[:n_valid], n_valid)
+        return self.sorted_cache[col]
+
+    def _rows_mask(self, rows):
+        m = np.zeros(self.n_rows, dtype=bool)
+        m[rows] = True
+        return m
+
+    def between(self, col, low=None, high=None, low_closed=True,
+                high_closed=True):
+        """Rows of a numeric column within [low, high], by binary search.
+
+        Either bound may be None, for no bound.
+        """
+        order, ordered, _ = self._sorted(col)
+        start = 0
+        stop = len(ordered)
+        if low is not None:
+            start = np.searchsorted(ordered, low,
+                                    side='left' if low_closed else 'right')
+        if high is not None:
+            stop = np.searchsorted(ordered, high,
+                                   side='right' if high_closed else 'left')
+        return self._rows_mask(order[start:max(start, stop)])
+
+    def extremes(self, col, n, largest=True):
+        """Rows holding the n largest, or smallest, values of a column."""
+        order, _, n_valid = self._sorted(col)
+        n = max(0, min(int(n), n_valid))
+        if largest:
+            return self._rows_mask(order[n_valid - n:n_valid])
+        return self._rows_mask(order[:n])
+
+    def _bitmap(self, col, code):
+        # Packed bitmap of the rows holding one category code.
+        key = (col, code)
+        if key not in self.bitmap_cache:
+            self.bitmap_cache[key] = np.packbits(self.schema[col].codes ==
+                                                 code)
+        return self.bitmap_cache[key]
+
+    def _unpack(self, bits):
+        return np.unpackbits(bits)[:self.n_rows].view(bool)
+
+    def isin(self, col, labels):
+        """Rows of a categorical column whose value is one of labels.
+
+        Labels match the column's labels as they are, or by their text, so
+        spoken values need not have the column's exact type. Unknown labels
+        match nothing.
+        """
+        codes = {}
+        for i, c in enumerate(self.schema[col].categories):
+            codes.setdefault(c, i)
+            codes.setdefault(label_text(c), i)
+        bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for label in labels:
+            code = codes.get(label)
+            if code is None:
+                code = codes.get(label_text(label))
+            if code is not None:
+                np.bitwise_or(bits, self._bitmap(col, code), out=bits)
+        return self._unpack(bits)
+
+    def most_common(self, col, n, most=True):
+        """Rows in the n most, or least, frequent categories of a column."""
+        col_schema = self.schema[col]
+        codes = col_schema.codes
+        counts = np.bincount(codes[codes >= 0],
+                             minlength=col_schema.cardinality)
+        order = np.argsort(-counts if most else counts, kind='mergesort')
+        keep = order[:max(0, int(n))]
+        return self.isin(col, col_schema.categories[keep])
+
+
+def label_text(value):
+    """Returns a category label, or a spoken value, as unicode text.
+
+    Byte strings are read as utf-8, so labels and spoken values with the
+    same text compare equal whichever type either has.
+    """
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return unicode(value)
+
+
+def describe(filters):
+    """Returns the filters as words, for titles and summaries."""
+    words = []
+    for col, op, value in filters:
+        if op == 'between':
+            words.append('{} {:g} to {:g}'.format(col, *value))
+        elif op in ('==', '!='):
+            words.append('{} {} {}'.format(
+                col, 'is' if op == '==' else 'is not',
+                ' or '.join(label_text(v).encode('utf-8') for v in value)))
+        elif op in ('top', 'bottom'):
+            words.append('{} {} {}'.format(op, value, col))
+        else:
+            words.append('{} {} {:g}'.format(col, op, value))
+    return ', '.join(words)
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+
+# Title: Dataset Schema
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Per-column type information, worked out for each column when it is first
+# looked at.
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (is_bool_dtype, is_categorical_dtype,
+                              is_numeric_dtype)
+
+
+class ColumnSchema(object):
+    """Type and summary information for one column.
+
+    The dtype and kind are read at once. The summaries each take a pass
+    over the column, so they are computed the first time they are read,
+    and kept.
+
+    Attributes:
+        name: Column name.
+        dtype: Numpy dtype of the column.
+        kind: 'numeric' or 'categorical'.
+        cardinality: Number of distinct non-null values.
+        nulls: Number of null values.
+        min: Smallest non-null value, or None.
+        max: Largest non-null value, or None.
+        codes: For categorical columns, an integer code per row, with -1 for
+            nulls. None for numeric columns.
+        categories: For categorical columns, the sorted distinct values that
+            the codes index into. None for numeric columns.
+    """
+
+    def __init__(self, name, series):
+        self.name = name
+        self.series = series
+        self.dtype = series.dtype
+        if _is_numeric_dtype(series.dtype):
+            self.kind = 'numeric'
+        else:
+            self.kind = 'categorical'
+        self._nulls = None
+        self._cardinality = None
+        self._range = None
+        self._coding = None
+
+    @property
+    def is_numeric(self):
+        return self.kind == 'numeric'
+
+    @property
+    def nulls(self):
+        if self._nulls is None:
+            self._nulls = int(self.series.isnull().sum())
+        return self._nulls
+
+    @property
+    def cardinality(self):
+        if self._cardinality is None:
+            if self.is_numeric:
+                self._cardinality = int(self.series.nunique())
+            else:
+                self._cardinality = len(self.categories)
+        return self._cardinality
+
+    @property
+    def min(self):
+        return self._extremes()[0]
+
+    @property
+    def max(self):
+        return self._extremes()[1]
+
+    def _extremes(self):
+        if self._range is None:
+            if self.is_numeric:
+                if self.nulls < len(self.series):
+                    self._range = (self.series.min(), self.series.max())
+                else:
+                    self._range = (None, None)
+            elif len(self.categories):
+                self._range = (self.categories[0], self.categories[-1])
+            else:
+                self._range = (None, None)
+        return self._range
+
+    @property
+    def codes(self):
+        return self._codes()[0]
+
+    @property
+    def categories(self):
+        return self._codes()[1]
+
+    def _codes(self):
+        if self._coding is None:
+            if self.is_numeric:
+                self._coding = (None, None)
+            elif is_categorical_dtype(self.dtype):
+                # Already coded, e.g. by the loader.
+                self._coding = (self.series.cat.codes.values,
+                                np.asarray(self.series.cat.categories))
+            else:
+                codes, categories = pd.factorize(self.series, sort=True)
+                self._coding = (codes, np.asarray(categories))
+        return self._coding
+
+    def compute(self):
+        """Computes every summary now, e.g. before forking processes that
+        would otherwise each compute their own."""
+        self.nulls
+        self.cardinality
+        self._extremes()
+        self._codes()
+        return self
+
+    def __repr__(self):
+        return '{} ({}, {}, {} distinct, {} null)'.format(
+            self.name, self.dtype, self.kind, self.cardinality, self.nulls)
+
+
+class DatasetSchema(object):
+    """Schema of every column of a dataset.
+
+    Columns are described when first looked up, so building the schema
+    costs nothing however wide the dataset is.
+    """
+
+    def __init__(self, dataset):
+        """Binds the schema to a dataset.
+
+        Args:
+            dataset: Pandas DataFrame.
+        """
+        self.dataset = dataset
+        self.n_rows = len(dataset)
+        self.names = set(dataset.columns)
+        self.columns = {}
+
+    def add(self, name, series):
+        """Adds a column that was loaded after the schema was computed."""
+        self.n_rows = len(series)
+        self.names.add(name)
+        self.columns[name] = ColumnSchema(name, series)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        col = self.columns.get(name)
+        if col is None:
+            if name not in self.names:
+                raise KeyError(name)
+            col = self.columns[name] = ColumnSchema(name,
+                                                    self.dataset[name])
+        return col
+
+    def is_numeric(self, name):
+        """True if the column exists and holds numbers."""
+        return name in self.names and self[name].is_numeric
+
+
+def _is_numeric_dtype(dtype):
+    # Booleans are better treated as two categories.
+    return is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
@@ -0,0 +1,496 @@
+#!/usr/bin/python
+
+# Title: ggspeak Server
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Serves graphing sessions over HTTP on localhost, so several analysts share
+# one warm process:
+#
+#   python ggspeak.py serve --data diamonds.csv --port 8765
+#
+#   POST   /sessions                   {"dataset": "diamonds"} -> session id
+#   POST   /sessions/<id>/command      {"text": "carat vs price"}
+#   POST   /sessions/<id>/audio        WAV bytes, recognized, then as above
+#   GET    /sessions/<id>/graph.png    the graph, also as .svg
+#   DELETE /sessions/<id>
+#   GET    /datasets, /metrics, /health
+
+import BaseHTTPServer
+import SocketServer
+import imp
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import urlparse
+import uuid
+from cStringIO import StringIO
+from DatasetPool import DatasetPool
+from GraphSpec import GraphSpec, SpecHistory
+from Tracer import Tracer, clock
+from ggspeak import DEMO_FILE, FORMATS
+
+# The server only listens on the loopback interface.
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Requests rendering or waiting to render, per worker process. Past this,
+# requests are turned away with 503, instead of queueing without bound.
+PENDING_PER_WORKER = 2
+# Seconds a command may take, queueing included, before a 504.
+REQUEST_TIMEOUT = 60
+# Sessions idle this many seconds are dropped.
+SESSION_TTL = 60 * 60
+MAX_SESSIONS = 100
+# Largest request body, in bytes, such as a recorded command.
+MAX_BODY = 10 * 1024 ** 2
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+NOT_FOUND = 'No such resource.'
+
+# Set in each worker process by _init_worker.
+_worker = {}
+
+
+class ServiceError(Exception):
+    """A request that cannot be served, with its HTTP status."""
+
+    def __init__(self, status, message):
+        super(ServiceError, self).__init__(message)
+        self.status = status
+
+
+class Session(object):
+    """Graph state of one client: its undo history and last graph.
+
+    Specs are immutable, so the history is sent to a worker with each
+    command and the updated one taken back, and any worker can serve any
+    session. Commands of a session run one at a time, in order.
+    """
+
+    def __init__(self, dataset):
+        self.id = uuid.uuid4().hex
+        self.history = SpecHistory(GraphSpec(dataset=dataset))
+        self.lock = threading.Lock()
+        self.used = time.time()
+        # Rendered graph of the current spec, by format.
+        self.images = {}
+
+
+class GraphService(object):
+    """Runs the commands of many sessions on a pool of render processes.
+
+    Parsing, command handling and drawing happen in the workers, each with
+    the Agg backend, the demo's command handling and its own DatasetPool.
+    The datasets are parsed once, here, into the on-disk cache, so workers
+    map the same column files. This process keeps the sessions, limits the
+    requests in flight, and times every request.
+    """
+
+    def __init__(self, paths, jobs=None, recognizer=None):
+        """Starts the workers.
+
+        Args:
+            paths: CSV files to serve. The first is the default dataset.
+            jobs: Worker processes. Defaults to the number of CPUs.
+            recognizer: RecognizerBackend for audio commands, or None.
+        """
+        from Loader import DatasetLoader
+        self.datasets = DatasetPool()
+        names = [self.datasets.add(path) for path in paths]
+        self.default = names[0]
+        for name in names:
+            # Parse here once, so workers open the dataset cache.
+            DatasetLoader(self.datasets.paths[name]).frame()
+        jobs = jobs or multiprocessing.cpu_count()
+        registry = [(name, self.datasets.paths[name]) for name in names]
+        self.workers = multiprocessing.Pool(jobs, _init_worker, (registry,))
+        self.recognizer = recognizer
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.limit = jobs * PENDING_PER_WORKER
+        self.slots = threading.BoundedSemaphore(self.limit)
+        self.stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.statuses = {}
+        self.metrics = Tracer(enabled=True)
+
+    def close(self):
+        self.workers.terminate()
+        self.workers.join()
+
+    def create_session(self, dataset=None):
+        """Starts a session on a dataset, by name. Returns its description."""
+        dataset = dataset or self.default
+        if dataset not in self.datasets:
+            raise ServiceError(404, 'No dataset {}.'.format(dataset))
+        self.expire()
+        with self.sessions_lock:
+            if len(self.sessions) >= MAX_SESSIONS:
+                raise ServiceError(503, 'Too many sessions.')
+            session = Session(dataset)
+            self.sessions[session.id] = session
+        return {'session': session.id, 'dataset': dataset,
+                'datasets': self.datasets.names()}
+
+    def session(self, sid):
+        with self.sessions_lock:
+            session = self.sessions.get(sid)
+        if session is None:
+            raise ServiceError(404, 'No session {}.'.format(sid))
+        session.used = time.time()
+        return session
+
+    def delete_session(self, sid):
+        with self.sessions_lock:
+            if self.sessions.pop(sid, None) is None:
+                raise ServiceError(404, 'No session {}.'.format(sid))
+        return {'session': sid, 'closed': True}
+
+    def expire(self):
+        # Drop sessions that have been idle too long.
+        cutoff = time.time() - SESSION_TTL
+        with self.sessions_lock:
+            for sid in [s.id for s in self.sessions.values()
+                        if s.used < cutoff]:
+                del self.sessions[sid]
+
+    def _run(self, task, *args):
+        # Run a task on a worker, within the limit of requests in flight.
+        if not self.slots.acquire(False):
+            with self.stats_lock:
+                self.rejected += 1
+            raise ServiceError(503, 'Busy; try again shortly.')
+        with self.stats_lock:
+            self.in_flight += 1
+        start = clock()
+        try:
+            result = self.workers.apply_async(task, args).get(
+                REQUEST_TIMEOUT)
+        except multiprocessing.TimeoutError:
+            raise ServiceError(504, 'Timed out.')
+        finally:
+            with self.stats_lock:
+                self.in_flight -= 1
+            self.slots.release()
+        elapsed = clock() - start
+        self.metrics.record('worker', start, result['seconds'])
+        self.metrics.record('queue', start,
+                            max(0.0, elapsed - result['seconds']))
+        return result
+
+    def command(self, sid, text, fmt='png'):
+        """Runs a text command in a session.
+
+        Returns:
+            reply: Dict with the text, parsed intent, resulting spec, the
+                URL of the graph if the command left one, and the printed
+                output of the command.
+        """
+        if fmt not in FORMATS:
+            raise ServiceError(400, 'Unknown format {}.'.format(fmt))
+        session = self.session(sid)
+        with session.lock:
+            result = self._run(run_command, session.history, text, fmt)
+            session.history = result['history']
+            session.images = {}
+            if result['image'] is not None and not result['done']:
+                session.images[fmt] = result['image']
+        if result['done']:
+            # The session is gone, and its graph with it.
+            self.delete_session(sid)
+        return {'session': sid, 'text': text, 'intent': result['intent'],
+                'spec': result['spec'], 'log': result['log'],
+                'seconds': result['seconds'], 'closed': result['done'],
+                'graph': ('/sessions/{}/graph.{}'.format(sid, fmt)
+                          if fmt in session.images else None)}
+
+    def audio(self, sid, wav, fmt='png'):
+        """Recognizes a recorded command, as WAV bytes, and runs it."""
+        if self.recognizer is None:
+            raise ServiceError(501, 'No recognizer; start the server with '
+                                    '--recognizer.')
+        self.session(sid)
+        import speech_recognition as sr
+        # Older versions of speech_recognition call AudioFile WavFile.
+        audio_file = getattr(sr, 'AudioFile', None) or sr.WavFile
+        start = clock()
+        try:
+            with audio_file(StringIO(wav)) as source:
+                audio = self.recognizer.r.record(source)
+            text = self.recognizer.recognize(audio)
+        except (ValueError, EOFError), e:
+            raise ServiceError(400, 'Unreadable audio: {}'.format(e))
+        except LookupError:
+            raise ServiceError(422, 'Speech not understood.')
+        finally:
+            self.metrics.record('recognize', start, clock() - start)
+        return self.command(sid, text, fmt)
+
+    def graph(self, sid, fmt):
+        """Returns the session's graph as image bytes, rendering it in the
+        format asked for if the last command was rendered in another."""
+        if fmt not in FORMATS:
+            raise ServiceError(404, 'Unknown format {}.'.format(fmt))
+        session = self.session(sid)
+        with session.lock:
+            if fmt not in session.images:
+                result = self._run(render_spec, session.history.current, fmt)
+                if result['image'] is None:
+                    raise ServiceError(404, 'No graph yet.')
+                session.images[fmt] = result['image']
+            return session.images[fmt]
+
+    def count(self, status):
+        with self.stats_lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def report(self):
+        """Returns request counts and latency percentiles, in ms."""
+        latency = {}
+        for name, s in self.metrics.stats().items():
+            latency[name] = dict(zip(
+                ['count', 'total', 'p50', 'p90', 'p99', 'max'],
+                [s[0]] + [round(t * 1e3, 3) for t in s[1:]]))
+        return {'statuses': dict((str(k), v)
+                                 for k, v in self.statuses.items()),
+                'latency_ms': latency, 'sessions': len(self.sessions),
+                'in_flight': self.in_flight, 'limit': self.limit,
+                'rejected': self.rejected}
+
+
+def _init_worker(registry):
+    # Load the demo and register the datasets once per process. Datasets
+    # open from the on-disk cache, so workers share its pages.
+    import matplotlib
+    matplotlib.use('Agg')
+    import Graphic_mpl
+    Graphic_mpl.init_backend(interactive=False)
+    demo = imp.load_source('demo', DEMO_FILE)
+    pool = DatasetPool()
+    for name, path in registry:
+        pool.add(path, name)
+    _worker.update(demo=demo, pool=pool, graphic=demo.Graphic())
+
+
+def _show(spec):
+    # Point the worker's graph at spec, draw it if it is not on screen, and
+    # return its image bytes, or None if it is not a valid graph.
+    demo = _worker['demo']
+    g = _worker['graphic']
+    g.spec = spec
+    if g.shown != g.spec:
+        demo.show_spec(g, _worker['pool'])
+    return g
+
+
+def _image(g, fmt):
+    if g.shown is None or g.shown != g.spec or not g.valid_graph:
+        return None
+    out = StringIO()
+    g.figure.savefig(out, format=fmt)
+    return out.getvalue()
+
+
+def run_command(history, text, fmt):
+    """Runs one command of a session, in a worker.
+
+    Returns:
+        result: Dict with the updated history, the intent and spec as text,
+            the image bytes or None, the printed output, whether the
+            command ended the session, and the seconds it took.
+    """
+    demo = _worker['demo']
+    start = clock()
+    stdout = sys.stdout
+    sys.stdout = log = StringIO()
+    try:
+        g = _show(history.current)
+        intent = demo.get_parser().parse(unicode(text))
+        g, done = demo.handle_command(intent, g, history, _worker['pool'])
+        if g.shown != g.spec:
+            # Commands like "summary" leave the graph as it was, which this
+            # worker may not have on screen.
+            g = _show(g.spec)
+        _worker['graphic'] = g
+        image = _image(g, fmt)
+    finally:
+        sys.stdout = stdout
+    return {'history': history, 'intent': repr(intent), 'spec': repr(g.spec),
+            'image': image, 'log': log.getvalue(), 'done': done,
+            'seconds': clock() - start}
+
+
+def render_spec(spec, fmt):
+    """Renders a spec, in a worker. Returns a dict like run_command."""
+    start = clock()
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        image = _image(_show(spec), fmt)
+    finally:
+        sys.stdout = stdout
+    return {'image': image, 'seconds': clock() - start}
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Routes requests to the GraphService of the server."""
+    server_version = 'ggspeak/0.0.5'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        service = self.server.service
+        url = urlparse.urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = dict((k, v[-1]) for k, v in
+                     urlparse.parse_qs(url.query).items())
+        route = '{} /{}'.format(method, '/'.join(
+            ':id' if i == 1 and parts[0] == 'sessions' else p
+            for i, p in enumerate(parts)))
+        start = clock()
+        status = 200
+        try:
+            body = self._body()
+            reply = self._route(service, method, parts, query, body)
+        except ServiceError, e:
+            status = e.status
+            reply = {'error': str(e)}
+        except Exception, e:
+            status = 500
+            reply = {'error': '{}: {}'.format(type(e).__name__, e)}
+        if isinstance(reply, tuple):
+            self._send(status, reply[1], reply[0])
+        else:
+            self._send(status, json.dumps(reply), 'application/json')
+        if reply == {'error': NOT_FOUND}:
+            # Keep unknown paths out of the metrics.
+            route = '{} (not found)'.format(method)
+        service.count(status)
+        service.metrics.record(route, start, clock() - start)
+
+    def _body(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        if length > MAX_BODY:
+            raise ServiceError(413, 'Request body too large.')
+        return self.rfile.read(length) if length else ''
+
+    def _route(self, service, method, parts, query, body):
+        # Returns a dict to send as JSON, or (content type, bytes).
+        if method == 'GET' and parts == ['health']:
+            return {'ok': True}
+        if method == 'GET' and parts == ['datasets']:
+            return {'datasets': service.datasets.names(),
+                    'default': service.default}
+        if method == 'GET' and parts == ['metrics']:
+            return service.report()
+        if parts[:1] != ['sessions']:
+            raise ServiceError(404, NOT_FOUND)
+        if method == 'POST' and len(parts) == 1:
+            return service.create_session(_json(body).get('dataset'))
+        if len(parts) == 2 and method == 'DELETE':
+            return service.delete_session(parts[1])
+        if len(parts) == 3 and method == 'POST':
+            fmt = query.get('format', 'png')
+            if parts[2] == 'command':
+                if self.headers.gettype() == 'application/json':
+                    args = _json(body)
+                    text = args.get('text')
+                    fmt = args.get('format', fmt)
+                else:
+                    try:
+                        text = body.decode('utf-8')
+                    except UnicodeDecodeError:
+                        raise ServiceError(400, 'Command text is not UTF-8.')
+                if not text:
+                    raise ServiceError(400, 'No command text.')
+                return service.command(parts[1], text, fmt)
+            if parts[2] == 'audio':
+                return service.audio(parts[1], body, fmt)
+        if len(parts) == 3 and method == 'GET' and parts[2].startswith(
+                'graph.'):
+            fmt = parts[2].split('.', 1)[1]
+            return CONTENT_TYPES.get(fmt), service.graph(parts[1], fmt)
+        raise ServiceError(404, NOT_FOUND)
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(
+                self, format, *args)
+
+
+def _json(body):
+    if not body:
+        return {}
+    try:
+        args = json.loads(body)
+    except ValueError:
+        raise ServiceError(400, 'Body is not JSON.')
+    if not isinstance(args, dict):
+        raise ServiceError(400, 'Body is not a JSON object.')
+    return args
+
+
+class GraphServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server on localhost, with a thread per request."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, service, port=DEFAULT_PORT, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, (HOST, port), Handler)
+        self.service = service
+        self.verbose = verbose
+
+
+def serve(paths, port=DEFAULT_PORT, jobs=None, recognizer=None,
+          verbose=False):
+    """Serves graphing sessions on localhost until interrupted.
+
+    Args:
+        paths: CSV files to serve.
+        port: TCP port; 0 picks a free one.
+        jobs: Worker processes.
+        recognizer: Backend name for audio commands, from Recognizers, or
+            None to accept text only.
+        verbose: If True, log every request.
+    """
+    backend = None
+    if recognizer is not None:
+        import speech_recognition as sr
+        from CommandParser import CommandParser
+        from Recognizers import make_backend
+        vocabulary = CommandParser(stopwords=()).vocabulary()
+        pool = DatasetPool()
+        for path in paths:
+            pool.add(path)
+        backend = make_backend(recognizer, sr.Recognizer(),
+                               vocabulary + pool.vocabulary())
+    service = GraphService(paths, jobs, backend)
+    server = GraphServer(service, port, verbose)
+    print('Serving {} on http://{}:{}/'.format(
+        ', '.join(service.datasets.names()), HOST, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
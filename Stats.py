@@ -0,0 +1,339 @@
+#!/usr/bin/python
+
+# Title: Column Statistics
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Per-column statistics gathered in one streaming pass, a chunk at a time:
+# count, mean, variance, extremes and approximate quantiles of numeric
+# columns, and the most common values of categorical ones.
+
+import math
+from collections import defaultdict
+import numpy as np
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# Items kept per level of a quantile sketch. Quantiles land within about
+# half a percent of the rows of the true ones.
+SKETCH_SIZE = 512
+# Distinct values of a categorical column counted exactly. Past this, the
+# least common are dropped as chunks come in, and counts are approximate.
+MAX_TRACKED_VALUES = 10000
+# Most common values reported per column.
+TOP_VALUES = 5
+# Rows scanned at a time, when statistics are computed after loading.
+STATS_CHUNK_ROWS = 500000
+# Quantiles reported, as (label, fraction).
+QUANTILES = [('25%', 0.25), ('median', 0.5), ('75%', 0.75)]
+
+
+class QuantileSketch(object):
+    """Approximate quantiles of a stream of numbers, in bounded memory.
+
+    A simplified KLL sketch. Each item of level h stands for 2 ** h values.
+    When a level holds more than size items, it is sorted and every other
+    item, from a random start, moves up a level. A large chunk is thinned
+    to about size items in one step, by taking every 2 ** h-th of its
+    sorted values, which is what repeated halving would keep.
+    """
+
+    def __init__(self, size=SKETCH_SIZE, seed=0):
+        self.size = size
+        self.levels = []
+        self._random = np.random.RandomState(seed)
+
+    def update(self, values):
+        """Adds an array of values. NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        level = 0
+        if len(values) > 2 * self.size:
+            level = int(math.log(len(values) / float(self.size), 2))
+            step = 2 ** level
+            values = np.sort(values)[self._random.randint(step)::step]
+        self._insert(level, values)
+
+    def _insert(self, level, values):
+        while len(values):
+            while len(self.levels) <= level:
+                self.levels.append(np.empty(0))
+            items = np.concatenate([self.levels[level], values])
+            if len(items) <= self.size:
+                self.levels[level] = items
+                return
+            items.sort()
+            # An odd item out stays behind.
+            even = len(items) - len(items) % 2
+            self.levels[level] = items[even:]
+            values = items[self._random.randint(2):even:2]
+            level += 1
+
+    def quantile(self, q):
+        """Returns the value at fraction q of the stream, or None if empty.
+
+        Args:
+            q: Fraction, or array of fractions, in [0, 1].
+        """
+        items = np.concatenate(self.levels) if self.levels else np.empty(0)
+        if not len(items):
+            return None
+        weights = np.concatenate([np.full(len(level), 2.0 ** h)
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='mergesort')
+        items, weights = items[order], np.cumsum(weights[order])
+        ranks = np.asarray(q, dtype=np.float64) * weights[-1]
+        idx = np.clip(np.searchsorted(weights, ranks), 0, len(items) - 1)
+        return items[idx]
+
+    def to_dict(self):
+        return {'size': self.size,
+                'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d['size'])
+        sketch.levels = [np.array(level, dtype=np.float64)
+                         for level in d['levels']]
+        return sketch
+
+
+class ColumnStats(object):
+    """Statistics of one column, updated a chunk at a time.
+
+    Means and variances are merged across chunks with Welford's update, as
+    generalized by Chan et al., so they are as exact as a single pass over
+    all the values.
+
+    Attributes:
+        name: Column name.
+        kind: 'numeric' or 'categorical', as in the schema.
+        count: Number of non-null values.
+        nulls: Number of null values.
+        mean: Mean of a numeric column, or None.
+        min: Smallest value of a numeric column, or None.
+        max: Largest value of a numeric column, or None.
+        exact: False once a categorical column had too many distinct values
+            to count them all.
+    """
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.mean = None
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.exact = True
+        self.sketch = QuantileSketch() if kind == 'numeric' else None
+        self.counts = defaultdict(int) if kind == 'categorical' else None
+
+    @property
+    def is_numeric(self):
+        return self.kind == 'numeric'
+
+    def update(self, series):
+        """Adds the values of a chunk of the column, as a pandas Series."""
+        if self.is_numeric:
+            self._update_numeric(series.values)
+        else:
+            self._update_categorical(series)
+
+    def _update_numeric(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = values[~np.isnan(values)]
+        self.nulls += len(values) - len(valid)
+        n = len(valid)
+        if not n:
+            return
+        mean = valid.mean()
+        m2 = np.square(valid - mean).sum()
+        if self.count:
+            total = self.count + n
+            delta = mean - self.mean
+            self.mean += delta * n / total
+            self._m2 += m2 + delta * delta * self.count * n / total
+            self.min = min(self.min, valid.min())
+            self.max = max(self.max, valid.max())
+        else:
+            total = n
+            self.mean, self._m2 = mean, m2
+            self.min, self.max = valid.min(), valid.max()
+        self.count = total
+        self.sketch.update(valid)
+
+    def _update_categorical(self, series):
+        counts = series.value_counts()
+        self.nulls += int(series.isnull().sum())
+        self.count += int(counts.sum())
+        for label, n in counts.iteritems():
+            if n:
+                self.counts[_plain(label)] += int(n)
+        if len(self.counts) > MAX_TRACKED_VALUES:
+            keep = sorted(self.counts.items(), key=lambda kv: -kv[1])
+            self.counts = defaultdict(int, keep[:MAX_TRACKED_VALUES])
+            self.exact = False
+
+    @property
+    def variance(self):
+        """Sample variance, as pandas computes it, or None."""
+        if not self.is_numeric or self.count < 2:
+            return None
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        variance = self.variance
+        return None if variance is None else math.sqrt(variance)
+
+    def quantile(self, q):
+        """Approximate value at fraction q of a numeric column, or None."""
+        if not self.is_numeric:
+            return None
+        return self.sketch.quantile(q)
+
+    @property
+    def distinct(self):
+        """Number of distinct values of a categorical column seen, or None.
+        A lower bound when not exact."""
+        return None if self.is_numeric else len(self.counts)
+
+    def top(self, k=TOP_VALUES):
+        """Returns the k most common values, as (value, count) pairs."""
+        if self.is_numeric:
+            return []
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return ranked[:k]
+
+    def to_dict(self):
+        d = {'name': self.name, 'kind': self.kind, 'count': self.count,
+             'nulls': self.nulls, 'exact': self.exact}
+        if self.is_numeric:
+            d.update(mean=self.mean, m2=self._m2, min=_plain(self.min),
+                     max=_plain(self.max), sketch=self.sketch.to_dict())
+        else:
+            d['counts'] = self.counts.items()
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls(d['name'], d['kind'])
+        stats.count = d['count']
+        stats.nulls = d['nulls']
+        stats.exact = d['exact']
+        if stats.is_numeric:
+            stats.mean, stats._m2 = d['mean'], d['m2']
+            stats.min, stats.max = d['min'], d['max']
+            stats.sketch = QuantileSketch.from_dict(d['sketch'])
+        else:
+            stats.counts = defaultdict(int, (tuple(kv) for kv in d['counts']))
+        return stats
+
+    def __repr__(self):
+        return 'ColumnStats({}, {}, {} values)'.format(self.name, self.kind,
+                                                       self.count)
+
+
+class DatasetStats(object):
+    """ColumnStats of the columns of a dataset, filled in as chunks of it
+    are read. Columns first seen in a chunk are added then.
+
+    A column whose chunks change kind, as when text turns up in a column of
+    numbers, has its statistics dropped for the rest of the stream, so that
+    gathering them never fails a load. Dropped columns are missing, like
+    any other, and are scanned in full when first described.
+    """
+
+    def __init__(self, columns=()):
+        self.columns = dict((stats.name, stats) for stats in columns)
+        self.dropped = set()
+
+    def update(self, chunk):
+        """Adds a chunk of rows, as a DataFrame."""
+        for col in chunk.columns:
+            if col in self.dropped:
+                continue
+            kind = _kind(chunk[col].dtype)
+            stats = self.columns.get(col)
+            if stats is None:
+                stats = self.columns[col] = ColumnStats(col, kind)
+            elif stats.kind != kind:
+                self._drop(col)
+                continue
+            try:
+                stats.update(chunk[col])
+            except (ValueError, TypeError):
+                self._drop(col)
+
+    def _drop(self, name):
+        self.columns.pop(name, None)
+        self.dropped.add(name)
+
+    def add(self, stats):
+        self.columns[stats.name] = stats
+
+    def discard(self, names):
+        """Forgets the named columns, e.g. to read them again."""
+        for name in names:
+            self.columns.pop(name, None)
+            self.dropped.discard(name)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def to_dict(self):
+        return {'columns': [s.to_dict() for s in self.columns.values()]}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(ColumnStats.from_dict(c) for c in d['columns'])
+
+
+def column_stats(name, series, chunk_rows=STATS_CHUNK_ROWS):
+    """Computes the ColumnStats of a whole column, a chunk at a time."""
+    stats = ColumnStats(name, _kind(series.dtype))
+    for start in range(0, len(series), chunk_rows):
+        stats.update(series.iloc[start:start + chunk_rows])
+    return stats
+
+
+def format_stats(stats):
+    """Returns the statistics of a column as lines of text."""
+    lines = ['{}: {} values, {} missing'.format(stats.name, stats.count,
+                                                stats.nulls)]
+    if stats.is_numeric:
+        if not stats.count:
+            return lines
+        spread = '  mean {:.6g}'.format(stats.mean)
+        if stats.std is not None:
+            spread += ', std {:.6g}'.format(stats.std)
+        lines.append(spread)
+        points = [('min', stats.min)]
+        points += [(label, stats.quantile(q)) for label, q in QUANTILES]
+        points.append(('max', stats.max))
+        lines.append('  ' + ', '.join('{} {:.6g}'.format(label, value)
+                                      for label, value in points))
+    else:
+        lines[0] += ', {}{} distinct'.format(
+            stats.distinct, '' if stats.exact else '+')
+        total = float(max(stats.count, 1))
+        lines.append('  most common: ' + ', '.join(
+            '{} {} ({:.1%})'.format(value, n, n / total)
+            for value, n in stats.top()))
+    return lines
+
+
+def _kind(dtype):
+    # Booleans are better treated as two categories, as in the schema.
+    if is_numeric_dtype(dtype) and not is_bool_dtype(dtype):
+        return 'numeric'
+    return 'categorical'
+
+
+def _plain(value):
+    # Python value of a numpy scalar, so that it can be written as JSON.
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+# Title: Tracer
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Lightweight timing spans across the speech and graphing pipeline:
+#
+#   with span('recognize'):
+#       text = r.recognize(audio)
+
+import ctypes
+import ctypes.util
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Spans kept in memory; older ones are dropped.
+TRACE_BUFFER = 10000
+PERCENTILES = (50, 90, 99)
+
+
+def _monotonic_clock():
+    # Seconds from CLOCK_MONOTONIC, which never jumps with the wall clock.
+    # Falls back to time.time where clock_gettime is not available.
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = libc.clock_gettime
+        # CLOCK_MONOTONIC on Linux and the BSDs; macOS numbers it 6.
+        clock_id = 6 if os.uname()[0] == 'Darwin' else 1
+    except (OSError, AttributeError, TypeError):
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+    def monotonic():
+        # A timespec per call, since spans are timed from several threads.
+        t = timespec()
+        if clock_gettime(clock_id, ctypes.byref(t)):
+            return time.time()
+        return t.tv_sec + t.tv_nsec * 1e-9
+    if clock_gettime(clock_id, ctypes.byref(timespec())):
+        return time.time
+    return monotonic
+
+clock = getattr(time, 'monotonic', None) or _monotonic_clock()
+
+
+class _NullSpan(object):
+    # Returned while tracing is off, so a disabled span costs one call.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, clock() - self.start,
+                           self.args)
+        return False
+
+
+class Tracer(object):
+    """Records named, timed spans in a bounded in-memory buffer.
+
+    Off by default. While off, span() returns a shared do-nothing context
+    manager, so instrumented code runs at essentially full speed. Spans are
+    recorded from any thread, with the thread's id, so the background
+    speech threads show up alongside the main one.
+    """
+
+    def __init__(self, enabled=False, size=TRACE_BUFFER):
+        self.enabled = enabled
+        self.spans = deque(maxlen=size)
+        self.origin = clock()
+
+    def span(self, name, **args):
+        """Returns a context manager that times its body as a span.
+
+        Args:
+            name: Span name, such as 'recognize'.
+            args: Details shown with the span in a Chrome trace.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name, start, duration, args=None):
+        """Adds a span measured elsewhere, with start from clock()."""
+        # deque.append is atomic, so no lock is needed.
+        self.spans.append((name, start, duration,
+                           threading.current_thread().ident, args))
+
+    def clear(self):
+        self.spans.clear()
+
+    def stats(self):
+        """Returns {name: (count, total, p50, p90, p99, max)}, in seconds."""
+        durations = {}
+        for name, _, duration, _, _ in list(self.spans):
+            durations.setdefault(name, []).append(duration)
+        stats = {}
+        for name, d in durations.items():
+            d.sort()
+            ps = tuple(d[min(len(d) - 1, len(d) * p // 100)]
+                       for p in PERCENTILES)
+            stats[name] = (len(d), sum(d)) + ps + (d[-1],)
+        return stats
+
+    def report(self):
+        """Prints percentiles of each span, in ms, slowest total first."""
+        stats = self.stats()
+        if not stats:
+            print('No spans recorded.')
+            return
+        print('{:20} {:>6} {:>10} {:>9} {:>9} {:>9} {:>9}'.format(
+            'span (ms)', 'count', 'total', 'p50', 'p90', 'p99', 'max'))
+        for name, s in sorted(stats.items(), key=lambda i: -i[1][1]):
+            print('{:20} {:6d} {:10.1f} {:9.1f} {:9.1f} {:9.1f} {:9.1f}'
+                  ''.format(name, s[0], *[t * 1e3 for t in s[1:]]))
+
+    def export_chrome(self, path):
+        """Writes the spans as a Chrome trace, for chrome://tracing."""
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6,
+                   'args': args or {}}
+                  for name, start, duration, tid, args in list(self.spans)]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+# The process-wide tracer, and a shortcut to its spans.
+tracer = Tracer()
+span = tracer.span
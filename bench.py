@@ -0,0 +1,244 @@
+#!/usr/bin/python
+
+# Title: Benchmarks
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Times the parse, validate, aggregate and render paths on diamonds.csv and
+# on synthetic scale-ups of it, and writes the results as JSON:
+#
+#   python bench.py --out bench.json
+#   python bench.py --datasets diamonds,1m --compare bench.json
+
+import argparse
+import imp
+import json
+import os
+import platform
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+import Graphic_mpl
+from Graphic_mpl import Graphic
+from GraphSpec import GraphSpec
+from Loader import downcast, infer_dtypes
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DIAMONDS = os.path.join(HERE, 'diamonds.csv')
+DEMO_FILE = os.path.join(HERE, 'demo_0.0.5.py')
+
+DATASETS = ['diamonds', '1m', '10m', 'wide']
+# Rows of the scaled-up datasets, and columns of the wide one.
+SCALED_ROWS = {'1m': 10 ** 6, '10m': 10 ** 7}
+WIDE_COLUMNS = 1000
+
+# A benchmark regresses if its median time grows by more than this factor.
+REGRESSION_RATIO = 1.25
+# Medians below this are too noisy to call regressions.
+NOISE_SECONDS = 0.005
+
+COMMAND = u'show me carat versus price grouped by cut'
+TERMS = [u'carat', u'price', u'cut']
+
+# make_gg_plot branches, as graph specs.
+PLOTS = [
+    ('point', GraphSpec(geom='point', data_cols=('carat', 'price'))),
+    ('point_grouped_categorical',
+     GraphSpec(geom='point', data_cols=('carat', 'price'), grouping='cut')),
+    ('point_grouped_numeric',
+     GraphSpec(geom='point', data_cols=('carat', 'price'), grouping='depth')),
+    ('hist', GraphSpec(geom='hist', data_cols=('price',))),
+    ('hist_grouped',
+     GraphSpec(geom='hist', data_cols=('price',), grouping='cut')),
+    ('bar', GraphSpec(geom='bar', data_cols=('cut',))),
+    ('bar_crosstab',
+     GraphSpec(geom='bar', data_cols=('cut',), grouping='color')),
+    ('point_filtered',
+     GraphSpec(geom='point', data_cols=('carat', 'price'),
+               filters=(('cut', '==', ('Ideal',)), ('price', '>', 5000.0)))),
+    ('hist_filtered',
+     GraphSpec(geom='hist', data_cols=('price',),
+               filters=(('carat', 'between', (1.0, 2.0)),))),
+    ('matrix',
+     GraphSpec(geom='matrix', data_cols=('carat', 'price', 'depth'))),
+]
+
+
+def main():
+    args = parse_args()
+    Graphic_mpl.init_backend(interactive=False)
+    demo = imp.load_source('demo', DEMO_FILE)
+    report = {'meta': environment(), 'datasets': {}}
+    for name in args.datasets.split(','):
+        print('Benchmarking {}...'.format(name))
+        report['datasets'][name] = bench_dataset(demo, name, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark ggspeak.')
+    ap.add_argument('--datasets', default=','.join(DATASETS),
+                    help='Comma-separated datasets, from {}.'.format(
+                        ', '.join(DATASETS)))
+    ap.add_argument('--repeat', type=int, default=5,
+                    help='Timed runs of each benchmark.')
+    ap.add_argument('--out', help='JSON file to write. Default: stdout.')
+    ap.add_argument('--compare', help='Earlier JSON results to compare to.')
+    ap.add_argument('--threshold', type=float, default=REGRESSION_RATIO,
+                    help='Slowdown ratio reported as a regression.')
+    return ap.parse_args()
+
+
+def environment():
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def make_dataset(name):
+    """Builds a benchmark DataFrame, typed the way the loader types it.
+
+    'diamonds' is the bundled file. '1m' and '10m' repeat its rows up to
+    that many; 'wide' adds WIDE_COLUMNS numeric columns, named after the
+    original ones, so that column matching has many near misses.
+    """
+    if name not in DATASETS:
+        raise ValueError('Unknown dataset: {}'.format(name))
+    frame = pd.read_csv(DIAMONDS)
+    for col, dtype in infer_dtypes(frame).items():
+        frame[col] = frame[col].astype(dtype)
+    frame = downcast(frame)
+    if name in SCALED_ROWS:
+        n = SCALED_ROWS[name]
+        rows = np.arange(n) % len(frame)
+        frame = frame.iloc[rows].reset_index(drop=True)
+    elif name == 'wide':
+        numeric = [c for c in frame.columns if frame[c].dtype.kind in 'if']
+        extra = {}
+        for i in range(WIDE_COLUMNS):
+            source = numeric[i % len(numeric)]
+            extra['{}_{}'.format(source, i)] = frame[source].values
+        frame = pd.concat([frame, pd.DataFrame(extra)], axis=1)
+    return frame
+
+
+def measure(fn, repeat):
+    """Runs fn repeat times, with printing silenced.
+
+    Returns:
+        stats: Dict of the first run's time, which includes filling caches,
+            and the min and median of the others, in seconds.
+    """
+    times = []
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            for _ in range(max(repeat, 2)):
+                start = time.time()
+                fn()
+                times.append(time.time() - start)
+        finally:
+            sys.stdout = stdout
+    rest = sorted(times[1:])
+    return {'first': times[0], 'min': rest[0],
+            'median': rest[len(rest) // 2], 'runs': len(times)}
+
+
+def bench_dataset(demo, name, repeat):
+    start = time.time()
+    frame = make_dataset(name)
+    result = {'rows': len(frame), 'columns': len(frame.columns),
+              'build': time.time() - start, 'benchmarks': {}}
+    g = Graphic().set_dataset(frame)
+    bench = result['benchmarks']
+    columns = list(frame.columns)
+    parser = demo.get_parser()
+
+    def extract():
+        g.spec = GraphSpec()
+        demo.extract_data_cols(g, TERMS[:2])
+
+    def infer():
+        g.spec = GraphSpec(data_cols=('carat', 'price'))
+        demo.infer_geom(g)
+
+    def validate():
+        g.spec = PLOTS[0][1]
+        g.is_valid_graph()
+
+    bench['tokenize'] = measure(lambda: demo.tokenize(COMMAND), repeat)
+    bench['parse'] = measure(lambda: parser.parse(COMMAND), repeat)
+    bench['extract_data_cols'] = measure(extract, repeat)
+    bench['homophone_matches'] = measure(
+        lambda: demo.homophone_matches(TERMS, columns), repeat)
+    bench['infer_geom'] = measure(infer, repeat)
+    bench['is_valid_graph'] = measure(validate, repeat)
+    # The first run scans the column; later ones are cached.
+    bench['stats'] = measure(lambda: g.aggregates.stats('price'), repeat)
+    bench['stats_filtered'] = measure(
+        lambda: g.aggregates.stats('price', (('cut', '==', ('Ideal',)),)),
+        repeat)
+
+    for plot_name, spec in PLOTS:
+        def build():
+            g.spec = spec
+            g.clear()
+            g.make_gg_plot()
+
+        def render():
+            build()
+            g.figure.canvas.draw()
+        bench['plot_' + plot_name] = measure(build, repeat)
+        bench['render_' + plot_name] = measure(render, repeat)
+    g.clear()
+    return result
+
+
+def compare(baseline, report, threshold=REGRESSION_RATIO):
+    """Prints median times against a baseline report.
+
+    Returns:
+        regressions: Names of benchmarks that got slower than threshold.
+    """
+    regressions = []
+    for name, result in sorted(report['datasets'].items()):
+        old = baseline.get('datasets', {}).get(name)
+        if old is None:
+            continue
+        for bench, stats in sorted(result['benchmarks'].items()):
+            before = old['benchmarks'].get(bench)
+            if before is None:
+                continue
+            ratio = stats['median'] / max(before['median'], 1e-9)
+            flag = ''
+            if (ratio > threshold and
+                    stats['median'] - before['median'] > NOISE_SECONDS):
+                flag = '  REGRESSION'
+                regressions.append('{}/{}'.format(name, bench))
+            print('{:10} {:36} {:9.4f}s -> {:9.4f}s  x{:.2f}{}'.format(
+                name, bench, before['median'], stats['median'], ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    sys.exit(main())
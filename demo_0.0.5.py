@@ -6,281 +6,561 @@
 #
 # Graph by voice.
 
-import speech_recognition as sr
-import unicodedata
+import time
+_START = time.time()
+
+# Heavy packages (speech_recognition, pandas, matplotlib, nltk, jellyfish)
+# are imported where they are first used, so the first prompt shows fast.
+import argparse
+import json
 import os
-import pandas as pd
-from copy import copy
-from Graphic_mpl import Graphic
-from jellyfish import levenshtein_distance as ld
-from nltk.corpus import stopwords as sw
-from matplotlib import pyplot as plt
-plt.style.use('ggplot')
-plt.ion()
+import threading
+from collections import OrderedDict
+from CommandParser import CommandParser
+from DatasetPool import DatasetPool
+from GraphSpec import GraphSpec, SpecHistory
+from Graphic_mpl import Graphic, flush_events
+from Multiplot import (MAX_BAR_CATEGORIES, MAX_MATRIX_COLS, MAX_PANELS,
+                       start_pool)
+from Pipeline import SpeechPipeline, report_latency
+from Recognizers import BACKENDS, make_backend
+from RowIndex import describe, label_text
+from Stats import format_stats
+from Tracer import span, tracer
+
+# Match spoken terms to column names within one edit or by sound.
+FUZZY_MATCH = True
+
+# Only read a column from the file once a command refers to it.
+LAZY_COLUMNS = False
+
+# Ambient noise calibration is saved here and reused while it is fresh.
+CALIBRATION_FILE = os.path.expanduser('~/.ggspeak/calibration.json')
+CALIBRATION_MAX_AGE = 24 * 60 * 60
+
+# Name indexes built by homophone_matches, for this many lists of targets.
+MAX_TARGET_INDEXES = 8
+_target_indexes = OrderedDict()
+
+# Startup phases, as (name, time.time() at end of phase).
+_phases = [('start', _START)]
 
 
 def main():
+    args = parse_args()
+    tracer.enabled = args.trace or args.trace_file is not None
+    mark_phase('imports')
+
+    # Fork the processes that draw grids of graphs now, before any thread
+    # of ours starts.
+    start_pool()
+
     # Give introduction to program and goal.
     introduction()
 
-    # Get recognizer and microphone objects.
-    r, mic = prepare_mic()
+    # Build the command parser in the background, while the user is busy
+    # with the microphone and the file prompt.
+    warm_up = threading.Thread(target=get_parser)
+    warm_up.daemon = True
+    warm_up.start()
 
-    # Instantiate empty graph object.
-    g_empty = Graphic()
+    # Get recognizer and microphone objects. The text backend replays a
+    # script, and needs neither.
+    if args.recognizer == 'text':
+        r = mic = None
+    else:
+        r, mic = prepare_mic(args.recalibrate)
+    mark_phase('microphone')
+
+    # Register the datasets of the session, and instantiate an empty graph
+    # of the first one, or of a file the user chooses.
+    pool = DatasetPool(lazy_columns=LAZY_COLUMNS)
+    names = [pool.add(path) for path in args.data or []]
+    g = choose_dataset(Graphic(), pool, names[0] if names else None)
+    history = SpecHistory(g.spec)
+    mark_phase('dataset prompt')
+
+    # Build the command parser once, so each utterance is a single scan.
+    parser = get_parser()
+    mark_phase('parser')
+
+    # The offline decoder listens for command words and column names.
+    backend = make_backend(args.recognizer, r,
+                           parser.vocabulary() + pool.vocabulary(),
+                           args.script)
+    if args.recognizer == 'text':
+        r = mic = backend
+
+    # Run speech recognition and graphing in a streaming format. Audio is
+    # captured and recognized on background threads, so the microphone keeps
+    # listening while plots are drawn here.
+    # A replayed script must not lose commands, so it never drops them.
+    pipeline = SpeechPipeline(r, mic, backend.recognize,
+                              drop_stale=args.recognizer != 'text').start()
+    mark_phase('recognizer')
+    if args.profile_startup:
+        report_startup()
+    print '\n Listening...'
+    while 1:
+        utterance = pipeline.next_utterance()
+        if utterance is None:
+            # Keep the plot window responsive while waiting.
+            flush_events()
+            continue
+        if not utterance.text:
+            print("Didn't get audio.")
+            continue
+        print('You said: ' + utterance.text)
+        with span('parse'):
+            intent = parser.parse(utterance.text)
+        with span('command', text=utterance.text, action=intent.action):
+            g, done = handle_command(intent, g, history, pool)
+        report_latency(utterance, time.time())
+        if done:
+            pipeline.stop()
+            backend.report()
+            g.renders.report()
+            if args.trace_file:
+                tracer.export_chrome(args.trace_file)
+                print 'Trace written to {}.'.format(args.trace_file)
+            return None
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Graph by voice.')
+    ap.add_argument('--recognizer', choices=BACKENDS, default='remote',
+                    help='Speech recognizer backend.')
+    ap.add_argument('--script', help='Command file for the text recognizer.')
+    ap.add_argument('--data', action='append',
+                    help='CSV file to graph. Repeat for more; say "switch to '
+                         '<file name>" to change between them.')
+    ap.add_argument('--recalibrate', action='store_true',
+                    help='Measure ambient noise again, even if saved.')
+    ap.add_argument('--profile-startup', action='store_true',
+                    help='Report time to first prompt, by phase.')
+    ap.add_argument('--trace', action='store_true',
+                    help='Time each stage of every command from the start; '
+                         'say "profile" for the timings.')
+    ap.add_argument('--trace-file',
+                    help='Trace every command, and write the spans to this '
+                         'file on quit, for chrome://tracing.')
+    args = ap.parse_args()
+    if args.recognizer == 'text' and not args.script:
+        ap.error('--recognizer text needs --script.')
+    for path in args.data or []:
+        if not os.path.isfile(path):
+            ap.error('No such file: {}'.format(path))
+    return args
+
+
+def handle_command(intent, g, history, pool=None):
+    """Carries out one parsed command.
 
-    # Set dataset and filename values of graph object by choosing dataset.
-    g_data_only = choose_dataset(g_empty)
-    g = copy(g_data_only)
+    Args:
+        intent: Parsed intent of the command.
+        g: Current Graphic object.
+        history: SpecHistory of the graph, which the command is added to.
+        pool: DatasetPool of the session, if there may be several datasets.
 
-    # Run speech recognition and graphing in a streaming format.
-    while 1:
-        raw_input('Tap ENTER to continue.')
-        with mic as source:
-            audio = get_audio(r, source)
-            try:
-                text = r.recognize(audio)
-                print('You said: ' + text)
-            except LookupError:
-                print("Didn't get audio.")
-                continue
-            # See if command is quit, save, reset, or edit.
-            if text:
-                terms = tokenize(text)
-
-                # Decide what the terms indicate, and do the actions.
-                if is_quit(terms):
-                    print 'Goodbye'
-                    return None
-                elif is_save(terms):
-                    # TODO: Write save function.
-                    continue
-                elif is_reset(terms):
-                    plt.clf()
-                    g = copy(g_data_only)
-                    data_preview(g)
-                    print 'DEFINE a new graph.'
-                elif is_summary(terms):
-                    data_preview(g)
-                    g.summarize()
-                elif g.has_base():
-                    g = update_graph(g, terms)
-                    g = graph_if_valid(g, g_data_only)
-                else:
-                    g = create_graph(g, terms)
-                    g = graph_if_valid(g, g_data_only)
+    Returns:
+        g: Graphic object after the command.
+        done: True if the user asked to quit.
+    """
+    # Decide what the intent indicates, and do the actions.
+    if intent.action == 'quit':
+        print 'Goodbye'
+        return g, True
+    elif intent.action == 'save':
+        # TODO: Write save function.
+        pass
+    elif intent.action == 'reset':
+        g.clear()
+        g.spec = GraphSpec(dataset=g.spec.dataset)
+        data_preview(g)
+        print 'DEFINE a new graph.'
+    elif intent.action in ('undo', 'redo'):
+        if intent.action == 'undo':
+            spec = history.undo()
+        else:
+            spec = history.redo()
+        if spec is None:
+            print 'Nothing to {}.'.format(intent.action)
+        else:
+            g.spec = spec
+            show_spec(g, pool)
+    elif intent.action == 'switch':
+        name = pool.match(intent.terms) if pool is not None else None
+        if name is None:
+            print 'Datasets: {}'.format(', '.join(
+                pool.names() if pool is not None else [g.filename]))
+        else:
+            # Pick up the graph of that dataset where it was left.
+            g.spec = (history.latest(lambda spec: spec.dataset == name) or
+                      GraphSpec(dataset=name))
+            show_spec(g, pool)
+    elif intent.action == 'unfilter':
+        if g.filters:
+            g.filters = []
+            print 'Showing all rows.'
+            show_spec(g, pool)
+        else:
+            print 'No filters to clear.'
+    elif intent.action == 'summary':
+        # "describe price" describes the variables named, or filtered on;
+        # "summary" the dataset and the graph.
+        cols = (named_columns(g, intent, 'action') or
+                [str(c) for c in match_columns(
+                    g, [f[0] for f in intent.filters])])
+        if not cols:
+            data_preview(g)
+            g.summarize()
+            if pool is not None and len(pool.names()) > 1:
+                pool.report()
+        describe_columns(g, cols or g.data_cols, intent)
+    elif intent.action == 'profile':
+        if tracer.enabled:
+            tracer.report()
+        else:
+            tracer.enabled = True
+            print 'Timing commands from now on. Say "profile" again to see.'
+    elif g.has_base():
+        with span('update_graph'):
+            g = update_graph(g, intent)
+        g = graph_if_valid(g)
+    else:
+        with span('create_graph'):
+            g = create_graph(g, intent)
+        g = graph_if_valid(g)
+    # Reset, switches and edits are recorded, so they can be undone.
+    history.record(g.spec)
+    return g, False
 
 
 def introduction():
     print('\n\n----------- GGSPEAK: Graph by Voice ------------')
 
 
-def prepare_mic():
+def prepare_mic(recalibrate=False):
     """Instantiates recognizer and microphone objects.
 
-    These objects come from the speech_recognition package.
+    These objects come from the speech_recognition package. The ambient
+    noise level is measured once and saved, and reused while it is fresh.
 
     Args:
-    NA
+    recalibrate: If True, measure ambient noise even if a level is saved.
 
     Returns:
     r: A recognizer object.
     m: A microphone object.
     """
+    import speech_recognition as sr
     r = sr.Recognizer()
     m = sr.Microphone()
-    with m as source:
-        r.adjust_for_ambient_noise(source, duration=2)
-        r.pause_threshold = 0.5
+    r.pause_threshold = 0.5
+    threshold = None if recalibrate else load_calibration()
+    if threshold is not None:
+        r.energy_threshold = threshold
+    else:
+        with m as source:
+            r.adjust_for_ambient_noise(source, duration=2)
+        save_calibration(r.energy_threshold)
     return r, m
 
 
-def choose_dataset(g):
-    valid_file = False
-    while not valid_file:
+def load_calibration():
+    # Returns the saved energy threshold, or None if missing or stale.
+    try:
+        with open(CALIBRATION_FILE) as f:
+            saved = json.load(f)
+        if time.time() - saved['time'] < CALIBRATION_MAX_AGE:
+            return saved['energy_threshold']
+    except (IOError, ValueError, KeyError):
+        pass
+    return None
+
+
+def save_calibration(threshold):
+    try:
+        if not os.path.isdir(os.path.dirname(CALIBRATION_FILE)):
+            os.makedirs(os.path.dirname(CALIBRATION_FILE))
+        with open(CALIBRATION_FILE, 'w') as f:
+            json.dump({'energy_threshold': threshold, 'time': time.time()}, f)
+    except (IOError, OSError), e:
+        print 'Could not save calibration: {}'.format(e)
+
+
+def mark_phase(name):
+    _phases.append((name, time.time()))
+
+
+def report_startup():
+    # Time-to-first-prompt, broken down by phase.
+    print('Startup profile:')
+    for (_, begin), (name, end) in zip(_phases, _phases[1:]):
+        print('  {:<16} {:7.3f}s'.format(name, end - begin))
+    print('  {:<16} {:7.3f}s'.format('total', _phases[-1][1] - _START))
+
+
+def choose_dataset(g, pool, name=None):
+    # Start the graph on the named dataset, or ask for a file.
+    while name is None:
         try:
             print 'Type file name.'
             filename = os.getcwd()+'/'+raw_input('Filename: '+os.getcwd()+'/')
-            dataset = pd.read_csv(filename)
-            dataset.columns = [w.lower() for w in dataset.columns]
-            # TODO: normalize headers by removing spaces and punct.
-            valid_file = True
-
-            # Set dataset as the chosen file.
-            g.dataset = dataset
-            g.filename = filename
-
-            names = '[' + ', '.join(list(g.dataset.columns.values)) + ']'
-            names = names.upper()
-            print('\nYou are using the dataset ' + g.filename)
-            data_preview(g)
-
+            name = pool.add(filename)
         except Exception, e:
             print e
             print("No document found.")
+    g.spec = GraphSpec(dataset=name)
+    return bind_dataset(g, pool)
 
-    return g
 
+def bind_dataset(g, pool):
+    """Points the graph at the dataset its spec names.
 
-def data_preview(g):
-    print('Data preview:')
-    print(g.dataset.head(5))
+    The dataset is shared from the pool, which loads it if needed, and the
+    graph lets go of the one it was using, so the pool may unload that.
 
+    Args:
+        g: Graphic object.
+        pool: DatasetPool of the session, or None.
 
-def get_audio(r, source):
-    print "\n Listening..."
-    audio = r.listen(source)
-    return audio
+    Returns:
+        g: Graphic object.
+    """
+    name = g.spec.dataset
+    current = getattr(g.source, 'name', None)
+    if pool is None or name is None or name == current:
+        return g
+    g.clear()
+    g.set_source(pool.acquire(name))
+    if current is not None:
+        pool.release(current)
+    print('\nYou are using the dataset ' + g.filename)
+    data_preview(g)
+    return g
 
 
-def tokenize(text):
-    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore')
-    text = text.lower()
-    terms = text.split(' ')
-    terms = [t for t in terms if t not in sw.words('english')]
-    return terms
+def data_preview(g):
+    print('Data preview:')
+    print(g.source.preview(5))
 
 
-def is_quit(terms):
-    quit_words = ['quit', 'stop', 'done', 'finish', 'finished', 'end', 'enough',
-                  'exit', 'goodbye', 'close']
-    wants_to_quit = bool(set(quit_words) & set(terms))
-    return wants_to_quit
+def describe_columns(g, cols, intent):
+    # Print statistics of each variable, over the rows that the graph's
+    # filters and the command's own keep. The graph is left as it was.
+    spec = g.spec
+    g = extract_filters(g, intent)
+    where = g.spec.filters
+    g.spec = spec
+    if cols and where:
+        print('Statistics where {}:'.format(describe(where)))
+    for col in cols:
+        g.source.require([col])
+        for line in format_stats(g.aggregates.stats(col, where)):
+            print(line)
 
 
-def is_summary(terms):
-    summary_words = ['summary', 'summarize', 'describe', 'description']
-    wants_summary = bool(set(summary_words) & set(terms))
-    return wants_summary
+_parser = None
+_parser_lock = threading.Lock()
 
 
-def is_reset(terms):
-    reset_words = ['reset', 'clear', 'new']
-    wants_to_reset = bool(set(reset_words) & set(terms))
-    return wants_to_reset
+def get_parser():
+    # Build the command parser on first use and reuse it afterwards.
+    global _parser
+    with _parser_lock:
+        if _parser is None:
+            _parser = CommandParser()
+    return _parser
 
 
-def is_save(terms):
-    save_words = ['save']
-    wants_to_save = bool(set(save_words) & set(terms))
-    return wants_to_save
+def tokenize(text):
+    return get_parser().tokenize(text)
 
 
-def create_graph(g, terms):
-    """With terms, extracts basic graph elements.
+def create_graph(g, intent):
+    """With intent, extracts basic graph elements.
 
     Gets data columns and geometry of graph.
 
     Args:
         g: Graphic object.
-        terms: Terms from latest voice command.
+        intent: Parsed intent of latest voice command.
 
     Returns:
         g: Graphic object.
     """
     # Search the command for instructions about specific graph attributes.
-    g = extract_data_cols(g, terms)
-    g = extract_geom(g, terms)
+    g = extract_filters(g, intent)
+    g = extract_data_cols(g, intent.terms)
+    if not g.data_cols and intent.filters:
+        # "price above 5000" graphs the variable it filters.
+        g = extract_data_cols(g, [f[0] for f in intent.filters])
+    g = extract_geom(g, intent)
     return g
 
 
-def update_graph(g, terms):
-    """With terms, edits ancillary graph features, like titles and labels.
+def update_graph(g, intent):
+    """With intent, edits ancillary graph features, like titles and labels.
 
     Determines ancillary features, like titles, labels, smoothing functions,
-    groupings, stackings, etc.
+    groupings, stackings, filters, etc.
 
     Args:
         g: Graphic object.
-        terms: Tokens from latest voice command.
+        intent: Parsed intent of latest voice command.
 
     Returns:
         g: Graphic object.
     """
-    if g.geom == 'point':
-        g = extract_stat_functions(g, terms)
-    g = extract_grouping(g, terms)
-    plt.clf()
+    if g.geom in ('point', 'matrix'):
+        g = extract_stat_functions(g, intent)
+        g = extract_render_mode(g, intent)
+    elif g.geom == 'hist':
+        g = extract_layout(g, intent)
+    g = extract_grouping(g, intent)
+    g = extract_filters(g, intent)
     return g
 
 
-def graph_if_valid(g, g_data_only):
-    # Graph the plot if it's valid, otherwise summarize.
-    if g.is_valid_graph():
-        g.make_gg_plot()
+def graph_if_valid(g):
+    # Graph the plot if it's valid, otherwise summarize. Draws only what
+    # changed, when the plot on screen allows it.
+    with span('is_valid_graph'):
+        valid = g.is_valid_graph()
+    if valid:
+        with span('draw'):
+            g.draw()
     else:
         print 'INVALID graph.'
         g.summarize()
         print 'Reseting graph.'
-        g = copy(g_data_only)
+        g.spec = GraphSpec(dataset=g.spec.dataset)
     return g
 
 
+def show_spec(g, pool=None):
+    # Draw the graph of a spec from the history, or clear the figure if the
+    # spec is not a complete graph.
+    bind_dataset(g, pool)
+    if g.is_valid_graph():
+        g.draw()
+    else:
+        g.clear()
+
+
 def extract_data_cols(g, terms):
     # Get first data cols.
     if not g.has_base():
         try:
-            targets = g.dataset.columns.values
-            g.data_cols = [t for t in terms if t in targets]
-            # Get fuzzy match for column names, respecting homophones.
-            # g.data_cols = homophone_matches(terms, g.dataset.columns.values)
+            g.data_cols = match_columns(g, terms)
             print('Relevant variables: ' + str(g.data_cols))
         except:
             print('Did not catch any matching variable names.')
 
     # Already has base, so find grouping variables.
     else:
-        try:
-            targets = g.dataset.columns.values
-            g.grouping = [t.lower() for t in terms if t in targets]
+        matches = match_columns(g, terms)
+        if matches:
             # Take only last matching name.
-            g.grouping = str(g.grouping[-1])
-            # Get fuzzy match for column names, respecting homophones.
-            # g.data_cols = homophone_matches(terms, g.dataset.columns.values)
+            g.grouping = str(matches[-1])
             print('Relevant variables: ' + g.grouping)
-        except:
+        else:
             print('Did not catch any matching variable names.')
     return g
 
 
+def match_columns(g, terms):
+    # Get fuzzy match for column names, respecting homophones.
+    if FUZZY_MATCH and g.column_index is not None:
+        return g.column_index.matches(terms)
+    targets = set(g.source.columns)
+    return [t for t in terms if t in targets]
+
+
+def named_columns(g, intent, slot):
+    # Variables a command names, once each. Keywords of the slot, like
+    # "pairs" or "describe", can sound like variables, so they are left out.
+    # A variable named twice, as in "cut ... color by cut", counts where it
+    # was named last.
+    keywords = get_parser().keywords
+    terms = [t for t in intent.terms if keywords.get(t, ('',))[0] != slot]
+    named = []
+    for col in match_columns(g, terms):
+        if str(col) in named:
+            named.remove(str(col))
+        named.append(str(col))
+    return named
+
+
 def homophone_matches(terms, targets):
     # Given two lists, return intersection (with lenience for homophones).
-    excluded_words = ['vs']
-    targets = [t for t in targets if t not in excluded_words]
-    orig_targets = targets
-    terms = map(unicode, terms)
-    targets = map(unicode, targets)
-    matches = []
-    for i in range(len(terms)):
-        for j in range(len(targets)):
-            if ld(terms[i], targets[j]) <= 1:
-                matches.append(orig_targets[j])
-    return matches
-
-
-def extract_geom(g, terms):
-    # Simple keyword detection.
-    if 'histogram' in terms:
-        g.geom = 'hist'
-    elif 'density' in terms:
-        g.geom = 'density'
-    elif 'line' in terms:
-        g.geom = 'line'
-    elif 'bar' in terms or 'barplot' in terms:
-        g.geom = 'bar'
-    elif 'point' in terms or 'scatter' in terms:
+    # The index of each list of targets is kept, so only the first call on
+    # a list pays for building it.
+    key = tuple(targets)
+    index = _target_indexes.pop(key, None)
+    if index is None:
+        from ColumnIndex import ColumnIndex
+        index = ColumnIndex(targets)
+    _target_indexes[key] = index
+    if len(_target_indexes) > MAX_TARGET_INDEXES:
+        _target_indexes.popitem(last=False)
+    return index.matches(terms)
+
+
+def extract_geom(g, intent):
+    # Keyword detection is done by the parser.
+    if intent.geom == 'density' and len(g.data_cols) == 2:
+        # Density of two variables is a scatter plot drawn as a 2-D histogram.
         g.geom = 'point'
+        g.render_mode = 'density'
+    elif intent.geom is not None:
+        g.geom = intent.geom
+    else:
+        g = infer_geom(g)
+    if g.geom in ('point', 'matrix'):
+        g = extract_render_mode(g, intent)
+    if g.geom in ('matrix', 'each'):
+        g = extract_panels(g, intent)
+    return g
+
+
+def extract_panels(g, intent):
+    # Pick the variables of a grid of graphs. A scatter matrix takes the
+    # numeric variables named, or all of them; a categorical one named after
+    # "by" groups it. "Everything" takes every variable that fits a panel.
+    columns = [str(c) for c in g.source.columns]
+    named = named_columns(g, intent, 'geom')
+    if g.geom == 'matrix':
+        others = [c for c in named if not is_numeric(g, c)]
+        named = [c for c in named if c not in others]
+        if others and intent.group_by:
+            g.grouping = others[-1]
+        elif others:
+            print('Leaving out {}, which is not numeric.'.format(
+                ', '.join(others)))
+        if len(named) < 2:
+            named = [c for c in columns if is_numeric(g, c)]
+        cols, limit = named, MAX_MATRIX_COLS
     else:
-        g = infer_geom(g, terms)
+        g.source.require(columns)
+        cols = [c for c in (named or columns)
+                if is_numeric(g, c) or
+                g.schema[c].cardinality <= MAX_BAR_CATEGORIES]
+        limit = MAX_PANELS
+    if len(cols) > limit:
+        print('Showing the first {} of {} variables.'.format(limit,
+                                                             len(cols)))
+    g.data_cols = cols[:limit]
+    print('Relevant variables: ' + str(g.data_cols))
     return g
 
 
-def infer_geom(g, terms):
+def infer_geom(g):
     # Infer based on number of data columns and their types.
     if len(g.data_cols) == 1:
         print('Inferring graph geometry.')
-        d_example = g.dataset[g.data_cols[0]][0]
-        if is_numeric(d_example):
+        if is_numeric(g, g.data_cols[0]):
             g.geom = 'hist'
         else:
             g.geom = 'bar'
@@ -288,15 +568,15 @@ def infer_geom(g, terms):
         print('Inferring graph geometry.')
         d1_name = g.data_cols[0]
         d2_name = g.data_cols[1]
-        d1_example = g.dataset[d1_name][0]
-        d2_example = g.dataset[d2_name][0]
+        d1_numeric = is_numeric(g, d1_name)
+        d2_numeric = is_numeric(g, d2_name)
         # Case of both numeric.
-        if is_numeric(d1_example) and is_numeric(d2_example):
+        if d1_numeric and d2_numeric:
             g.geom = 'point'
         # Case where one is numeric.
-        elif is_numeric(d1_example) or is_numeric(d2_example):
+        elif d1_numeric or d2_numeric:
             g.geom = 'hist'
-            if is_numeric(d1_example):
+            if d1_numeric:
                 g.data_cols = [d1_name]
                 g.grouping = d2_name
             else:
@@ -313,27 +593,80 @@ def infer_geom(g, terms):
     return g
 
 
-def is_numeric(v):
-    return isinstance(v, (int, long, float))
+def is_numeric(g, col):
+    # Read the column type from the schema computed at load.
+    return g.is_numeric(col)
 
 
-def extract_stat_functions(g, terms):
-    if 'smooth' in terms:
+def extract_stat_functions(g, intent):
+    if intent.smooth:
         g.add_smooth = True
     return g
 
 
-def extract_grouping(g, terms):
-    bi = bigrams(terms)
-    if any([['group', 'by'] in bi, ['group', 'x'] in bi,
-            ['color', 'by'] in bi, ['color', 'x']]):
-        extract_data_cols(g, terms)
+def extract_render_mode(g, intent):
+    # Let the user override how large scatter plots are drawn.
+    if intent.render_mode is not None:
+        g.render_mode = intent.render_mode
+        print('Render mode: ' + g.render_mode)
+    return g
+
+
+def extract_layout(g, intent):
+    # Let the user pick how the groups of a histogram are laid out.
+    if intent.layout is not None:
+        g.layout = intent.layout
+        print('Layout: ' + g.layout)
+    return g
+
+
+def extract_grouping(g, intent):
+    if intent.group_by:
+        extract_data_cols(g, intent.terms)
+    return g
+
+
+def extract_filters(g, intent):
+    # Add the spoken filters to those of the graph. A filter replaces an
+    # earlier one of the same variable and kind; others stack.
+    if not intent.filters:
+        return g
+    filters = list(g.filters)
+    for term, op, value in intent.filters:
+        matches = match_columns(g, [term])
+        if not matches:
+            print('No variable matches "{}".'.format(term))
+            continue
+        col = str(matches[0])
+        g.source.require([col])
+        if op in ('==', '!='):
+            value = match_value(g, col, value)
+            if value is None:
+                print('No value of {} matches that.'.format(col))
+                continue
+        elif op in ('>', '<', 'between') and not is_numeric(g, col):
+            print('Cannot compare {}, which is not numeric.'.format(col))
+            continue
+        filters = [f for f in filters if f[:2] != (col, op)]
+        filters.append((col, op, value))
+        print('Filter: ' + describe(filters[-1:]))
+    g.filters = filters
     return g
 
 
-def bigrams(terms):
-    bigrams = [[terms[i], terms[i+1]] for i in range(len(terms)-1)]
-    return bigrams
+def match_value(g, col, value):
+    # Match a spoken value to a value of the column, within one edit or by
+    # sound. Returns it in a tuple, as filters take, or None.
+    if is_numeric(g, col):
+        return (value,) if isinstance(value, float) else None
+    if isinstance(value, float):
+        value = '{:g}'.format(value)
+    from ColumnIndex import ColumnIndex
+    labels = dict((label_text(c).lower(), c)
+                  for c in g.schema[col].categories)
+    found = ColumnIndex(list(labels), excluded=()).lookup(
+        label_text(value).lower())
+    return (labels[found[0]],) if found else None
 
 
 if __name__ == "__main__":
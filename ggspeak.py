@@ -0,0 +1,208 @@
+#!/usr/bin/python
+
+# Title: ggspeak Command Line
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+#
+# Non-interactive entry point. "render" runs scripts of text commands
+# through the same handling as spoken ones, and writes each graph to a file:
+#
+#   python ggspeak.py render --data diamonds.csv --script cmds.txt --out figs/
+#   python ggspeak.py profile --data diamonds.csv --script cmds.txt
+#   python ggspeak.py serve --data diamonds.csv --data cars.csv
+
+import argparse
+import imp
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+from Tracer import span, tracer
+
+FORMATS = ['png', 'svg']
+DEMO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'demo_0.0.5.py')
+
+# Set in each worker process by _init_worker.
+_worker = {}
+
+
+def main():
+    args = parse_args()
+    if args.command == 'render':
+        results = render_scripts(args.data, args.script, args.out,
+                                 args.format, args.jobs)
+        return 1 if any(r['error'] for r in results) else 0
+    elif args.command == 'profile':
+        # Spans are kept per process, so scripts run here, one at a time.
+        tracer.enabled = True
+        out = args.out or tempfile.mkdtemp(prefix='ggspeak-profile-')
+        try:
+            results = render_scripts(args.data, args.script, out,
+                                     args.format, jobs=1)
+        finally:
+            if not args.out:
+                shutil.rmtree(out, ignore_errors=True)
+        tracer.report()
+        if args.trace_file:
+            tracer.export_chrome(args.trace_file)
+        return 1 if any(r['error'] for r in results) else 0
+    elif args.command == 'serve':
+        from Server import serve
+        serve(args.data, args.port, args.jobs, args.recognizer, args.verbose)
+        return 0
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Graph by voice, from text.')
+    commands = ap.add_subparsers(dest='command')
+    render = commands.add_parser(
+        'render', help='Render the graphs of command scripts to files.')
+    profile = commands.add_parser(
+        'profile', help='Time each stage of the commands of scripts.')
+    for p in render, profile:
+        p.add_argument('--data', required=True, help='CSV file to graph.')
+        p.add_argument('--script', required=True, action='append',
+                       help='File with one command per line. Repeat for '
+                            'more scripts.')
+        p.add_argument('--format', choices=FORMATS, default='png',
+                       help='Image format.')
+    render.add_argument('--out', required=True, help='Output directory.')
+    render.add_argument('--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Worker processes, when there are several '
+                             'scripts.')
+    profile.add_argument('--out', help='Keep the graphs in this directory.')
+    profile.add_argument('--trace-file',
+                         help='Write the spans here, for chrome://tracing.')
+    serve = commands.add_parser(
+        'serve', help='Serve graphing sessions over HTTP, on localhost.')
+    serve.add_argument('--data', required=True, action='append',
+                       help='CSV file to serve. Repeat for more; the first '
+                            'is the default.')
+    serve.add_argument('--port', type=int, default=8765,
+                       help='TCP port; 0 picks a free one.')
+    serve.add_argument('--jobs', type=int,
+                       default=multiprocessing.cpu_count(),
+                       help='Render worker processes.')
+    serve.add_argument('--recognizer', choices=['remote', 'sphinx'],
+                       help='Accept recorded commands, recognized with this '
+                            'backend.')
+    serve.add_argument('--verbose', action='store_true',
+                       help='Log every request.')
+    return ap.parse_args()
+
+
+def render_scripts(data, scripts, out, fmt='png', jobs=1):
+    """Renders every graph of every script, spread over processes.
+
+    Each script starts from an empty graph. Its commands are handled in
+    order, and whenever a command leaves a valid graph, the graph is written
+    to <out>/<script name>-<command number>.<fmt>. A manifest.json in out
+    lists each command with its parsed intent, graph spec and output file,
+    for comparing parser behaviour across versions.
+
+    Args:
+        data: CSV file path.
+        scripts: List of command script paths.
+        out: Output directory, created if needed.
+        fmt: 'png' or 'svg'.
+        jobs: Number of worker processes.
+
+    Returns:
+        results: One dict per script, with its commands and any error.
+    """
+    if not os.path.isdir(out):
+        os.makedirs(out)
+    init_args = (data, out, fmt)
+    jobs = max(1, min(jobs, len(scripts)))
+    if jobs == 1:
+        _init_worker(*init_args)
+        results = map(render_script, scripts)
+    else:
+        # Parse the file once here, so the workers open it from the dataset
+        # cache instead of each parsing it.
+        from Loader import DatasetLoader
+        DatasetLoader(data).frame()
+        pool = multiprocessing.Pool(jobs, _init_worker, init_args)
+        try:
+            results = pool.map(render_script, scripts, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    with open(os.path.join(out, 'manifest.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    for r in results:
+        n_files = sum(1 for c in r['commands'] if c['file'])
+        print('{}: {} commands, {} graphs{}'.format(
+            r['script'], len(r['commands']), n_files,
+            ', FAILED' if r['error'] else ''))
+        if r['error']:
+            print(r['error'])
+    return results
+
+
+def _init_worker(data, out, fmt):
+    # Load the demo and the dataset once per process. The dataset comes
+    # from the on-disk cache when it is there, so workers map the same
+    # column files instead of each parsing the CSV.
+    import matplotlib
+    matplotlib.use('Agg')
+    import Graphic_mpl
+    from Dataset import Dataset
+    from Loader import DatasetLoader
+    Graphic_mpl.init_backend(interactive=False)
+    demo = imp.load_source('demo', DEMO_FILE)
+    _worker.update(demo=demo, out=out, fmt=fmt,
+                   source=Dataset(path=data, loader=DatasetLoader(data)))
+
+
+def render_script(script):
+    """Renders the graphs of one script, in a process set up by _init_worker.
+
+    Returns:
+        result: Dict with the script path, a list of commands, and the
+            error traceback, if the script failed, or None.
+    """
+    demo = _worker['demo']
+    name = os.path.splitext(os.path.basename(script))[0]
+    result = {'script': script, 'commands': [], 'error': None}
+    try:
+        with open(script) as f:
+            lines = [line.strip() for line in f]
+        g = demo.Graphic().set_source(_worker['source'])
+        history = demo.SpecHistory(g.spec)
+        parser = demo.get_parser()
+        written = None
+        for i, text in enumerate(lines):
+            if not text:
+                continue
+            with span('parse'):
+                intent = parser.parse(text.decode('utf-8', 'replace'))
+            with span('command', text=text, action=intent.action):
+                g, done = demo.handle_command(intent, g, history)
+            command = {'text': text, 'intent': repr(intent),
+                       'spec': repr(g.spec), 'file': None}
+            # Write each new graph once; commands like "summary" leave the
+            # graph as it was.
+            if g.valid_graph and g.shown is not None and g.shown != written:
+                written = g.shown
+                path = os.path.join(_worker['out'], '{}-{:02d}.{}'.format(
+                    name, i + 1, _worker['fmt']))
+                with span('savefig'):
+                    g.figure.savefig(path)
+                command['file'] = path
+            result['commands'].append(command)
+            if done:
+                break
+        g.clear()
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(main())
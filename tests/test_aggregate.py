@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+# Title: Tests of the Aggregation Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import numpy as np
+import pandas as pd
+from Aggregate import (FILTERED_STATS, AggregateCache, bin_index,
+                       fold_groups)
+from RowIndex import RowIndex
+from Schema import DatasetSchema
+
+
+def make_cache(frame):
+    schema = DatasetSchema(frame)
+    return AggregateCache(frame, schema, RowIndex(frame, schema))
+
+
+class AggregateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.frame = pd.DataFrame({
+            'price': rs.uniform(0, 100, 1000),
+            'cut': rs.choice(['fair', 'good', 'ideal'], 1000),
+            'color': rs.choice(['d', 'e'], 1000),
+        })
+        self.frame.loc[::50, 'price'] = np.nan
+        self.cache = make_cache(self.frame)
+
+    def test_histogram_matches_numpy(self):
+        edges, counts, labels = self.cache.histogram('price', bins=10)
+        values = self.frame['price'].dropna().values
+        expected, expected_edges = np.histogram(values, bins=10)
+        self.assertEqual(list(counts), list(expected))
+        np.testing.assert_allclose(edges, expected_edges)
+        self.assertIsNone(labels)
+
+    def test_grouped_histogram_sums_to_total(self):
+        _, total, _ = self.cache.histogram('price')
+        _, counts, labels = self.cache.histogram('price', grouping='cut')
+        self.assertEqual(list(labels), ['fair', 'good', 'ideal'])
+        self.assertEqual(list(counts.sum(axis=0)), list(total))
+
+    def test_results_are_cached(self):
+        first = self.cache.histogram('price')
+        self.assertIs(self.cache.histogram('price'), first)
+
+    def test_value_counts(self):
+        labels, counts = self.cache.value_counts('cut')
+        expected = self.frame['cut'].value_counts()
+        self.assertEqual(dict(zip(labels, counts)), expected.to_dict())
+        self.assertEqual(list(counts), sorted(counts, reverse=True))
+
+    def test_filtered_value_counts(self):
+        where = (('price', '>', 50.0),)
+        labels, counts = self.cache.value_counts('cut', where=where)
+        rows = self.frame[self.frame['price'] > 50]
+        self.assertEqual(dict(zip(labels, counts)),
+                         rows['cut'].value_counts().to_dict())
+
+    def test_filtered_stats_are_bounded(self):
+        where = (('cut', '==', ('good',)),)
+        stats = self.cache.stats('price', where)
+        rows = self.frame[self.frame['cut'] == 'good']['price']
+        self.assertEqual(stats.count, rows.count())
+        self.assertAlmostEqual(stats.mean, rows.mean())
+        self.assertIs(self.cache.stats('price', where), stats)
+        oldest = (('price', '>', 0.0),)
+        for cutoff in range(FILTERED_STATS - 1):
+            self.cache.stats('price', (('price', '>', float(cutoff)),))
+        self.cache.stats('price', where)
+        self.cache.stats('price', (('price', '>', 99.0),))
+        self.assertEqual(len(self.cache.stats_cache), FILTERED_STATS)
+        self.assertNotIn(('price', oldest), self.cache.stats_cache)
+        self.assertIs(self.cache.stats('price', where), stats)
+
+    def test_crosstab_matches_pandas(self):
+        rows, cols, table = self.cache.crosstab('cut', 'color')
+        expected = pd.crosstab(self.frame['cut'], self.frame['color'])
+        np.testing.assert_array_equal(table, expected.values)
+        self.assertEqual(list(rows), list(expected.index))
+        self.assertEqual(list(cols), list(expected.columns))
+
+    def test_smooth_follows_a_line(self):
+        x = np.linspace(0, 10, 2000)
+        cache = make_cache(pd.DataFrame({'x': x, 'y': 2 * x + 1}))
+        centers, means, _ = cache.smooth('x', 'y', bins=20, window=1)
+        # Away from the ends, the kernel is symmetric around each bin.
+        np.testing.assert_allclose(means[1:-1], 2 * centers[1:-1] + 1,
+                                   rtol=1e-2)
+
+
+class HelpersTest(unittest.TestCase):
+
+    def test_bin_index_closes_last_bin(self):
+        idx = bin_index(np.array([0.0, 0.5, 1.0, np.nan]), 0.0, 1.0, 2)
+        self.assertEqual(list(idx[:3]), [0, 1, 1])
+
+    def test_fold_groups(self):
+        counts = np.array([[1, 1], [5, 5], [2, 2], [3, 3]])
+        folded, labels = fold_groups(counts, ['a', 'b', 'c', 'd'], 3)
+        self.assertEqual(list(labels), ['b', 'd', 'other'])
+        self.assertEqual(folded.tolist(), [[5, 5], [3, 3], [3, 3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+# Title: Tests of the Column Name Index
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import ColumnIndex
+from ColumnIndex import _within_one_edit
+
+COLUMNS = ['carat', 'cut', 'color', 'clarity', 'depth', 'table', 'price',
+           'x', 'y', 'z', 'vs']
+
+
+class ColumnIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ColumnIndex.ColumnIndex(COLUMNS)
+
+    def test_exact(self):
+        self.assertEqual(self.index.lookup('price'), ['price'])
+        self.assertEqual(self.index.lookup('x'), ['x'])
+
+    def test_one_edit(self):
+        self.assertEqual(self.index.lookup('prices'), ['price'])
+        self.assertEqual(self.index.lookup('deptj'), ['depth'])
+        self.assertEqual(self.index.lookup('tble'), ['table'])
+        self.assertEqual(self.index.lookup('dearth'), [])
+
+    def test_matches_in_column_order(self):
+        index = ColumnIndex.ColumnIndex(['price', 'rice', 'prices'])
+        self.assertEqual(index.lookup('rice'), ['price', 'rice'])
+        self.assertEqual(self.index.matches(['price', 'cart']),
+                         ['price', 'carat'])
+
+    def test_short_terms_match_exactly(self):
+        self.assertEqual(self.index.lookup('w'), [])
+        self.assertEqual(self.index.lookup('xy'), [])
+
+    def test_excluded(self):
+        self.assertEqual(self.index.lookup('vs'), [])
+        index = ColumnIndex.ColumnIndex(COLUMNS, excluded=('price',))
+        self.assertEqual(index.lookup('price'), [])
+        self.assertEqual(index.lookup('vs'), ['vs'])
+
+    @unittest.skipIf(ColumnIndex.metaphone is None, 'needs jellyfish')
+    def test_homophones(self):
+        self.assertEqual(self.index.lookup('carrot'), ['carat'])
+        self.assertEqual(self.index.lookup('collar'), ['color'])
+        index = ColumnIndex.ColumnIndex(COLUMNS, phonetic=False)
+        self.assertEqual(index.lookup('carrot'), [])
+
+
+class WithinOneEditTest(unittest.TestCase):
+
+    def test_edits(self):
+        self.assertTrue(_within_one_edit('price', 'price'))
+        self.assertTrue(_within_one_edit('price', 'prize'))
+        self.assertTrue(_within_one_edit('price', 'rice'))
+        self.assertTrue(_within_one_edit('rice', 'price'))
+        self.assertTrue(_within_one_edit('price', 'prices'))
+        self.assertFalse(_within_one_edit('price', 'pirce'))
+        self.assertFalse(_within_one_edit('price', 'pr'))
+        self.assertFalse(_within_one_edit('carat', 'carrot'))
+
+
+if __name__ == '__main__':
+    unittest.main()
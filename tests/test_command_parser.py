@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+# Title: Tests of the Command Parser
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+from CommandParser import CommandParser
+
+# A few of the NLTK english stopwords, so the tests need no corpus.
+STOPWORDS = ['the', 'of', 'a', 'an', 'and', 'by', 'to', 'me', 'is', 'not',
+             'than', 'where', 'with', 'all', 'very', 'for', 'in', 'it']
+
+
+class IntentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = CommandParser(STOPWORDS)
+
+    def parse(self, text):
+        return self.parser.parse(text)
+
+    def test_actions(self):
+        for text, action in [('quit', 'quit'), ('stop', 'quit'),
+                             ('save the graph', 'save'), ('undo', 'undo'),
+                             ('go back', 'undo'), ('redo', 'redo'),
+                             ('reset the graph', 'reset'),
+                             ('new graph', 'reset'),
+                             ('switch to cars', 'switch'),
+                             ('summary of price', 'summary'),
+                             ('profile', 'profile'),
+                             ('histogram of price', 'edit')]:
+            self.assertEqual(self.parse(text).action, action, text)
+
+    def test_action_priority(self):
+        self.assertEqual(self.parse('save and quit').action, 'quit')
+        self.assertEqual(self.parse('undo then save').action, 'save')
+        self.assertEqual(self.parse('reset and describe').action, 'reset')
+
+    def test_geometries(self):
+        for text, geom in [('histogram of price', 'hist'),
+                           ('density of carat', 'density'),
+                           ('line plot of price', 'line'),
+                           ('bar chart of cut', 'bar'),
+                           ('scatter plot of carat vs price', 'point'),
+                           ('scatter matrix of carat price depth', 'matrix'),
+                           ('all pairs', 'matrix'),
+                           ('histogram of everything', 'each'),
+                           ('color by cut', None)]:
+            self.assertEqual(self.parse(text).geom, geom, text)
+
+    def test_geometry_priority(self):
+        self.assertEqual(self.parse('histogram with smooth line').geom,
+                         'hist')
+        self.assertEqual(self.parse('bar or point').geom, 'bar')
+
+    def test_terms_drop_stopwords(self):
+        self.assertEqual(self.parse('histogram of the price').terms,
+                         ['histogram', 'price'])
+
+    def test_modifiers(self):
+        intent = self.parse('histogram with smooth line')
+        self.assertTrue(intent.smooth)
+        self.assertTrue(self.parse('scatter group by cut').group_by)
+        self.assertTrue(self.parse('colour x clarity').group_by)
+        self.assertFalse(self.parse('scatter by cut').group_by)
+        self.assertEqual(self.parse('hexbin scatter').render_mode, 'density')
+        self.assertEqual(self.parse('scatter sampled').render_mode, 'sample')
+        self.assertEqual(self.parse('ridgeline histogram').layout,
+                         'ridgeline')
+        self.assertEqual(self.parse('histogram in panels').layout, 'grid')
+
+    def test_unicode_is_folded_to_ascii(self):
+        self.assertEqual(self.parse(u'histogram of caf\xe9').terms,
+                         ['histogram', 'cafe'])
+
+    def test_vocabulary(self):
+        vocabulary = self.parser.vocabulary()
+        for word in ['quit', 'histogram', 'overlay', 'top', 'thousand']:
+            self.assertIn(word, vocabulary)
+
+
+
+class FilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = CommandParser(STOPWORDS)
+
+    def filters(self, text):
+        return self.parser.parse(text).filters
+
+    def test_compare(self):
+        self.assertEqual(self.filters('price above 5000'),
+                         [('price', '>', 5000.0)])
+        self.assertEqual(self.filters('price is more than two hundred'),
+                         [('price', '>', 200.0)])
+        self.assertEqual(self.filters('price under $1,000'),
+                         [('price', '<', 1000.0)])
+
+    def test_between(self):
+        self.assertEqual(
+            self.filters('price between one thousand and two thousand'),
+            [('price', 'between', (1000.0, 2000.0))])
+        self.assertEqual(self.filters('carat between 2 and 1'),
+                         [('carat', 'between', (1.0, 2.0))])
+        self.assertEqual(self.filters('price between 5'), [])
+
+    def test_is_and_is_not(self):
+        self.assertEqual(self.filters('cut is very good'),
+                         [('cut', '==', 'very good')])
+        self.assertEqual(self.filters('color is not e'),
+                         [('color', '!=', 'e')])
+        self.assertEqual(self.filters('where cut is ideal and color is e'),
+                         [('cut', '==', 'ideal'), ('color', '==', 'e')])
+        self.assertEqual(self.filters('table is 55'),
+                         [('table', '==', 55.0)])
+
+    def test_top_and_bottom(self):
+        self.assertEqual(self.filters('top ten clarity'),
+                         [('clarity', 'top', 10)])
+        self.assertEqual(self.filters('bottom a hundred price'),
+                         [('price', 'bottom', 100)])
+        self.assertEqual(self.filters('lowest twenty five depth'),
+                         [('depth', 'bottom', 25)])
+
+    def test_spoken_numbers(self):
+        self.assertEqual(
+            self.filters('price over three thousand four hundred'),
+            [('price', '>', 3400.0)])
+        self.assertEqual(self.filters('price below a million'),
+                         [('price', '<', 1e6)])
+
+    def test_filters_are_not_terms(self):
+        intent = self.parser.parse('histogram of price where cut is ideal')
+        self.assertEqual(intent.terms, ['histogram', 'price'])
+        self.assertEqual(intent.filters, [('cut', '==', 'ideal')])
+
+    def test_clear_filters_is_not_reset(self):
+        self.assertEqual(self.parser.parse('clear filters').action,
+                         'unfilter')
+        self.assertEqual(self.parser.parse('remove the filter').action,
+                         'unfilter')
+        self.assertEqual(self.parser.parse('clear').action, 'reset')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+
+# Title: Tests of the Dataset
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import numpy as np
+import pandas as pd
+from Dataset import Dataset
+
+
+class DatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.original = pd.DataFrame({
+            'price': np.arange(1000, dtype=np.int64),
+            'depth': np.arange(1000) / 4.0,
+            'cut': ['Fair', 'Good', 'Ideal', 'Good'] * 250,
+        })
+
+    def test_frame_is_compacted(self):
+        frame = Dataset(frame=self.original).frame
+        self.assertEqual(frame['price'].dtype, np.int32)
+        self.assertEqual(frame['depth'].dtype, np.float32)
+        self.assertEqual(frame['cut'].dtype.name, 'category')
+
+    def test_callers_frame_is_left_alone(self):
+        Dataset(frame=self.original).frame
+        self.assertEqual(self.original['price'].dtype, np.int64)
+        self.assertEqual(self.original['depth'].dtype, np.float64)
+        self.assertEqual(self.original['cut'].dtype, object)
+
+
+if __name__ == '__main__':
+    unittest.main()
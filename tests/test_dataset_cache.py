@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+# Title: Tests of the Dataset Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from DatasetCache import DatasetCache
+from Stats import DatasetStats
+
+
+class DatasetCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'data.csv')
+        with open(self.path, 'w') as f:
+            f.write('placeholder\n')
+        self.frame = pd.DataFrame({
+            'price': np.arange(6, dtype=np.int64) * 100,
+            'carat': np.linspace(0.2, 1.2, 6),
+            'cut': pd.Categorical(['Fair', 'Good', None, 'Good', 'Ideal',
+                                   'Fair']),
+            'city': ['Z\xc3\xbcrich', 'S\xc3\xa3o Paulo', 'Oslo',
+                     'Z\xc3\xbcrich', 'Oslo', 'Oslo'],
+        }, columns=['price', 'carat', 'cut', 'city'])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def round_trip(self, frame):
+        DatasetCache(self.path).save(frame)
+        cache = DatasetCache(self.path)
+        self.assertTrue(cache.exists())
+        return cache.load()
+
+    def test_round_trip(self):
+        frame = self.round_trip(self.frame)
+        self.assertEqual(list(frame.columns), list(self.frame.columns))
+        self.assertEqual(list(frame['price']), list(self.frame['price']))
+        self.assertEqual(list(frame['carat']), list(self.frame['carat']))
+        self.assertEqual(list(frame['cut'].cat.codes),
+                         list(self.frame['cut'].cat.codes))
+        self.assertEqual(list(frame['city'].astype(str)),
+                         list(self.frame['city']))
+
+    def test_text_comes_back_as_byte_strings(self):
+        frame = self.round_trip(self.frame)
+        for name in frame.columns:
+            self.assertIsInstance(name, str)
+        for label in frame['city'].cat.categories:
+            self.assertIsInstance(label, str)
+        self.assertIn('Z\xc3\xbcrich', list(frame['city'].cat.categories))
+
+    def test_labels_that_are_not_utf8(self):
+        latin = pd.DataFrame({'ville': ['Montr\xe9al', 'Qu\xe9bec', 'Laval']})
+        frame = self.round_trip(latin)
+        self.assertEqual(list(frame['ville'].astype(str)),
+                         list(latin['ville']))
+
+    def test_stats_are_saved(self):
+        stats = DatasetStats()
+        stats.update(self.frame[['price', 'cut']])
+        DatasetCache(self.path).save(self.frame, stats)
+        loaded = DatasetCache(self.path).load_stats()
+        self.assertEqual(loaded['price'].count, 6)
+        self.assertEqual(loaded['cut'].nulls, 1)
+
+    def test_stats_labels_that_are_not_utf8(self):
+        latin = pd.DataFrame({'ville': ['Montr\xe9al', 'Qu\xe9bec', 'Laval',
+                                        'Montr\xe9al']})
+        stats = DatasetStats()
+        stats.update(latin)
+        DatasetCache(self.path).save(latin, stats)
+        loaded = DatasetCache(self.path).load_stats()
+        self.assertEqual(loaded['ville'].top(1), [('Montr\xe9al', 2)])
+
+    def test_changed_file_misses(self):
+        DatasetCache(self.path).save(self.frame)
+        with open(self.path, 'a') as f:
+            f.write('more\n')
+        self.assertFalse(DatasetCache(self.path).exists())
+
+    def test_clear(self):
+        cache = DatasetCache(self.path)
+        cache.save(self.frame)
+        cache.clear()
+        self.assertFalse(cache.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+# Title: Tests of the Dataset Pool
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from DatasetPool import DatasetPool
+
+
+class DatasetPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        rs = np.random.RandomState(0)
+        frame = pd.DataFrame({'price': rs.randint(300, 20000, 1000),
+                              'cut': rs.choice(['Fair', 'Ideal'], 1000)})
+        self.pool = DatasetPool()
+        for name in ['a', 'b', 'c']:
+            path = os.path.join(self.root, name + '.csv')
+            frame.to_csv(path, index=False)
+            self.pool.add(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def acquire(self, name):
+        dataset = self.pool.acquire(name)
+        dataset.frame
+        return dataset
+
+    def test_names(self):
+        self.assertEqual(self.pool.names(), ['a', 'b', 'c'])
+        path = os.path.join(self.root, 'a.csv')
+        self.assertEqual(self.pool.add(path), 'a')
+        self.assertEqual(self.pool.add(path.replace('a.csv', 'b.csv'),
+                                       'a'), 'b')
+        self.assertRaises(IOError, self.pool.add, 'nope.csv')
+        self.assertRaises(KeyError, self.pool.acquire, 'd')
+
+    def test_references(self):
+        a = self.acquire('a')
+        self.assertIs(self.pool.acquire('a'), a)
+        self.assertEqual(self.pool.refs['a'], 2)
+        self.pool.release('a')
+        self.pool.release('a')
+        self.pool.release('a')
+        self.assertEqual(self.pool.refs['a'], 0)
+
+    def test_referenced_datasets_stay(self):
+        self.pool.budget = 0
+        a = self.acquire('a')
+        b = self.acquire('b')
+        self.assertEqual(self.pool.evict(), [])
+        self.pool.release('a')
+        self.assertFalse(a.loaded)
+        self.assertTrue(b.loaded)
+
+    def test_least_recently_used_are_evicted(self):
+        for name in ['a', 'b', 'c']:
+            self.acquire(name)
+        self.acquire('a')
+        for name in ['a', 'a', 'b', 'c']:
+            self.pool.release(name)
+        size = self.pool.datasets['a'].memory[1]
+        self.pool.budget = size * 1.5
+        self.assertEqual(self.pool.evict(), ['b', 'c'])
+        self.assertEqual(self.pool.nbytes(), size)
+
+    def test_evicted_datasets_reload_from_cache(self):
+        a = self.acquire('a')
+        expected = list(a.frame['price'])
+        self.pool.release('a')
+        self.pool.budget = 0
+        self.assertEqual(self.pool.evict(), ['a'])
+        self.assertFalse(a.loaded)
+        self.assertIs(self.acquire('a'), a)
+        self.assertTrue(a.loader.from_cache)
+        self.assertEqual(list(a.frame['price']), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+# Title: Tests of the Graph Specification
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import pickle
+import unittest
+from GraphSpec import GraphSpec, SpecHistory
+
+
+class GraphSpecTest(unittest.TestCase):
+
+    def test_cannot_be_changed(self):
+        spec = GraphSpec(geom='hist')
+        self.assertRaises(AttributeError, setattr, spec, 'geom', 'bar')
+        self.assertRaises(TypeError, GraphSpec, shape='round')
+
+    def test_replace(self):
+        spec = GraphSpec(geom='point', data_cols=['carat', 'price'])
+        new = spec.replace(grouping='cut')
+        self.assertEqual(spec.grouping, None)
+        self.assertEqual(new.grouping, 'cut')
+        self.assertEqual(new.data_cols, ('carat', 'price'))
+        self.assertIs(new.data_cols, spec.data_cols)
+
+    def test_equal_specs_hash_alike(self):
+        a = GraphSpec(geom='hist', data_cols=['price'])
+        b = GraphSpec(geom='hist', data_cols=('price',))
+        self.assertEqual(a, b)
+        self.assertFalse(a != b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(len(set([a, b])), 1)
+        self.assertNotEqual(a, a.replace(add_smooth=True))
+
+    def test_digest(self):
+        a = GraphSpec(geom='bar', data_cols=('cut',))
+        self.assertEqual(a.digest(), GraphSpec(geom='bar',
+                                               data_cols=(u'cut',)).digest())
+        self.assertNotEqual(a.digest(), a.replace(geom='hist').digest())
+
+    def test_pickles(self):
+        spec = GraphSpec(geom='point', data_cols=('x', 'y'),
+                         filters=(('price', '>', 500),))
+        self.assertEqual(pickle.loads(pickle.dumps(spec, 2)), spec)
+
+
+class SpecHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.specs = [GraphSpec(geom=g) for g in ['hist', 'bar', 'point']]
+        self.history = SpecHistory()
+        for spec in self.specs:
+            self.history.record(spec)
+
+    def test_undo_and_redo(self):
+        self.assertIs(self.history.current, self.specs[2])
+        self.assertIs(self.history.undo(), self.specs[1])
+        self.assertIs(self.history.undo(), self.specs[0])
+        self.assertEqual(self.history.undo(), GraphSpec())
+        self.assertIsNone(self.history.undo())
+        self.assertIs(self.history.redo(), self.specs[0])
+        self.history.redo()
+        self.history.redo()
+        self.assertIsNone(self.history.redo())
+
+    def test_record_discards_redo_steps(self):
+        self.history.undo()
+        self.history.record(GraphSpec(geom='line'))
+        self.assertIsNone(self.history.redo())
+        self.assertIs(self.history.undo(), self.specs[1])
+
+    def test_same_spec_is_not_recorded(self):
+        self.history.record(GraphSpec(geom='point'))
+        self.assertIs(self.history.undo(), self.specs[1])
+
+    def test_limit(self):
+        history = SpecHistory(limit=3)
+        for spec in self.specs:
+            history.record(spec)
+        self.assertEqual(len(history.specs), 3)
+        history.undo()
+        history.undo()
+        self.assertIsNone(history.undo())
+        self.assertIs(history.current, self.specs[0])
+
+    def test_latest(self):
+        self.history.undo()
+        spec = self.history.latest(lambda s: s.geom != 'bar')
+        self.assertIs(spec, self.specs[0])
+        self.assertIsNone(self.history.latest(lambda s: s.geom == 'line'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+
+# Title: Tests of the Dataset Loader
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from Dataset import Dataset
+from Loader import DatasetLoader, downcast, read_chunks, sniff_header
+
+
+class DowncastTest(unittest.TestCase):
+
+    def test_exact_floats_are_downcast(self):
+        frame = pd.DataFrame({'v': [0.5, 2.0, np.nan, -1024.25]})
+        downcast(frame)
+        self.assertEqual(frame['v'].dtype, np.float32)
+
+    def test_inexact_floats_are_kept(self):
+        for values in [[1.7e9 + i for i in range(5)], [1.5e9 + 37.9],
+                       [-122.4194155], [0.1, 0.2]]:
+            frame = pd.DataFrame({'v': values})
+            downcast(frame)
+            self.assertEqual(frame['v'].dtype, np.float64)
+            self.assertEqual(list(frame['v']), values)
+
+    def test_integers(self):
+        frame = pd.DataFrame({'small': [1, 2], 'big': [1, 2 ** 40]})
+        downcast(frame)
+        self.assertEqual(frame['small'].dtype, np.int32)
+        self.assertEqual(frame['big'].dtype, np.int64)
+
+
+class LoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'data.csv')
+        rs = np.random.RandomState(0)
+        self.expected = pd.DataFrame({
+            'price': rs.randint(300, 20000, 2500),
+            'carat': rs.uniform(0.2, 5, 2500).round(2),
+            'cut': rs.choice(['Fair', 'Good', 'Ideal'], 2500),
+        }, columns=['price', 'carat', 'cut'])
+        self.expected.rename(columns={'price': 'Price'}).to_csv(
+            self.path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def check_frame(self, frame):
+        self.assertEqual(list(frame.columns), ['price', 'carat', 'cut'])
+        self.assertEqual(list(frame['price']), list(self.expected['price']))
+        self.assertEqual(list(frame['carat']), list(self.expected['carat']))
+        self.assertEqual(list(frame['cut'].astype(str)),
+                         list(self.expected['cut']))
+
+    def test_sniff_header_normalizes_names(self):
+        self.assertEqual(sniff_header(self.path), ['price', 'carat', 'cut'])
+
+    def test_chunks_are_joined(self):
+        frame = read_chunks(self.path, ['price', 'carat', 'cut'],
+                            {'cut': 'category'}, chunk_rows=700)
+        self.check_frame(frame)
+        self.assertEqual(list(frame['cut'].cat.categories),
+                         ['Fair', 'Good', 'Ideal'])
+
+    def test_background_load(self):
+        loader = DatasetLoader(self.path, chunk_rows=1000, use_cache=False)
+        self.check_frame(loader.frame())
+        self.assertTrue(loader.done)
+        self.assertEqual(loader.rows_read, 2500)
+
+    def test_lazy_columns(self):
+        loader = DatasetLoader(self.path, lazy_columns=True,
+                               use_cache=False)
+        self.assertEqual(list(loader.frame().columns), [])
+        self.assertEqual(loader.ensure_columns(['carat', 'nope']), ['carat'])
+        self.assertEqual(loader.ensure_columns(['carat']), [])
+        self.assertEqual(list(loader.frame()['carat']),
+                         list(self.expected['carat']))
+        loader.ensure_columns(['price'])
+        self.assertEqual(loader.rows_read, 2500)
+
+    def test_lazy_columns_are_measured_once(self):
+        dataset = Dataset(path=self.path, loader=DatasetLoader(
+            self.path, lazy_columns=True, use_cache=False))
+        dataset.require(['carat'])
+        dataset.require(['carat', 'price'])
+        compact = dataset.frame.memory_usage(index=False, deep=True).sum()
+        self.assertEqual(dataset.memory, (2 * 2500 * 8, compact))
+        self.assertEqual(dataset.schema['price'].dtype, np.int32)
+
+    def test_text_in_a_late_chunk(self):
+        values = [str(i) for i in range(30)] + ['x']
+        pd.DataFrame({'n': range(31), 'v': values}).to_csv(
+            self.path, index=False)
+        loader = DatasetLoader(self.path, chunk_rows=10, use_cache=False)
+        frame = loader.frame()
+        self.assertIsNone(loader.error)
+        self.assertEqual(frame['v'].dtype, object)
+        self.assertEqual(list(frame['v'].astype(str)), values)
+        self.assertNotIn('v', loader.stats)
+        self.assertEqual(loader.stats['n'].count, 31)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+# Title: Tests of the Multiplot
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+import Multiplot
+from Dataset import Dataset
+from GraphSpec import GraphSpec
+from Loader import DatasetLoader
+
+SIZE = (240, 240)
+DPI = 40.0
+
+
+class MultiplotTest(unittest.TestCase):
+
+    def setUp(self):
+        Multiplot.close_pool()
+        Multiplot._shared.clear()
+        self.root = tempfile.mkdtemp()
+        self.sources = []
+        for seed in [0, 1]:
+            rs = np.random.RandomState(seed)
+            path = os.path.join(self.root, 'data{}.csv'.format(seed))
+            pd.DataFrame({'a': rs.normal(size=300).round(3),
+                          'b': rs.exponential(size=300).round(3),
+                          'g': rs.choice(['x', 'y'], 300)}).to_csv(
+                              path, index=False)
+            source = Dataset(path=path, loader=DatasetLoader(path))
+            # Finish the load, and the cache entry workers open, so that no
+            # loading thread is running.
+            source.frame
+            self.sources.append(source)
+        self.spec = GraphSpec(geom='matrix', data_cols=('a', 'b'),
+                              grouping='g')
+
+    def tearDown(self):
+        Multiplot.close_pool()
+        shutil.rmtree(self.root)
+
+    def render(self, source, jobs=None):
+        return Multiplot.render_grid(self.spec, source, SIZE, DPI, jobs)
+
+    def test_panel_specs(self):
+        specs, n_cols = Multiplot.panel_specs(self.spec,
+                                              self.sources[0].schema)
+        self.assertEqual(n_cols, 2)
+        self.assertEqual([s.geom for s in specs],
+                         ['hist', 'point', 'point', 'hist'])
+        self.assertEqual(specs[1].data_cols, ('b', 'a'))
+        each = self.spec.replace(geom='each', data_cols=('a', 'b', 'g'))
+        specs, n_cols = Multiplot.panel_specs(each, self.sources[0].schema)
+        self.assertEqual([s.geom for s in specs], ['hist', 'hist', 'bar'])
+
+    def test_pool_draws_like_this_process(self):
+        expected = self.render(self.sources[0], jobs=1)
+        self.assertIsNone(Multiplot._pool['pool'])
+        grid = self.render(self.sources[0], jobs=2)
+        self.assertIsNotNone(Multiplot._pool['pool'])
+        self.assertTrue(np.array_equal(grid, expected))
+
+    def test_second_dataset_is_drawn_from_its_own_data(self):
+        first = self.render(self.sources[0], jobs=2)
+        pool = Multiplot._pool['pool']
+        second = self.render(self.sources[1], jobs=2)
+        self.assertIs(Multiplot._pool['pool'], pool)
+        self.assertFalse(np.array_equal(first, second))
+        self.assertTrue(np.array_equal(
+            second, self.render(self.sources[1], jobs=1)))
+
+    def test_pool_started_before_threads_is_used(self):
+        pool = Multiplot.start_pool(2)
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            grid = self.render(self.sources[1])
+        finally:
+            stop.set()
+            thread.join()
+        self.assertIs(Multiplot._pool['pool'], pool)
+        self.assertTrue(np.array_equal(
+            grid, self.render(self.sources[1], jobs=1)))
+
+    def test_no_fork_while_threads_run(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        try:
+            self.assertIsNone(Multiplot.start_pool(2))
+            self.render(self.sources[0], jobs=2)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertIsNone(Multiplot._pool['pool'])
+
+    def test_data_not_in_the_cache_is_drawn_here(self):
+        source = Dataset(frame=self.sources[0].frame.copy())
+        grid = self.render(source, jobs=2)
+        self.assertIsNone(Multiplot._pool['pool'])
+        self.assertEqual(grid.shape, self.render(self.sources[0]).shape)
+
+    def test_composite(self):
+        panel = np.zeros((2, 3, 4), dtype=np.uint8)
+        grid = Multiplot.composite([panel, None, panel], 2)
+        self.assertEqual(grid.shape, (4, 6, 4))
+        self.assertTrue((grid[:2, :3] == 0).all())
+        self.assertTrue((grid[:2, 3:] == 255).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+
+# Title: Tests of the Recognizer Backends
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import os
+import shutil
+import tempfile
+import unittest
+from Recognizers import make_backend
+
+
+class TextFileBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'script.txt')
+        with open(self.path, 'w') as f:
+            f.write('histogram of price\n\nbar chart of caf\xc3\xa9\n')
+        self.backend = make_backend('text', script=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def say(self):
+        return self.backend.recognize(self.backend.listen(self.backend))
+
+    def test_replays_lines_then_quits(self):
+        self.assertEqual(self.say(), u'histogram of price')
+        self.assertRaises(LookupError, self.say)
+        self.assertEqual(self.say(), u'bar chart of caf\xe9')
+        self.assertEqual(self.say(), u'quit')
+        self.assertEqual(len(self.backend.timings), 4)
+
+    def test_text_is_unicode(self):
+        self.assertIsInstance(self.say(), unicode)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, make_backend, 'telepathy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+# Title: Tests of the Render Cache
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from GraphSpec import GraphSpec
+from RenderCache import RenderCache, render_key
+
+
+def pixels(value, kb=1):
+    # An RGBA render of kb kilobytes.
+    return np.full((16, 16 * kb, 4), value, dtype=np.uint8)
+
+
+class RenderCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = RenderCache(max_bytes=3 * 1024)
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', pixels(1))
+        self.assertEqual(self.cache.get('a')[0, 0, 0], 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertIn('a', self.cache)
+
+    def test_least_recently_used_is_evicted(self):
+        for key in 'abc':
+            self.cache.put(key, pixels(0))
+        self.cache.get('a')
+        self.cache.put('d', pixels(0))
+        self.assertEqual(sorted(self.cache.entries), ['a', 'c', 'd'])
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(self.cache.nbytes, 3 * 1024)
+
+    def test_evicts_by_size(self):
+        self.cache.put('a', pixels(0))
+        self.cache.put('b', pixels(0))
+        self.cache.put('big', pixels(0, kb=2))
+        self.assertEqual(list(self.cache.entries), ['b', 'big'])
+        self.assertLessEqual(self.cache.nbytes, self.cache.max_bytes)
+
+    def test_replacing_a_render(self):
+        self.cache.put('a', pixels(0, kb=2))
+        self.cache.put('a', pixels(1))
+        self.assertEqual(self.cache.nbytes, 1024)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_too_large_is_not_stored(self):
+        self.cache.put('huge', pixels(0, kb=4))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.nbytes, 0)
+
+    def test_clear(self):
+        self.cache.put('a', pixels(0))
+        self.cache.clear()
+        self.assertEqual((len(self.cache), self.cache.nbytes), (0, 0))
+
+
+class RenderKeyTest(unittest.TestCase):
+
+    def test_key(self):
+        spec = GraphSpec(geom='hist', data_cols=('price',))
+        key = render_key(spec, 'abc', [640, 480])
+        self.assertEqual(key, render_key(spec.replace(), 'abc', (640, 480)))
+        self.assertNotEqual(key, render_key(spec, 'def', (640, 480)))
+        self.assertNotEqual(key, render_key(spec, 'abc', (800, 600)))
+
+
+
+class GridRenderTest(unittest.TestCase):
+
+    def test_grids_are_saved(self):
+        import Graphic_mpl
+        Graphic_mpl.init_backend(interactive=False)
+        rs = np.random.RandomState(0)
+        frame = pd.DataFrame({'a': rs.normal(size=200),
+                              'b': rs.uniform(size=200)})
+        g = Graphic_mpl.Graphic().set_dataset(frame)
+        g.renders = RenderCache()
+        g.figure = Graphic_mpl.plt.figure(figsize=(4, 3), dpi=50)
+        g.spec = GraphSpec(geom='matrix', data_cols=('a', 'b'))
+        g.draw()
+        grid = g.spec
+        self.assertEqual(len(g.renders), 1)
+        g.clear()
+        g.spec = grid
+        g.draw()
+        self.assertEqual(g.renders.hits, 1)
+        Graphic_mpl.plt.close(g.figure)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+# Title: Tests of the Row Index
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import numpy as np
+import pandas as pd
+from RowIndex import RowIndex, describe, label_text
+from Schema import DatasetSchema
+
+
+class RowIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.frame = pd.DataFrame({
+            'price': rs.randint(0, 100, 1000).astype(np.float64),
+            'cut': rs.choice(['Fair', 'Good', 'Ideal'], 1000),
+            'city': pd.Categorical(rs.choice(
+                [u'Z\xfcrich', u'Oslo', 'Bern'], 1000)),
+        })
+        self.frame.loc[::50, 'price'] = np.nan
+        self.index = RowIndex(self.frame, DatasetSchema(self.frame))
+
+    def check(self, filters, expected):
+        mask = self.index.mask(filters)
+        self.assertEqual(mask.dtype, bool)
+        self.assertTrue(np.array_equal(mask, np.asarray(expected)))
+
+    def test_numeric_ranges(self):
+        price = self.frame['price']
+        self.check([('price', '>', 50.0)], price > 50)
+        self.check([('price', '<', 50.0)], price < 50)
+        self.check([('price', 'between', (10.0, 20.0))],
+                   (price >= 10) & (price <= 20))
+        self.check([('price', '==', (10.0, 20.0))], price.isin([10, 20]))
+        self.check([('price', '!=', (10.0,))], ~(price == 10))
+
+    def test_top_and_bottom(self):
+        price = self.frame['price']
+        top = self.index.mask([('price', 'top', 10)])
+        self.assertEqual(top.sum(), 10)
+        self.assertEqual(price[top].min(), price.nlargest(10).min())
+        bottom = self.index.mask([('price', 'bottom', 10)])
+        self.assertEqual(price[bottom].max(), price.nsmallest(10).max())
+        common = self.index.mask([('cut', 'top', 1)])
+        cut = self.frame['cut']
+        self.check([('cut', 'top', 1)], cut == cut.value_counts().index[0])
+        self.assertTrue(common.any())
+
+    def test_categories(self):
+        cut = self.frame['cut']
+        self.check([('cut', '==', ('Ideal', 'Fair'))],
+                   cut.isin(['Ideal', 'Fair']))
+        self.check([('cut', '!=', ('Ideal',))], cut != 'Ideal')
+        self.check([('cut', '==', ('Round',))], np.zeros(1000, dtype=bool))
+
+    def test_labels_match_by_text(self):
+        city = self.frame['city'].astype(object)
+        expected = np.array([c == u'Z\xfcrich' for c in city])
+        self.check([('city', '==', (u'Z\xfcrich',))], expected)
+        self.check([('city', '==', ('Z\xc3\xbcrich',))], expected)
+        self.check([('city', '==', (u'Bern', 'Oslo'))],
+                   city.isin(['Bern', 'Oslo']))
+
+    def test_filters_combine(self):
+        filters = [('price', '>', 50.0), ('cut', '==', ('Good',))]
+        self.check(filters, (self.frame['price'] > 50) &
+                   (self.frame['cut'] == 'Good'))
+        self.assertIs(self.index.mask(filters), self.index.mask(filters))
+        self.assertIsNone(self.index.mask([]))
+
+    def test_bad_filter(self):
+        self.assertRaises(ValueError, self.index.mask,
+                          [('cut', '>', 3.0)])
+
+    def test_describe(self):
+        text = describe([('price', 'between', (1.0, 2.5)),
+                          ('city', '==', (u'Z\xfcrich', 'Bern')),
+                          ('cut', 'top', 3), ('price', '>', 5000.0)])
+        self.assertEqual(text, 'price 1 to 2.5, city is Z\xc3\xbcrich or '
+                         'Bern, top 3 cut, price > 5000')
+
+    def test_label_text(self):
+        self.assertEqual(label_text('Z\xc3\xbcrich'), u'Z\xfcrich')
+        self.assertEqual(label_text(3.5), u'3.5')
+
+
+if __name__ == '__main__':
+    unittest.main()
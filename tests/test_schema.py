@@ -0,0 +1,59 @@
+#!/usr/bin/python
+
+# Title: Tests of the Dataset Schema
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import unittest
+import numpy as np
+import pandas as pd
+from Schema import DatasetSchema
+
+
+class DatasetSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'price': [3.0, np.nan, 1.0, 2.0],
+            'cut': ['good', 'ideal', None, 'good'],
+            'flag': [True, False, True, True],
+        })
+        self.schema = DatasetSchema(self.frame)
+
+    def test_columns_are_described_on_first_lookup(self):
+        self.assertEqual(self.schema.columns, {})
+        self.assertIn('price', self.schema)
+        self.assertEqual(self.schema.columns, {})
+        self.schema['price']
+        self.assertEqual(list(self.schema.columns), ['price'])
+
+    def test_numeric_summaries(self):
+        col = self.schema['price']
+        self.assertTrue(col.is_numeric)
+        self.assertEqual((col.nulls, col.cardinality), (1, 3))
+        self.assertEqual((col.min, col.max), (1.0, 3.0))
+        self.assertIsNone(col.codes)
+
+    def test_categorical_codes(self):
+        col = self.schema['cut']
+        self.assertFalse(col.is_numeric)
+        self.assertEqual(list(col.categories), ['good', 'ideal'])
+        self.assertEqual(list(col.codes), [0, 1, -1, 0])
+        self.assertEqual((col.cardinality, col.nulls), (2, 1))
+
+    def test_booleans_are_categorical(self):
+        self.assertFalse(self.schema.is_numeric('flag'))
+
+    def test_unknown_column(self):
+        self.assertNotIn('carat', self.schema)
+        self.assertFalse(self.schema.is_numeric('carat'))
+        self.assertRaises(KeyError, lambda: self.schema['carat'])
+
+    def test_added_column(self):
+        self.schema.add('depth', pd.Series([1, 2, 2, 5]))
+        self.assertTrue(self.schema.is_numeric('depth'))
+        self.assertEqual(self.schema['depth'].cardinality, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
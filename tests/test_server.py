@@ -0,0 +1,161 @@
+#!/usr/bin/python
+
+# Title: Tests of the ggspeak Server
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import httplib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+import pandas as pd
+import Server
+from Server import GraphServer, GraphService
+
+
+def _have_stopwords():
+    # Workers parse commands with the NLTK stopword list.
+    try:
+        from nltk.corpus import stopwords
+        stopwords.words('english')
+    except (ImportError, LookupError):
+        return False
+    return True
+
+needs_parser = unittest.skipUnless(_have_stopwords(),
+                                   'needs the NLTK stopwords corpus')
+
+
+class ServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        path = os.path.join(cls.root, 'diamonds.csv')
+        rs = np.random.RandomState(0)
+        pd.DataFrame({'carat': rs.uniform(0.2, 3, 500).round(2),
+                      'price': rs.randint(300, 20000, 500),
+                      'cut': rs.choice(['Fair', 'Good', 'Ideal'], 500)}
+                     ).to_csv(path, index=False)
+        cls.service = GraphService([path], jobs=1)
+        cls.server = GraphServer(cls.service, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+        shutil.rmtree(cls.root)
+
+    def request(self, method, path, body=None, json_body=True):
+        # Returns the status, content type and body of a request.
+        conn = httplib.HTTPConnection(Server.HOST, self.server.server_port,
+                                      timeout=Server.REQUEST_TIMEOUT)
+        headers = {}
+        if body is not None and json_body:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response.status, response.getheader('content-type'), data
+
+    def call(self, method, path, body=None, status=200):
+        got, content_type, data = self.request(method, path, body)
+        self.assertEqual(got, status, data)
+        self.assertEqual(content_type, 'application/json')
+        return json.loads(data)
+
+    def session(self):
+        reply = self.call('POST', '/sessions', {'dataset': 'diamonds'})
+        path = '/sessions/' + str(reply['session'])
+        self.addCleanup(self.request, 'DELETE', path)
+        return path
+
+    def test_health_and_datasets(self):
+        self.assertEqual(self.call('GET', '/health'), {'ok': True})
+        self.assertEqual(self.call('GET', '/datasets'),
+                         {'datasets': ['diamonds'], 'default': 'diamonds'})
+
+    def test_sessions(self):
+        reply = self.call('POST', '/sessions')
+        self.assertEqual(reply['dataset'], 'diamonds')
+        sid = reply['session']
+        self.call('POST', '/sessions', {'dataset': 'cars'}, status=404)
+        self.assertEqual(self.call('DELETE', '/sessions/' + sid),
+                         {'session': sid, 'closed': True})
+        self.call('DELETE', '/sessions/' + sid, status=404)
+        self.call('GET', '/sessions/{}/graph.png'.format(sid), status=404)
+
+    def test_bad_requests(self):
+        self.call('GET', '/nowhere', status=404)
+        path = self.session()
+        self.call('POST', path + '/command', {}, status=400)
+        status, _, _ = self.request('POST', path + '/command', '\xff',
+                                    json_body=False)
+        self.assertEqual(status, 400)
+
+    def test_session_limit(self):
+        limit = Server.MAX_SESSIONS
+        Server.MAX_SESSIONS = len(self.service.sessions) + 1
+        try:
+            self.session()
+            self.call('POST', '/sessions', status=503)
+        finally:
+            Server.MAX_SESSIONS = limit
+
+    def test_metrics(self):
+        self.call('GET', '/health')
+        self.call('GET', '/nowhere', status=404)
+        metrics = self.call('GET', '/metrics')
+        self.assertGreaterEqual(metrics['statuses']['200'], 1)
+        self.assertGreaterEqual(metrics['statuses']['404'], 1)
+        self.assertIn('GET /health', metrics['latency_ms'])
+        self.assertIn('GET (not found)', metrics['latency_ms'])
+        self.assertEqual(metrics['limit'], Server.PENDING_PER_WORKER)
+
+    @needs_parser
+    def test_command_and_graph(self):
+        path = self.session()
+        reply = self.call('POST', path + '/command',
+                          {'text': 'histogram of price'})
+        self.assertEqual(reply['graph'], path + '/graph.png')
+        self.assertFalse(reply['closed'])
+        status, content_type, data = self.request('GET', reply['graph'])
+        self.assertEqual((status, content_type), (200, 'image/png'))
+        self.assertTrue(data.startswith('\x89PNG'))
+        status, content_type, data = self.request('GET', path + '/graph.svg')
+        self.assertEqual((status, content_type), (200, 'image/svg+xml'))
+        self.assertIn('<svg', data)
+        metrics = self.call('GET', '/metrics')
+        self.assertIn('worker', metrics['latency_ms'])
+
+    @needs_parser
+    def test_plain_text_command(self):
+        path = self.session()
+        status, _, data = self.request('POST', path + '/command',
+                                       'carat vs price', json_body=False)
+        self.assertEqual(status, 200, data)
+        self.assertIn('point', json.loads(data)['spec'])
+
+    @needs_parser
+    def test_quit_closes_the_session(self):
+        path = self.session()
+        self.call('POST', path + '/command', {'text': 'histogram of price'})
+        reply = self.call('POST', path + '/command', {'text': 'quit'})
+        self.assertTrue(reply['closed'])
+        self.assertIsNone(reply['graph'])
+        self.call('GET', path + '/graph.png', status=404)
+        self.call('POST', path + '/command', {'text': 'undo'}, status=404)
+
+
+if __name__ == '__main__':
+    unittest.main()
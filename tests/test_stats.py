@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# Title: Tests of the Column Statistics
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import json
+import unittest
+import numpy as np
+import pandas as pd
+import Stats
+from Stats import DatasetStats, QuantileSketch, column_stats, format_stats
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_rank_error(self):
+        rs = np.random.RandomState(0)
+        values = rs.lognormal(size=200000)
+        sketch = QuantileSketch()
+        for chunk in np.array_split(values, 37):
+            sketch.update(chunk)
+        ordered = np.sort(values)
+        for q in [0.01, 0.25, 0.5, 0.75, 0.99]:
+            rank = np.searchsorted(ordered, sketch.quantile(q))
+            self.assertLess(abs(rank / float(len(values)) - q), 0.01)
+
+    def test_small_streams_are_exact(self):
+        sketch = QuantileSketch()
+        sketch.update([3.0, np.nan, 1.0, 2.0])
+        self.assertEqual(sketch.quantile(0.0), 1.0)
+        self.assertEqual(sketch.quantile(0.5), 2.0)
+        self.assertEqual(sketch.quantile(1.0), 3.0)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    def test_memory_is_bounded(self):
+        sketch = QuantileSketch(size=64)
+        for chunk in np.array_split(np.arange(100000.0), 100):
+            sketch.update(chunk)
+        self.assertLess(sum(len(level) for level in sketch.levels),
+                        64 * len(sketch.levels))
+
+
+class ColumnStatsTest(unittest.TestCase):
+
+    def test_merged_moments_match_numpy(self):
+        rs = np.random.RandomState(1)
+        values = rs.normal(1e6, 3.0, 100003)
+        values[::97] = np.nan
+        stats = column_stats('v', pd.Series(values), chunk_rows=7919)
+        valid = values[~np.isnan(values)]
+        self.assertEqual(stats.count, len(valid))
+        self.assertEqual(stats.nulls, len(values) - len(valid))
+        self.assertAlmostEqual(stats.mean, valid.mean(), places=6)
+        self.assertAlmostEqual(stats.variance / valid.var(ddof=1), 1.0,
+                               places=9)
+        self.assertEqual((stats.min, stats.max), (valid.min(), valid.max()))
+
+    def test_one_value(self):
+        stats = column_stats('v', pd.Series([2.5]))
+        self.assertEqual(stats.mean, 2.5)
+        self.assertIsNone(stats.variance)
+        self.assertIsNone(stats.std)
+
+    def test_categorical_counts(self):
+        series = pd.Series(['b', 'a', None, 'b', 'c', 'b', 'a'])
+        stats = column_stats('s', series, chunk_rows=2)
+        self.assertEqual(stats.kind, 'categorical')
+        self.assertEqual((stats.count, stats.nulls), (6, 1))
+        self.assertEqual(stats.top(2), [('b', 3), ('a', 2)])
+        self.assertEqual(stats.distinct, 3)
+        self.assertTrue(stats.exact)
+        self.assertIsNone(stats.quantile(0.5))
+
+    def test_too_many_values_are_pruned(self):
+        limit = Stats.MAX_TRACKED_VALUES
+        Stats.MAX_TRACKED_VALUES = 10
+        try:
+            series = pd.Series(['common'] * 50 + [str(i) for i in range(30)])
+            stats = column_stats('s', series, chunk_rows=20)
+        finally:
+            Stats.MAX_TRACKED_VALUES = limit
+        self.assertFalse(stats.exact)
+        self.assertLessEqual(stats.distinct, 10)
+        self.assertEqual(stats.top(1), [('common', 50)])
+        self.assertEqual(stats.count, 80)
+
+    def test_booleans_are_categorical(self):
+        stats = column_stats('b', pd.Series([True, False, True]))
+        self.assertEqual(stats.top(), [(True, 2), (False, 1)])
+
+
+class DatasetStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'price': np.arange(1000, dtype=np.int32),
+            'cut': pd.Categorical(['Fair', 'Good', 'Ideal', 'Good'] * 250),
+        })
+        self.stats = DatasetStats()
+        for start in range(0, 1000, 300):
+            self.stats.update(self.frame.iloc[start:start + 300])
+
+    def test_round_trip(self):
+        d = json.loads(json.dumps(self.stats.to_dict()))
+        stats = DatasetStats.from_dict(d)
+        for name in ['price', 'cut']:
+            for field in ['count', 'nulls', 'mean', 'variance', 'min', 'max',
+                          'exact', 'distinct']:
+                self.assertEqual(getattr(stats[name], field),
+                                 getattr(self.stats[name], field))
+        self.assertEqual(stats['price'].quantile(0.5),
+                         self.stats['price'].quantile(0.5))
+        self.assertEqual(stats['cut'].top(1), [('Good', 500)])
+
+    def test_discard(self):
+        self.stats.discard(['cut'])
+        self.assertNotIn('cut', self.stats)
+        self.assertIn('price', self.stats)
+
+    def test_columns_that_change_kind_are_dropped(self):
+        stats = DatasetStats()
+        stats.update(pd.DataFrame({'v': [1, 2], 'n': [1, 2]}))
+        stats.update(pd.DataFrame({'v': ['3', 'x'], 'n': [3, 4]}))
+        stats.update(pd.DataFrame({'v': [5, 6], 'n': [5, 6]}))
+        self.assertNotIn('v', stats)
+        self.assertEqual(stats['n'].count, 6)
+        stats.discard(['v'])
+        stats.update(pd.DataFrame({'v': [7], 'n': [7]}))
+        self.assertEqual(stats['v'].count, 1)
+
+    def test_format(self):
+        price = format_stats(self.stats['price'])
+        self.assertEqual(price[0], 'price: 1000 values, 0 missing')
+        self.assertTrue(price[1].startswith('  mean 499.5, std 288.8'))
+        self.assertTrue(price[2].startswith('  min 0, 25% '))
+        cut = format_stats(self.stats['cut'])
+        self.assertEqual(cut[0], 'cut: 1000 values, 0 missing, 3 distinct')
+        self.assertEqual(cut[1], '  most common: Good 500 (50.0%), '
+                         'Fair 250 (25.0%), Ideal 250 (25.0%)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+# Title: Tests of the Tracer
+# Author: Maurice Diesendruck
+# Last updated: 2015-09-01
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from Tracer import Tracer, clock, tracer
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_off_by_default(self):
+        self.assertFalse(tracer.enabled)
+        t = Tracer()
+        with t.span('parse'):
+            pass
+        self.assertEqual(len(t.spans), 0)
+
+    def test_clock_is_monotonic(self):
+        times = [clock() for _ in range(1000)]
+        self.assertEqual(times, sorted(times))
+
+    def test_span_records(self):
+        t = Tracer(enabled=True)
+        with t.span('parse', text='histogram'):
+            pass
+        self.assertRaises(ValueError, self.fail_in_span, t)
+        (name, start, duration, tid, args), failed = t.spans
+        self.assertEqual(name, 'parse')
+        self.assertEqual(args, {'text': 'histogram'})
+        self.assertGreaterEqual(duration, 0)
+        self.assertEqual(tid, threading.current_thread().ident)
+        self.assertEqual(failed[0], 'draw')
+
+    def fail_in_span(self, t):
+        with t.span('draw'):
+            raise ValueError('no data')
+
+    def test_buffer_is_bounded(self):
+        t = Tracer(enabled=True, size=3)
+        for i in range(5):
+            t.record('s', clock(), i)
+        self.assertEqual([s[2] for s in t.spans], [2, 3, 4])
+
+    def test_stats(self):
+        t = Tracer(enabled=True)
+        for ms in range(1, 101):
+            t.record('draw', clock(), ms / 1e3)
+        t.record('parse', clock(), 0.5)
+        count, total, p50, p90, p99, worst = t.stats()['draw']
+        self.assertEqual(count, 100)
+        self.assertAlmostEqual(total, 5.05)
+        self.assertAlmostEqual(p50, 0.051)
+        self.assertAlmostEqual(p90, 0.091)
+        self.assertAlmostEqual(p99, 0.1)
+        self.assertAlmostEqual(worst, 0.1)
+        self.assertEqual(t.stats()['parse'][0], 1)
+        t.clear()
+        self.assertEqual(t.stats(), {})
+
+    def test_export_chrome(self):
+        root = tempfile.mkdtemp()
+        try:
+            t = Tracer(enabled=True)
+            t.record('render', t.origin + 0.25, 0.125, {'panels': 4})
+            path = os.path.join(root, 'trace.json')
+            t.export_chrome(path)
+            with open(path) as f:
+                trace = json.load(f)
+        finally:
+            shutil.rmtree(root)
+        event, = trace['traceEvents']
+        self.assertEqual(event['name'], 'render')
+        self.assertEqual(event['ph'], 'X')
+        self.assertAlmostEqual(event['ts'], 250000)
+        self.assertAlmostEqual(event['dur'], 125000)
+        self.assertEqual(event['args'], {'panels': 4})
+
+
+if __name__ == '__main__':
+    unittest.main()